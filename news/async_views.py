@@ -0,0 +1,209 @@
+"""
+Native async versions of the read-heavy pages and the JSON like / comment
+endpoints, served when ASYNC_VIEWS is on (the ASGI profile,
+news_backend/settings_asgi.py).
+
+A request waiting on the database or cache holds no worker thread, so one
+ASGI worker keeps far more readers in flight than a threaded WSGI worker.
+Independent lookups are started together with asyncio.gather. Django still
+runs each async ORM call through the request's sync thread, so the gain
+is in freed workers rather than parallel SQL within one page.
+
+Everything the sync views guarantee carries over: same templates,
+fragment cache, conditional GET and query shapes. Helpers that need a
+transaction (toggle_like) or build a whole structure in Python (comment
+trees, related posts, feed pages) run through sync_to_async, like
+template rendering, which may still resolve lazy relations.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.shortcuts import aget_object_or_404, render
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_POST
+
+from . import voice
+from .comments import comment_threads
+from .conditional import acondition, afeed_etag, apost_etag, apost_last_modified
+from .likes import toggle_like
+from .models import Category, Comment, Post, PostLike, Profile, Story
+from .related import related_posts
+from .views import _feed_page
+
+arender = sync_to_async(render)
+arender_to_string = sync_to_async(render_to_string)
+
+
+async def _profile(request):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return None
+    return await Profile.objects.filter(user=user).afirst()
+
+
+async def _liked_comment_ids(request, post):
+    user = await request.auser()
+    if not user.is_authenticated:
+        return set()
+
+    return {
+        pk async for pk in
+        Comment.likes.through.objects
+        .filter(user=user, comment__post=post)
+        .values_list("comment_id", flat=True)
+    }
+
+
+async def _categories():
+    return [category async for category in Category.objects.order_by("name")]
+
+
+@cache_control(private=True, no_cache=True)
+@acondition(etag_func=afeed_etag)
+async def index(request):
+    feed_page, profile = await asyncio.gather(
+        sync_to_async(_feed_page)(request),
+        _profile(request),
+    )
+
+    return await arender(request, "index.html", {
+        "feed_html": mark_safe(feed_page["html"]),
+        "feed_count": feed_page["count"],
+        "next_cursor": feed_page["next"],
+        # Left lazy: only queried when their cached fragment has expired
+        "stories": Story.objects.order_by("-created_at"),
+        "categories": Category.objects.all(),
+        "profile": profile,
+    })
+
+
+@cache_control(private=True, no_cache=True)
+@acondition(etag_func=apost_etag, last_modified_func=apost_last_modified)
+async def newsview(request, post_id):
+    post = await aget_object_or_404(Post.objects.select_related("category"), id=post_id)
+
+    categories, (comments, comments_cursor), liked_ids, related, profile = await asyncio.gather(
+        _categories(),
+        sync_to_async(comment_threads)(post),
+        _liked_comment_ids(request, post),
+        sync_to_async(related_posts)(post),
+        _profile(request),
+    )
+
+    return await arender(request, "newsview.html", {
+        "post": post,
+        "categories": categories,
+        "media_types": ["Image", "Video"],
+        "profile": profile,
+        "comments": comments,
+        "comments_cursor": comments_cursor,
+        "liked_comment_ids": liked_ids,
+        "related_posts": related,
+    })
+
+
+async def load_comments(request, post_id):
+    """
+    Next page of top-level comment threads for a post.
+    """
+    post = await aget_object_or_404(Post.objects.only("id"), id=post_id)
+
+    (threads, next_cursor), liked_ids = await asyncio.gather(
+        sync_to_async(comment_threads)(post, after=request.GET.get("cursor")),
+        _liked_comment_ids(request, post),
+    )
+
+    html = await arender_to_string("comment_items.html", {
+        "comments": threads,
+        "liked_comment_ids": liked_ids,
+    }, request=request)
+
+    return JsonResponse({"html": html, "next": next_cursor})
+
+
+@login_required
+@require_POST
+async def add_comment(request):
+    post_id = request.POST.get("post_id")
+    text = request.POST.get("text", "").strip()
+    audio = request.FILES.get("audio")
+    parent_id = request.POST.get("parent_id")
+
+    if not post_id:
+        return JsonResponse({"error": "Post ID missing"}, status=400)
+
+    if not text and not audio:
+        return JsonResponse({"error": "Empty comment"}, status=400)
+
+    if audio and voice.too_large(audio):
+        return JsonResponse({"error": "Voice comment is too large"}, status=400)
+
+    user = await request.auser()
+
+    async def parent_comment():
+        return await aget_object_or_404(Comment.objects.only("id"), id=parent_id) if parent_id else None
+
+    post, (profile, _), parent = await asyncio.gather(
+        aget_object_or_404(Post.objects.only("id"), id=post_id),
+        Profile.objects.aget_or_create(
+            user=user,
+            defaults={"full_name": user.get_full_name(), "email": user.email},
+        ),
+        parent_comment(),
+    )
+
+    comment = await Comment.objects.acreate(
+        user=user,
+        post=post,
+        parent=parent,
+        text=text,
+        audio=audio,
+        audio_status=Comment.AUDIO_QUEUED if audio else Comment.AUDIO_READY,
+    )
+    if audio:
+        await sync_to_async(voice.schedule)(comment.pk)
+
+    return JsonResponse({
+        "id": comment.id,
+        "text": comment.text,
+        "audio": comment.audio.url if comment.audio else "",
+        "audio_status": comment.audio_status,
+        "username": user.username,
+        "avatar": profile.avatar or "/static/avatar.png",
+        "parent_id": parent.id if parent else None,
+        "likes_count": 0
+    })
+
+
+@login_required
+@require_POST
+async def like_comment(request):
+    comment = await aget_object_or_404(Comment.objects.only("id"), id=request.POST.get("comment_id"))
+    user = await request.auser()
+
+    # Needs a transaction, which the async ORM cannot open
+    _, likes_count = await sync_to_async(toggle_like)(Comment.likes.through, comment, user, "comment")
+
+    return JsonResponse({
+        "likes_count": likes_count
+    })
+
+
+@login_required
+async def post_like(request):
+    if request.method != "POST":
+        return JsonResponse({"error": "Invalid request"}, status=400)
+
+    try:
+        post = await Post.objects.only("id").aget(id=request.POST.get("post_id"))
+    except Post.DoesNotExist:
+        return JsonResponse({"error": "Post not found"}, status=404)
+
+    user = await request.auser()
+    user_liked, likes_count = await sync_to_async(toggle_like)(PostLike, post, user, "post")
+
+    return JsonResponse({"likes_count": likes_count, "user_liked": user_liked})
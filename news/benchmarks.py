@@ -0,0 +1,97 @@
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.test import AsyncClient, Client
+
+
+def percentiles(timings):
+    """
+    (median, p95) of a list of timings.
+    """
+    p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+    return statistics.median(timings), p95
+
+
+def allowed_host():
+    """
+    A host name ALLOWED_HOSTS accepts. Outside the test runner the test
+    client's default "testserver" is rejected before any view runs.
+    """
+    for host in settings.ALLOWED_HOSTS:
+        if host == "*":
+            break
+        # ".example.com" allows example.com and its subdomains
+        return host.lstrip(".")
+    return "localhost"
+
+
+class _HostAsyncClient(AsyncClient):
+    # AsyncClient puts "host: testserver" in every scope, whatever the
+    # default headers say
+    def __init__(self, host, **kwargs):
+        super().__init__(**kwargs)
+        self.host = host
+
+    async def request(self, **request):
+        request["headers"] = [
+            (name, self.host.encode("ascii") if name == b"host" else value)
+            for name, value in request["headers"]
+        ]
+        return await super().request(**request)
+
+
+def benchmark_client(client_class=Client):
+    """
+    A test client (or AsyncClient) whose requests carry an allowed Host.
+    """
+    host = allowed_host()
+    if client_class is AsyncClient:
+        return _HostAsyncClient(host)
+    return client_class(headers={"Host": host})
+
+
+def summary(values):
+    """
+    p50 / p95 / p99, mean and max of a list of timings (or counts).
+    """
+    if len(values) > 1:
+        cuts = statistics.quantiles(values, n=100, method="inclusive")
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = values[0]
+    return {
+        "p50": round(p50, 3),
+        "p95": round(p95, 3),
+        "p99": round(p99, 3),
+        "mean": round(statistics.fmean(values), 3),
+        "max": round(max(values), 3),
+    }
+
+
+def time_calls(func, repeat):
+    """
+    Calls `func` `repeat` times and returns the wall time of each call in ms.
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+@contextmanager
+def explicit_timestamps(model, field="created_at"):
+    """
+    Lets bulk_create keep the given timestamps on an `auto_now_add` field,
+    so seeded rows can be spread over time.
+    """
+    field = model._meta.get_field(field)
+    auto_now_add = field.auto_now_add
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = auto_now_add
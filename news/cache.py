@@ -0,0 +1,122 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from .instrumentation import record_cache
+
+
+class TieredCache(BaseCache):
+    """
+    A small per-process LRU (L1) in front of a shared cache alias (L2).
+
+    Reads are answered from L1 when possible; misses fall through to L2 and
+    are kept locally for at most L1_TIMEOUT seconds. `set()` writes to L2
+    and to the writer's own L1. `delete()` drops the writer's L1 copy.
+    `incr()` and `add()` go to L2 and drop that copy too, so the next read
+    on the same worker goes to L2. No write reaches the other workers' L1:
+    they keep serving the value they read last for up to L1_TIMEOUT seconds.
+
+    That suits keys that never change in place, such as generation-versioned
+    fragments. It does not suit values that must be seen everywhere at once.
+    The fragment generation and the login lockout counters and blocks stay
+    in the shared "default" alias for that reason. Read through this cache,
+    a bumped generation could serve old fragments for up to L1_TIMEOUT on
+    the other workers, and a lockout could be missed there for as long.
+
+        "template_fragments": {
+            "BACKEND": "news.cache.TieredCache",
+            "OPTIONS": {"L2": "default", "L1_TIMEOUT": 30, "MAX_ENTRIES": 500},
+        }
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self._l2_alias = options.get("L2", "default")
+        self._l1_timeout = options.get("L1_TIMEOUT", 30)
+        self._l1 = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    # L1 holds (value, expires_at) under the L2 key, already versioned
+
+    def _l1_get(self, key):
+        with self._lock:
+            item = self._l1.get(key)
+            if item is None:
+                return None
+            if item[1] <= time.monotonic():
+                del self._l1[key]
+                return None
+            self._l1.move_to_end(key)
+            return item
+
+    def _l1_set(self, key, value, timeout):
+        ttl = self._l1_timeout if timeout is None else min(timeout, self._l1_timeout)
+        with self._lock:
+            self._l1[key] = (value, time.monotonic() + ttl)
+            self._l1.move_to_end(key)
+            while len(self._l1) > self._max_entries:
+                self._l1.popitem(last=False)
+
+    def _l1_delete(self, key):
+        with self._lock:
+            self._l1.pop(key, None)
+
+    def _key(self, key, version):
+        return self.make_and_validate_key(key, version=version)
+
+    def get(self, key, default=None, version=None):
+        item = self._l1_get(self._key(key, version))
+        if item is not None:
+            record_cache(hit=True)
+            return item[0]
+
+        sentinel = object()
+        value = self.l2.get(key, sentinel, version=version)
+        record_cache(hit=value is not sentinel)
+        if value is sentinel:
+            return default
+
+        self._l1_set(self._key(key, version), value, self._l1_timeout)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.l2.set(key, value, timeout, version=version)
+        # A TTL in seconds; get_backend_timeout() would give an expiry time
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is not None and timeout <= 0:
+            # Expires at once, as in L2
+            self._l1_delete(self._key(key, version))
+        else:
+            self._l1_set(self._key(key, version), value, timeout)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._l1_delete(self._key(key, version))
+        return self.l2.add(key, value, timeout, version=version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self._l1_delete(self._key(key, version))
+        return self.l2.delete(key, version=version)
+
+    def has_key(self, key, version=None):
+        return self._l1_get(self._key(key, version)) is not None or self.l2.has_key(key, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._l1_delete(self._key(key, version))
+        return self.l2.incr(key, delta, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._l1.clear()
+        self.l2.clear()
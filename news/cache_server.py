@@ -0,0 +1,288 @@
+"""
+A small in-memory server speaking the Redis protocol (RESP).
+
+It implements the commands Django's RedisCache backend sends, so tests and
+local multi-process runs can point CACHE_URL at it instead of a real Redis:
+
+    server = StandInCacheServer().start()
+    ...  # CACHE_URL = server.url
+    server.stop()
+
+Not meant for production: no persistence, eviction or authentication.
+"""
+import socketserver
+import threading
+import time
+
+
+class _Error(Exception):
+    pass
+
+
+class _Store:
+    """
+    Keys → (value, deadline) with lazy expiry. Guarded by one lock, every
+    command runs atomically as it would in Redis.
+    """
+
+    def __init__(self):
+        self.data = {}
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, deadline = item
+        if deadline is not None and deadline <= time.monotonic():
+            del self.data[key]
+            return None
+        return item
+
+    def get(self, key):
+        item = self._live(key)
+        return item[0] if item else None
+
+    def set(self, key, value, ttl=None):
+        deadline = time.monotonic() + ttl if ttl is not None else None
+        self.data[key] = (value, deadline)
+
+    def expire(self, key, ttl):
+        item = self._live(key)
+        if item is None:
+            return 0
+        self.set(key, item[0], ttl)
+        return 1
+
+
+def _int(value):
+    try:
+        return int(value)
+    except ValueError:
+        raise _Error("ERR value is not an integer or out of range")
+
+
+class _Commands:
+
+    def __init__(self, store):
+        self.store = store
+
+    def ping(self, *args):
+        return args[0] if args else "PONG"
+
+    def select(self, db):
+        return "OK"
+
+    def get(self, key):
+        return self.store.get(key)
+
+    def mget(self, *keys):
+        return [self.store.get(key) for key in keys]
+
+    def set(self, key, value, *options):
+        ttl, nx, xx = None, False, False
+        options = [o.upper() for o in options]
+        i = 0
+        while i < len(options):
+            if options[i] == b"EX":
+                ttl = _int(options[i + 1])
+                i += 1
+            elif options[i] == b"PX":
+                ttl = _int(options[i + 1]) / 1000
+                i += 1
+            elif options[i] == b"NX":
+                nx = True
+            elif options[i] == b"XX":
+                xx = True
+            else:
+                raise _Error("ERR syntax error")
+            i += 1
+
+        exists = self.store._live(key) is not None
+        if (nx and exists) or (xx and not exists):
+            return None
+        self.store.set(key, value, ttl)
+        return "OK"
+
+    def mset(self, *pairs):
+        for key, value in zip(pairs[::2], pairs[1::2]):
+            self.store.set(key, value)
+        return "OK"
+
+    def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self.store._live(key):
+                del self.store.data[key]
+                removed += 1
+        return removed
+
+    def exists(self, *keys):
+        return sum(self.store._live(key) is not None for key in keys)
+
+    def incrby(self, key, delta):
+        item = self.store._live(key)
+        value = _int(item[0]) if item else 0
+        value += _int(delta)
+        self.store.data[key] = (str(value).encode(), item[1] if item else None)
+        return value
+
+    def incr(self, key):
+        return self.incrby(key, b"1")
+
+    def decrby(self, key, delta):
+        return self.incrby(key, str(-_int(delta)).encode())
+
+    def expire(self, key, seconds):
+        return self.store.expire(key, _int(seconds))
+
+    def pexpire(self, key, milliseconds):
+        return self.store.expire(key, _int(milliseconds) / 1000)
+
+    def persist(self, key):
+        item = self.store._live(key)
+        if item is None or item[1] is None:
+            return 0
+        self.store.set(key, item[0])
+        return 1
+
+    def ttl(self, key):
+        item = self.store._live(key)
+        if item is None:
+            return -2
+        if item[1] is None:
+            return -1
+        return round(item[1] - time.monotonic())
+
+    def flushdb(self, *args):
+        self.store.data.clear()
+        return "OK"
+
+    flushall = flushdb
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    protocol = 2
+
+    def handle(self):
+        commands = _Commands(self.server.store)
+        queued = None
+
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+
+            name = args[0].decode().lower()
+            if name == "quit":
+                self._write("OK")
+                return
+
+            if name == "hello":
+                self._write(self._hello(args[1:]))
+                continue
+
+            if name == "multi":
+                queued = []
+                self._write("OK")
+                continue
+            if name == "exec" and queued is not None:
+                with self.server.store.lock:
+                    results = [self._call(commands, *command) for command in queued]
+                queued = None
+                self._write(results)
+                continue
+            if queued is not None:
+                queued.append((name, args[1:]))
+                self._write("QUEUED")
+                continue
+
+            with self.server.store.lock:
+                self._write(self._call(commands, name, args[1:]))
+
+    def _hello(self, args):
+        # Protocol negotiation: RESP3 clients (redis-py 6+) open with HELLO 3
+        if args:
+            version = _int(args[0]) if args[0].isdigit() else 0
+            if version not in (2, 3):
+                return _Error("NOPROTO unsupported protocol version")
+            self.protocol = version
+        return {
+            "server": "stand-in",
+            "version": "7.0.0",
+            "proto": self.protocol,
+            "mode": "standalone",
+            "role": "master",
+            "modules": [],
+        }
+
+    def _call(self, commands, name, args):
+        method = getattr(commands, "delete" if name == "del" else name, None)
+        if method is None or name.startswith("_"):
+            return _Error(f"ERR unknown command '{name}'")
+        try:
+            return method(*args)
+        except TypeError:
+            return _Error(f"ERR wrong number of arguments for '{name}' command")
+        except _Error as error:
+            return error
+
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, as typed into telnet
+            return line.split() or self._read_command()
+
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _write(self, reply):
+        self.wfile.write(self._encode(reply))
+
+    def _encode(self, reply):
+        if reply is None:
+            return b"_\r\n" if self.protocol == 3 else b"$-1\r\n"
+        if isinstance(reply, dict):
+            items = [item for pair in reply.items() for item in pair]
+            if self.protocol == 2:
+                return self._encode(items)
+            return f"%{len(reply)}\r\n".encode() + b"".join(self._encode(i) for i in items)
+        if isinstance(reply, _Error):
+            return f"-{reply}\r\n".encode()
+        if isinstance(reply, str):
+            return f"+{reply}\r\n".encode()
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if isinstance(reply, list):
+            return f"*{len(reply)}\r\n".encode() + b"".join(self._encode(r) for r in reply)
+        return b"$%d\r\n%s\r\n" % (len(reply), reply)
+
+
+class StandInCacheServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.store = _Store()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address
+        return f"redis://{host}:{port}/0"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,127 @@
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Comment
+from .pagination import decode_cursor, encode_cursor, keyset_page
+
+THREADS_PER_PAGE = 20
+INLINE_REPLIES = 3
+REPLIES_PAGE_SIZE = 20
+
+
+def post_comments(post):
+    """
+    Every comment of a post with its author and profile.
+    """
+    return (
+        Comment.objects
+        .filter(post=post)
+        .select_related("user", "user__profile")
+    )
+
+
+def liked_comment_ids(user, post):
+    """
+    Ids of the comments on this post the user has liked, in one query.
+    """
+    if not user.is_authenticated:
+        return set()
+
+    return set(
+        Comment.likes.through.objects
+        .filter(user=user, comment__post=post)
+        .values_list("comment_id", flat=True)
+    )
+
+
+def build_comment_tree(comments):
+    """
+    Links comments to their children in a single pass.
+
+    `comments` must be ordered oldest first; each comment gets a `children`
+    list in that order. Returns the top-level comments.
+    """
+    by_id = {}
+    for comment in comments:
+        comment.children = []
+        by_id[comment.id] = comment
+
+    roots = []
+    for comment in by_id.values():
+        parent = by_id.get(comment.parent_id)
+        if parent:
+            parent.children.append(comment)
+        else:
+            roots.append(comment)
+
+    return roots
+
+
+def _collapse(comment, inline):
+    # Only the first few replies are rendered, the rest load on demand
+    comment.inline_replies = comment.children[:inline]
+    comment.more_replies = len(comment.children) - len(comment.inline_replies)
+    comment.replies_cursor = (
+        encode_cursor(comment.inline_replies[-1])
+        if comment.more_replies and comment.inline_replies
+        else None
+    )
+
+    for reply in comment.inline_replies:
+        reply.inline_replies = []
+        reply.more_replies = len(reply.children)
+        reply.replies_cursor = None
+
+
+def comment_threads(post, after=None, per_page=THREADS_PER_PAGE, inline=INLINE_REPLIES):
+    """
+    Returns (threads, next_cursor): a page of top-level comments, newest
+    first, each with its first `inline` replies attached.
+    """
+    comments = list(post_comments(post).order_by("created_at", "id"))
+    roots = build_comment_tree(comments)
+    roots.reverse()
+
+    position = decode_cursor(after)
+    if position:
+        roots = [c for c in roots if (c.created_at, c.id) < position]
+
+    threads = roots[:per_page]
+    next_cursor = encode_cursor(threads[-1]) if len(roots) > per_page else None
+
+    for comment in threads:
+        _collapse(comment, inline)
+
+    return threads, next_cursor
+
+
+def comment_replies(comment, after=None, page_size=REPLIES_PAGE_SIZE):
+    """
+    Returns (replies, next_cursor): direct replies of a comment, oldest first.
+    """
+    # Correlated count instead of JOIN + GROUP BY, so the page can still be
+    # read in (parent, created_at, id) index order
+    nested = (
+        Comment.objects
+        .filter(parent=OuterRef("pk"))
+        .order_by()
+        .values("parent")
+        .annotate(total=Count("*"))
+        .values("total")
+    )
+
+    replies = (
+        Comment.objects
+        .filter(parent=comment)
+        .select_related("user", "user__profile")
+        .annotate(replies_count=Coalesce(Subquery(nested), 0))
+    )
+
+    items, next_cursor = keyset_page(replies, after=after, page_size=page_size, ascending=True)
+
+    for reply in items:
+        reply.inline_replies = []
+        reply.more_replies = reply.replies_count
+        reply.replies_cursor = None
+
+    return items, next_cursor
@@ -0,0 +1,164 @@
+"""
+Validators for Django's conditional view processing.
+
+Each function is cheap compared to the view it guards: the article stamp is
+one indexed lookup of the post and its comment aggregates, the feed stamp
+comes from the cache. When the client's copy is current the view answers 304 without rendering.
+
+The a-prefixed coroutines are the same validators for the async views
+(news/async_views.py), used through `acondition`.
+"""
+import hashlib
+from functools import wraps
+
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .fragments import FEED_FILTERS, aget_generation, get_generation
+from .models import Comment, Post
+
+
+def _etag(*parts):
+    return hashlib.md5("|".join(str(part) for part in parts).encode()).hexdigest()
+
+
+def _viewer(request):
+    # Pages carry the viewer's profile and liked state, so stamps are per user
+    return request.user.pk if request.user.is_authenticated else "anon"
+
+
+async def _aviewer(request):
+    user = await request.auser()
+    return user.pk if user.is_authenticated else "anon"
+
+
+def _comments_of_post(aggregate):
+    # Correlated per-post aggregate, read through comment_post_created_idx
+    return Subquery(
+        Comment.objects
+        .filter(post=OuterRef("pk"))
+        .order_by()
+        .values("post")
+        .annotate(value=aggregate)
+        .values("value")
+    )
+
+
+def _version_rows(post_id):
+    return (
+        Post.objects
+        .filter(pk=post_id)
+        .values("created_at", "like_count")
+        .annotate(
+            last_comment=_comments_of_post(Max("created_at")),
+            comment_count=_comments_of_post(Count("*")),
+            comment_likes=_comments_of_post(Sum("like_count")),
+            last_audio=_comments_of_post(Max("audio_updated_at")),
+        )[:1]
+    )
+
+
+def post_version(request, post_id):
+    """
+    The article's version stamp, looked up once per request: creation time,
+    like counter, the latest comment, count and comment likes, and the
+    latest voice comment processing.
+    """
+    if not hasattr(request, "_post_version"):
+        rows = _version_rows(post_id)
+        request._post_version = rows[0] if rows else None
+    return request._post_version
+
+
+async def apost_version(request, post_id):
+    if not hasattr(request, "_post_version"):
+        rows = [row async for row in _version_rows(post_id)]
+        request._post_version = rows[0] if rows else None
+    return request._post_version
+
+
+def _post_etag(version, generation, viewer):
+    # The generation covers edits and the related posts / category lists
+    return _etag(
+        version["created_at"].isoformat(),
+        version["like_count"],
+        version["last_comment"] and version["last_comment"].isoformat(),
+        version["comment_count"],
+        version["comment_likes"] or 0,
+        version["last_audio"] and version["last_audio"].isoformat(),
+        generation,
+        viewer,
+    )
+
+
+def _last_modified(version):
+    return max(filter(None, [version["created_at"], version["last_comment"], version["last_audio"]]))
+
+
+def post_etag(request, post_id):
+    version = post_version(request, post_id)
+    if version is None:
+        return None
+    return _post_etag(version, get_generation(), _viewer(request))
+
+
+async def apost_etag(request, post_id):
+    version = await apost_version(request, post_id)
+    if version is None:
+        return None
+    return _post_etag(version, await aget_generation(), await _aviewer(request))
+
+
+def post_last_modified(request, post_id):
+    version = post_version(request, post_id)
+    return _last_modified(version) if version else None
+
+
+async def apost_last_modified(request, post_id):
+    version = await apost_version(request, post_id)
+    return _last_modified(version) if version else None
+
+
+def feed_etag(request):
+    """
+    Feed-wide version: every publish bumps the fragment generation.
+    """
+    filters = [request.GET.get(name, "") for name in FEED_FILTERS]
+    return _etag(get_generation(), _viewer(request), *filters)
+
+
+async def afeed_etag(request):
+    filters = [request.GET.get(name, "") for name in FEED_FILTERS]
+    return _etag(await aget_generation(), await _aviewer(request), *filters)
+
+
+def acondition(etag_func=None, last_modified_func=None):
+    """
+    Django's `condition` for async views. Its validators run synchronously
+    and could not touch the ORM; these are awaited.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def inner(request, *args, **kwargs):
+            last_modified = None
+            if last_modified_func:
+                if dt := await last_modified_func(request, *args, **kwargs):
+                    last_modified = int(dt.timestamp())
+            etag = await etag_func(request, *args, **kwargs) if etag_func else None
+            etag = quote_etag(etag) if etag is not None else None
+
+            response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+
+            if request.method in ("GET", "HEAD"):
+                if last_modified and not response.has_header("Last-Modified"):
+                    response.headers["Last-Modified"] = http_date(last_modified)
+                if etag:
+                    response.headers.setdefault("ETag", etag)
+            return response
+
+        return inner
+
+    return decorator
@@ -0,0 +1,86 @@
+"""
+Timing of database connection setup.
+
+The news.db.postgresql backend (see DATABASES) measures every new
+connection (TCP, TLS and authentication, or a checkout from the psycopg
+pool) and every CONN_HEALTH_CHECKS ping of a reused connection.
+ConnectionTimingMiddleware adds both to the response as
+
+    Server-Timing: db-connect;dur=12.4, db-health;dur=0.3
+
+and keeps process-wide totals in `stats()`. A request that reuses a
+persistent connection reports neither.
+"""
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# The current request's timings. sync_to_async copies the context, so the
+# async views' ORM calls on the sync thread still report to their request.
+_request_timings = ContextVar("db_connection_timings", default=None)
+
+_lock = threading.Lock()
+_totals = {"requests": 0, "connects": 0, "connect_ms": 0.0, "health_checks": 0, "health_check_ms": 0.0}
+
+
+def _record(kind, started):
+    elapsed = (time.perf_counter() - started) * 1000
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[kind] = timings.get(kind, 0.0) + elapsed
+    with _lock:
+        _totals[f"{kind}s"] += 1
+        _totals[f"{kind}_ms"] += elapsed
+
+
+class TimedConnectionMixin:
+    """
+    For a DatabaseWrapper: times connect() and the health check.
+    """
+
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _record("connect", started)
+
+    def close_if_health_check_failed(self):
+        # Only pings when a reused connection has not been checked yet
+        if self.connection is None or not self.health_check_enabled or self.health_check_done:
+            return super().close_if_health_check_failed()
+
+        started = time.perf_counter()
+        super().close_if_health_check_failed()
+        _record("health_check", started)
+
+
+@contextmanager
+def request_timings():
+    """
+    Collects the timings of one request into the dict it yields, filled
+    in by the backend: "connect" and "health_check", in ms.
+    """
+    timings = {}
+    token = _request_timings.set(timings)
+    with _lock:
+        _totals["requests"] += 1
+    try:
+        yield timings
+    finally:
+        _request_timings.reset(token)
+
+
+def server_timing(timings):
+    names = {"connect": "db-connect", "health_check": "db-health"}
+    return ", ".join(f"{names[kind]};dur={ms:.1f}" for kind, ms in timings.items())
+
+
+def stats():
+    with _lock:
+        return dict(_totals)
+
+
+def reset_stats():
+    with _lock:
+        for key in _totals:
+            _totals[key] = 0
@@ -0,0 +1,11 @@
+from django.utils.functional import SimpleLazyObject
+
+from .fragments import get_generation
+
+
+def fragments(request):
+    """
+    The fragment generation for the {% cache %} keys of base.html and the
+    pages extending it. Only read from the cache when a template uses it.
+    """
+    return {"fragment_generation": SimpleLazyObject(get_generation)}
@@ -0,0 +1,174 @@
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+
+from django.contrib.auth.models import User
+from django.core.paginator import Paginator
+from django.db.models import Exists, OuterRef, Q, Value
+from django.db.models.functions import Coalesce, NullIf
+from django.utils import timezone
+
+from .middleware import ACTIVE_USER_MINUTES
+from .models import Category, Post, Story, UserPresence
+
+DASHBOARD_PAGE_SIZE = 24
+DASHBOARD_MAX_PAGE_SIZE = 100
+DEFAULT_AVATAR = "/static/images/users.jpg"
+
+
+def _media_url(field):
+    return field.url if field else ""
+
+
+def _post_row(post):
+    return {
+        "id": str(post.id),
+        "title": post.title,
+        "description": post.description,
+        "category_id": post.category_id,
+        "category": post.category.name,
+        "image": _media_url(post.image),
+        "video": _media_url(post.video),
+        "like_count": post.like_count,
+        "created_at": post.created_at.isoformat(),
+    }
+
+
+def _story_row(story):
+    return {
+        "id": str(story.id),
+        "link": story.link or "",
+        "description": story.description,
+        "image": _media_url(story.image),
+        "video": _media_url(story.video),
+        "created_at": story.created_at.isoformat(),
+    }
+
+
+def _user_row(user):
+    # `user` is a values() dict, fallbacks are already applied in SQL
+    return {
+        "id": user["id"],
+        "username": user["username"],
+        "provider": user["provider"],
+        "avatar": user["avatar"],
+        "is_active": user["is_online"],
+        "last_login": user["last_login"].isoformat() if user["last_login"] else None,
+        "date_joined": user["date_joined"].isoformat(),
+    }
+
+
+def _category_row(category):
+    return {
+        "id": category.id,
+        "name": category.name,
+        "created_at": category.created_at.isoformat(),
+    }
+
+
+def _users():
+    """
+    Non-superusers joined to their profile in one query, limited to the
+    columns the users table shows.
+    """
+    since = timezone.now() - timedelta(minutes=ACTIVE_USER_MINUTES)
+    online = UserPresence.objects.filter(user=OuterRef("pk"), last_seen__gte=since)
+
+    return (
+        User.objects
+        .filter(is_superuser=False)
+        .annotate(
+            is_online=Exists(online),
+            provider=Coalesce(NullIf("profile__provider", Value("")), Value("local")),
+            avatar=Coalesce(NullIf("profile__avatar", Value("")), Value(DEFAULT_AVATAR)),
+        )
+        .values(
+            "id", "username", "last_login", "date_joined",
+            "is_online", "provider", "avatar",
+        )
+    )
+
+
+# Each admin tab: base queryset, searchable columns, sortable columns,
+# default ordering and row serializer. Sorting and filtering happen in SQL.
+DASHBOARD_TABLES = {
+    "posts": {
+        "queryset": lambda: Post.objects.select_related("category"),
+        "search": ["title", "description", "category__name"],
+        "sort": ["created_at", "title", "like_count", "category__name"],
+        "default": ["-created_at", "-id"],
+        "row": _post_row,
+    },
+    "stories": {
+        "queryset": lambda: Story.objects.all(),
+        "search": ["link", "description"],
+        "sort": ["created_at", "link"],
+        "default": ["-created_at", "-id"],
+        "row": _story_row,
+    },
+    "users": {
+        "queryset": _users,
+        "search": ["username", "email", "profile__full_name"],
+        "sort": ["date_joined", "username", "last_login", "is_online"],
+        "default": ["-is_online", "-date_joined", "-pk"],
+        "row": _user_row,
+    },
+    "categories": {
+        "queryset": lambda: Category.objects.all(),
+        "search": ["name"],
+        "sort": ["name", "created_at", "id"],
+        "default": ["-id"],
+        "row": _category_row,
+    },
+}
+
+
+def _ordering(table, sort):
+    """
+    Whitelisted ORDER BY for a `sort` parameter such as "title" or "-created_at".
+    """
+    field = sort.removeprefix("-")
+    if field not in table["sort"]:
+        return table["default"]
+
+    # Keep the order stable across pages when the sort column has ties
+    return [sort, "-pk" if sort.startswith("-") else "pk"]
+
+
+def _int_param(value, default):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def table_page(name, params):
+    """
+    One page of a dashboard table as a JSON-ready dict, or None for an unknown table.
+    """
+    table = DASHBOARD_TABLES.get(name)
+    if table is None:
+        return None
+
+    queryset = table["queryset"]()
+
+    search = params.get("q", "").strip()
+    if search:
+        queryset = queryset.filter(
+            reduce(or_, (Q(**{f"{field}__icontains": search}) for field in table["search"]))
+        )
+
+    queryset = queryset.order_by(*_ordering(table, params.get("sort", "")))
+
+    page_size = _int_param(params.get("page_size"), DASHBOARD_PAGE_SIZE)
+    page_size = max(1, min(page_size, DASHBOARD_MAX_PAGE_SIZE))
+
+    page = Paginator(queryset, page_size).get_page(_int_param(params.get("page"), 1))
+
+    return {
+        "results": [table["row"](obj) for obj in page.object_list],
+        "page": page.number,
+        "num_pages": page.paginator.num_pages,
+        "count": page.paginator.count,
+        "has_next": page.has_next(),
+    }
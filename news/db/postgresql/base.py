@@ -0,0 +1,9 @@
+from django.db.backends.postgresql import base
+
+from news.connections import TimedConnectionMixin
+
+
+class DatabaseWrapper(TimedConnectionMixin, base.DatabaseWrapper):
+    """
+    Django's PostgreSQL backend, timing connection setup (news/connections.py).
+    """
@@ -0,0 +1,66 @@
+import hashlib
+import time
+from urllib.parse import urlencode
+
+from django.core.cache import cache, caches
+
+FRAGMENT_TIMEOUT = 60 * 60
+# Query parameters that change the home feed's content
+FEED_FILTERS = ("category", "media", "date", "from", "to", "sort")
+GENERATION_KEY = "fragments:generation"
+
+
+def get_generation():
+    """
+    Current generation of the home page fragments. Every cached fragment
+    key includes it, so bumping it retires all of them at once.
+    """
+    generation = cache.get(GENERATION_KEY)
+    if generation is None:
+        # Seeded from the clock so an evicted counter never restarts at a
+        # value whose fragments are still cached
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+        generation = cache.get(GENERATION_KEY)
+    return generation
+
+
+async def aget_generation():
+    generation = await cache.aget(GENERATION_KEY)
+    if generation is None:
+        await cache.aadd(GENERATION_KEY, time.time_ns(), None)
+        generation = await cache.aget(GENERATION_KEY)
+    return generation
+
+
+def bump_generation():
+    try:
+        cache.incr(GENERATION_KEY)
+    except ValueError:
+        cache.add(GENERATION_KEY, time.time_ns(), None)
+
+
+def fragment_key(name, params):
+    """
+    Cache key for one fragment under the current generation, varied by the
+    request parameters that change its content.
+    """
+    query = urlencode(sorted((k, v or "") for k, v in params.items()))
+    digest = hashlib.md5(query.encode()).hexdigest()
+    return f"fragment:{name}:{get_generation()}:{digest}"
+
+
+def cached_fragment(name, params, build):
+    """
+    Returns the cached value of a fragment, calling `build()` to render and
+    store it on a miss.
+
+    Fragments live in the same cache as the {% cache %} template tag; the
+    generation itself is always read from the shared default cache.
+    """
+    fragments = caches["template_fragments"]
+    key = fragment_key(name, params)
+    value = fragments.get(key)
+    if value is None:
+        value = build()
+        fragments.set(key, value, FRAGMENT_TIMEOUT)
+    return value
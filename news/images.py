@@ -0,0 +1,170 @@
+"""
+Responsive renditions of post and story images.
+
+When an image is uploaded it is decoded once with Pillow and written out
+at fixed widths as AVIF, WebP and JPEG, next to a tiny blurred WebP that
+is inlined as a data URI placeholder. The result is stored on the object
+(`image_renditions`):
+
+    {"key": "post/<pk>/<token>", "width": 1600, "height": 900,
+     "widths": [320, 640, 960, 1280], "formats": ["avif", "webp", "jpeg"],
+     "placeholder": "data:image/webp;base64,..."}
+
+and the `{% responsive_image %}` tag turns it into a <picture> with
+srcsets, so browsers fetch the smallest file that fills the slot. Objects
+without renditions keep serving the original upload;
+`manage.py generate_image_renditions` backfills them.
+
+Files are written to IMAGE_RENDITION_ROOT and served from
+IMAGE_RENDITION_URL. Every upload gets a new key, so they can be cached
+as immutable.
+"""
+import base64
+import io
+import logging
+import uuid
+
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from PIL import Image, ImageFilter, ImageOps, features
+
+logger = logging.getLogger(__name__)
+
+RENDITION_WIDTHS = (320, 640, 960, 1280)
+PLACEHOLDER_WIDTH = 16
+
+# Modern formats first, JPEG is the <img> fallback
+_ENCODERS = (
+    ("avif", "image/avif", {"quality": 50, "speed": 6}),
+    ("webp", "image/webp", {"quality": 78, "method": 4}),
+    ("jpeg", "image/jpeg", {"quality": 80, "optimize": True, "progressive": True}),
+)
+_PIL_FORMATS = {"avif": "AVIF", "webp": "WEBP", "jpeg": "JPEG"}
+MIME_TYPES = {name: mime for name, mime, _ in _ENCODERS}
+
+FETCH_TIMEOUT = 30
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def storage():
+    return FileSystemStorage(
+        location=_setting("IMAGE_RENDITION_ROOT", f"{settings.MEDIA_ROOT}/renditions"),
+        base_url=_setting("IMAGE_RENDITION_URL", f"{settings.MEDIA_URL}renditions/"),
+    )
+
+
+def available_formats():
+    # AVIF needs a Pillow built with libavif
+    return [name for name, _, _ in _ENCODERS if name != "avif" or features.check("avif")]
+
+
+def rendition_name(key, width, fmt):
+    return f"{key}/{width}.{'jpg' if fmt == 'jpeg' else fmt}"
+
+
+def _widths(source_width):
+    widths = [w for w in RENDITION_WIDTHS if w <= source_width]
+    # Images narrower than the smallest width are re-encoded at their own size
+    return widths or [source_width]
+
+
+def _placeholder(image):
+    height = max(1, round(image.height * PLACEHOLDER_WIDTH / image.width))
+    small = image.resize((PLACEHOLDER_WIDTH, height), Image.Resampling.BILINEAR)
+    small = small.filter(ImageFilter.GaussianBlur(1))
+
+    buffer = io.BytesIO()
+    small.save(buffer, "WEBP", quality=40)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode()
+
+
+def build(source, prefix, pk):
+    """
+    Writes the renditions of `source` (a path or file object) and returns
+    the dict to store in `image_renditions`.
+    """
+    with Image.open(source) as image:
+        # JPEGs can be decoded at a fraction of their size, which is most of
+        # the cost for camera uploads
+        image.draft("RGB", (RENDITION_WIDTHS[-1], 1))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    store = storage()
+    key = f"{prefix}/{uuid.UUID(str(pk)).hex}/{uuid.uuid4().hex[:8]}"
+    formats = available_formats()
+    widths = _widths(image.width)
+
+    for width in widths:
+        height = max(1, round(image.height * width / image.width))
+        resized = image if width == image.width else image.resize((width, height), Image.Resampling.LANCZOS)
+
+        for name, _, options in _ENCODERS:
+            if name not in formats:
+                continue
+            buffer = io.BytesIO()
+            resized.save(buffer, _PIL_FORMATS[name], **options)
+            store.save(rendition_name(key, width, name), ContentFile(buffer.getvalue()))
+
+    return {
+        "key": key,
+        "width": image.width,
+        "height": image.height,
+        "widths": widths,
+        "formats": formats,
+        "placeholder": _placeholder(image),
+    }
+
+
+def safe_build(source, prefix, pk):
+    """
+    `build`, but a file Pillow cannot read leaves the object on its
+    original image instead of failing the upload.
+    """
+    try:
+        return build(source, prefix, pk)
+    except Exception:
+        logger.exception("Could not build renditions for %s %s", prefix, pk)
+        return {}
+
+
+def discard(renditions):
+    if not renditions:
+        return
+
+    store = storage()
+    for width in renditions["widths"]:
+        for fmt in renditions["formats"]:
+            store.delete(rendition_name(renditions["key"], width, fmt))
+
+
+def _open_original(field):
+    # Story images are Django files, post images Cloudinary resources
+    if hasattr(field, "open"):
+        field.open("rb")
+        return field
+
+    response = requests.get(field.url, timeout=FETCH_TIMEOUT)
+    response.raise_for_status()
+    return io.BytesIO(response.content)
+
+
+def refresh(obj, prefix):
+    """
+    Rebuilds the renditions of `obj` from its current image and drops the
+    previous set.
+    """
+    source = _open_original(obj.image)
+    try:
+        renditions = build(source, prefix, obj.pk)
+    finally:
+        source.close()
+
+    previous = obj.image_renditions
+    type(obj).objects.filter(pk=obj.pk).update(image_renditions=renditions)
+    obj.image_renditions = renditions
+    discard(previous)
@@ -0,0 +1,235 @@
+"""
+Per-request instrumentation: query count and database time, template
+render time and fragment cache hits / misses.
+
+InstrumentationMiddleware collects them for every request and
+
+* sends them back as a Server-Timing header (browser dev tools show it
+  next to the request):
+
+      Server-Timing: db;dur=8.2;desc="6 queries", tpl;dur=3.1, cache;desc="hit=4 miss=1", total;dur=14.0
+
+* adds them to histograms per view, served as JSON by `serve_metrics`
+  (/metrics/) to superusers and scrapers sending METRICS_TOKEN (each
+  worker process keeps its own)
+* checks the query count against QUERY_BUDGETS, a budget per URL name.
+  Going over it logs a warning, or raises QueryBudgetExceeded with
+  QUERY_BUDGET_RAISE, which the test runner (news/testing.py) turns on
+  so a new N+1 fails the suite.
+
+Queries are timed by a wrapper every connection gets when it is created
+(news/signals.py), templates by InstrumentedTemplates (the TEMPLATES
+backend) and fragments by news.cache.TieredCache.
+"""
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from django.utils.crypto import constant_time_compare
+from django.template.backends.django import DjangoTemplates
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+
+_current = ContextVar("request_metrics", default=None)
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _add(name, amount):
+    metrics = _current.get()
+    if metrics is not None:
+        metrics[name] += amount
+
+
+# Collectors, called by the query wrapper, the template backend and the cache
+
+def time_query(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        _add("queries", 1)
+        _add("db_ms", (time.perf_counter() - started) * 1000)
+
+
+def record_cache(hit):
+    _add("cache_hits" if hit else "cache_misses", 1)
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+        self.origin = template.origin
+
+    def render(self, context=None, request=None):
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            _add("template_ms", (time.perf_counter() - started) * 1000)
+
+
+class InstrumentedTemplates(DjangoTemplates):
+    """
+    The Django template backend, timing each top-level render.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+# Aggregation
+
+class Histogram:
+    """
+    Cumulative bucket counts, like a Prometheus histogram.
+    """
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def as_dict(self):
+        cumulative, total = {}, 0
+        for bound, count in zip([*self.buckets, "+Inf"], self.counts):
+            total += count
+            cumulative[str(bound)] = total
+        return {"buckets": cumulative, "sum": round(self.sum, 3), "count": self.count}
+
+
+_lock = threading.Lock()
+_views = {}
+
+
+def _view_metrics(view):
+    if view not in _views:
+        _views[view] = {
+            "latency_ms": Histogram(LATENCY_BUCKETS_MS),
+            "db_ms": Histogram(LATENCY_BUCKETS_MS),
+            "template_ms": Histogram(LATENCY_BUCKETS_MS),
+            "queries": Histogram(QUERY_BUCKETS),
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "over_budget": 0,
+        }
+    return _views[view]
+
+
+def _observe(view, metrics, over_budget):
+    with _lock:
+        stored = _view_metrics(view)
+        for name in ("latency_ms", "db_ms", "template_ms", "queries"):
+            stored[name].observe(metrics[name])
+        stored["cache_hits"] += metrics["cache_hits"]
+        stored["cache_misses"] += metrics["cache_misses"]
+        stored["over_budget"] += over_budget
+
+
+def snapshot():
+    with _lock:
+        return {
+            view: {
+                name: value.as_dict() if isinstance(value, Histogram) else value
+                for name, value in stored.items()
+            }
+            for view, stored in sorted(_views.items())
+        }
+
+
+def reset():
+    with _lock:
+        _views.clear()
+
+
+# Requests
+
+def start_request():
+    metrics = {
+        "queries": 0, "db_ms": 0.0, "template_ms": 0.0, "cache_hits": 0, "cache_misses": 0,
+        "started": time.perf_counter(),
+    }
+    return metrics, _current.set(metrics)
+
+
+def server_timing(metrics):
+    return ", ".join([
+        f'db;dur={metrics["db_ms"]:.1f};desc="{metrics["queries"]} queries"',
+        f'tpl;dur={metrics["template_ms"]:.1f}',
+        f'cache;desc="hit={metrics["cache_hits"]} miss={metrics["cache_misses"]}"',
+        f'total;dur={metrics["latency_ms"]:.1f}',
+    ])
+
+
+def add_server_timing(response, value):
+    # Several middleware report timings; keep them all
+    if response.has_header("Server-Timing"):
+        value = f'{response["Server-Timing"]}, {value}'
+    response["Server-Timing"] = value
+
+
+def finish_request(request, response, metrics, token):
+    """
+    Adds the request to its view's metrics and the Server-Timing header,
+    then checks the query budget.
+    """
+    _current.reset(token)
+    metrics["latency_ms"] = (time.perf_counter() - metrics["started"]) * 1000
+
+    match = getattr(request, "resolver_match", None)
+    view = match.view_name if match else "unresolved"
+
+    budget = _setting("QUERY_BUDGETS", {}).get(view)
+    over_budget = budget is not None and metrics["queries"] > budget
+
+    _observe(view, metrics, over_budget)
+    add_server_timing(response, server_timing(metrics))
+
+    if over_budget:
+        message = f"{view} ran {metrics['queries']} queries, over its budget of {budget} ({request.path})"
+        if _setting("QUERY_BUDGET_RAISE", False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+    return response
+
+
+def _may_read_metrics(request):
+    token = _setting("METRICS_TOKEN", "")
+    scheme, _, sent = request.headers.get("Authorization", "").partition(" ")
+    if token and scheme.lower() == "bearer" and constant_time_compare(sent, token):
+        return True
+    # Behind a proxy on the same host every request looks local, so the
+    # address proves nothing
+    return request.user.is_superuser
+
+
+def serve_metrics(request):
+    """
+    Per-view histograms of this worker process, for superusers and for
+    scrapers sending "Authorization: Bearer <METRICS_TOKEN>".
+    """
+    if not _may_read_metrics(request):
+        raise Http404
+    return JsonResponse({"views": snapshot()})
@@ -0,0 +1,35 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def toggle_like(likes, target, user, field):
+    """
+    Likes or unlikes `target` for `user` and returns (liked, like_count).
+
+    `likes` is the like table (PostLike or the Comment.likes through model)
+    and `field` the name of its foreign key to `target`. The toggle is one
+    indexed DELETE, falling back to one INSERT, on the (target, user) unique
+    key; the counter is adjusted with F() and read back by primary key.
+    """
+    lookup = {f"{field}_id": target.pk, "user_id": user.pk}
+    model = type(target)
+
+    with transaction.atomic():
+        deleted, _ = likes.objects.filter(**lookup).delete()
+
+        if deleted:
+            liked, delta = False, -1
+        else:
+            liked, delta = True, 1
+            try:
+                with transaction.atomic():
+                    likes.objects.create(**lookup)
+            except IntegrityError:
+                # A concurrent request (double click) inserted it first
+                delta = 0
+
+        if delta:
+            model.objects.filter(pk=target.pk).update(like_count=F("like_count") + delta)
+
+    like_count = model.objects.values_list("like_count", flat=True).get(pk=target.pk)
+    return liked, like_count
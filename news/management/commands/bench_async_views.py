@@ -0,0 +1,139 @@
+import asyncio
+import importlib
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.db.backends.signals import connection_created
+from django.test import AsyncClient, override_settings
+from django.urls import clear_url_caches, reverse
+
+from news import urls as news_urls
+from news.benchmarks import benchmark_client, percentiles
+from news.models import Category, Comment, Post
+from news_backend import urls as project_urls
+
+
+class Command(BaseCommand):
+    help = (
+        "Load the article page and the like endpoint concurrently through "
+        "the sync views (threaded, as WSGI workers) and the async views (one "
+        "event loop, as an ASGI worker). Seed data is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=32)
+        parser.add_argument(
+            "--threads", type=int, default=8,
+            help="Worker threads of the WSGI run (gunicorn --threads).",
+        )
+        parser.add_argument(
+            "--db-latency-ms", type=float, default=0,
+            help="Added to every query, like a database across the network.",
+        )
+
+    def handle(self, *args, **options):
+        if options["db_latency_ms"]:
+            self._add_latency(options["db_latency_ms"] / 1000)
+
+        user, post = self._seed()
+        try:
+            targets = [
+                ("newsview", "get", reverse("newsview", args=[post.id]), {}),
+                ("post_like", "post", reverse("post_like"), {"post_id": str(post.id)}),
+            ]
+            self.stdout.write(f"{'view':<10} {'mode':<6} {'req/s':>8} {'median ms':>10} {'p95 ms':>10}")
+
+            for name, method, url, data in targets:
+                timings, elapsed = self._run_wsgi(user, method, url, data, options)
+                self._report(name, "wsgi", timings, elapsed)
+
+                with override_settings(ASYNC_VIEWS=True):
+                    self._reload_urls()
+                    timings, elapsed = asyncio.run(self._run_asgi(user, method, url, data, options))
+                self._reload_urls()
+                self._report(name, "asgi", timings, elapsed)
+        finally:
+            post.category.delete()
+            user.delete()
+
+    def _seed(self):
+        user = User.objects.create_user("bench-async")
+        post = Post.objects.create(
+            title="Async benchmark",
+            category=Category.objects.create(name="bench-async"),
+        )
+        Comment.objects.bulk_create(
+            [Comment(user=user, post=post, text=f"Comment {i}") for i in range(20)]
+        )
+        return user, post
+
+    def _add_latency(self, seconds):
+        def slow(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow)
+
+        connection_created.connect(install, weak=False)
+
+    def _reload_urls(self):
+        importlib.reload(news_urls)
+        importlib.reload(project_urls)
+        clear_url_caches()
+
+    def _run_wsgi(self, user, method, url, data, options):
+        local = threading.local()
+
+        def call(_):
+            if not hasattr(local, "client"):
+                local.client = benchmark_client()
+                local.client.force_login(user)
+            client = local.client
+            started = time.perf_counter()
+            response = getattr(client, method)(url, data)
+            elapsed = (time.perf_counter() - started) * 1000
+            close_old_connections()
+            return elapsed, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["threads"]) as pool:
+            samples = list(pool.map(call, range(options["requests"])))
+        return self._checked(url, samples), time.perf_counter() - started
+
+    async def _run_asgi(self, user, method, url, data, options):
+        client = benchmark_client(AsyncClient)
+        await client.aforce_login(user)
+        slots = asyncio.Semaphore(options["concurrency"])
+
+        async def call():
+            async with slots:
+                started = time.perf_counter()
+                response = await getattr(client, method)(url, data)
+                return (time.perf_counter() - started) * 1000, response.status_code
+
+        started = time.perf_counter()
+        samples = await asyncio.gather(*(call() for _ in range(options["requests"])))
+        return self._checked(url, samples), time.perf_counter() - started
+
+    def _checked(self, url, samples):
+        """
+        The timings of (ms, status) samples, or an error when any request
+        was not answered by the view (a rejected host, a failed login).
+        """
+        statuses = Counter(status for _, status in samples if not 200 <= status < 300)
+        if statuses:
+            raise CommandError(f"{url} answered {dict(statuses)}, timings would not measure the view")
+        return [elapsed for elapsed, _ in samples]
+
+    def _report(self, name, mode, timings, elapsed):
+        median, p95 = percentiles(timings)
+        self.stdout.write(
+            f"{name:<10} {mode:<6} {len(timings) / elapsed:>8.1f} {median:>10.3f} {p95:>10.3f}"
+        )
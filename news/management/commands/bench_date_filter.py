@@ -0,0 +1,70 @@
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.utils import timezone
+
+from news.benchmarks import explicit_timestamps, percentiles, time_calls
+from news.models import Category, Post
+from news.views import _filtered_posts
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the old created_at__date filter with the indexed day range "
+        "on a seeded feed. Seed data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=1_000_000)
+        parser.add_argument("--days", type=int, default=365)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            day = self._seed(options["posts"], options["days"])
+
+            # The first feed page, as index renders it
+            old = lambda: list(
+                Post.objects.filter(created_at__date=day).order_by("-created_at", "-id")[:25]
+            )
+            request = RequestFactory().get("/", {"date": day.isoformat()})
+            new = lambda: list(_filtered_posts(request).order_by("-created_at", "-id")[:25])
+
+            self.stdout.write(f"{'filter':>12} {'median ms':>10} {'p95 ms':>10}")
+            for name, query in [("__date", old), ("range", new)]:
+                median, p95 = percentiles(time_calls(query, options["repeat"]))
+                self.stdout.write(f"{name:>12} {median:>10.3f} {p95:>10.3f}")
+
+            for name, queryset in [
+                ("__date", Post.objects.filter(created_at__date=day)),
+                ("range", _filtered_posts(request)),
+            ]:
+                plan = queryset.order_by("-created_at", "-id")[:25].explain()
+                self.stdout.write(f"\n{name}:\n{plan}")
+
+            transaction.set_rollback(True)
+
+    def _seed(self, count, days):
+        category = Category.objects.create(name="bench-date-filter")
+        now = timezone.now()
+        span = days * 86400
+
+        self.stdout.write(f"Seeding {count} posts over {days} days...")
+        with explicit_timestamps(Post):
+            for start in range(0, count, 10000):
+                Post.objects.bulk_create([
+                    Post(
+                        title=f"Bench {i}",
+                        category=category,
+                        created_at=now - timedelta(seconds=random.randrange(span)),
+                    )
+                    for i in range(start, min(start + 10000, count))
+                ])
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        return timezone.localdate(now - timedelta(days=days // 2))
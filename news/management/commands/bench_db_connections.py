@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.urls import reverse
+
+from news import connections
+from news.benchmarks import benchmark_client, percentiles, time_calls
+from news.models import Category, Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Time like_comment and post_like with a new database connection per "
+        "request and with a persistent one, as configured in DATABASES "
+        "(CONN_MAX_AGE, CONN_HEALTH_CHECKS, pool). Seed data is deleted "
+        "afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=200)
+        parser.add_argument("--max-age", type=int, default=600, help="CONN_MAX_AGE of the persistent run.")
+
+    def handle(self, *args, **options):
+        settings_dict = connection.settings_dict
+        configured = settings_dict["CONN_MAX_AGE"]
+
+        # psycopg's pool hands out connections per request by itself
+        if settings_dict["OPTIONS"].get("pool"):
+            modes = [("pooled", 0)]
+        else:
+            modes = [("per-request", 0), ("persistent", options["max_age"])]
+
+        user = User.objects.create_user("bench-connections")
+        post = Post.objects.create(
+            title="Connection benchmark",
+            category=Category.objects.create(name="bench-connections"),
+        )
+        comment = Comment.objects.create(user=user, post=post, text="bench")
+
+        client = benchmark_client()
+        client.force_login(user)
+        targets = [
+            ("like_comment", reverse("like_comment"), {"comment_id": str(comment.pk)}),
+            ("post_like", reverse("post_like"), {"post_id": str(post.pk)}),
+        ]
+
+        self.stdout.write(
+            f"{'view':<14} {'mode':<12} {'median ms':>10} {'p95 ms':>10} "
+            f"{'connects':>9} {'connect ms':>11} {'health ms':>10}"
+        )
+        try:
+            for mode, max_age in modes:
+                settings_dict["CONN_MAX_AGE"] = max_age
+                connection.close()
+
+                for name, url, data in targets:
+                    connections.reset_stats()
+                    timings = time_calls(lambda: self._request(client, url, data), options["repeat"])
+                    self._report(name, mode, timings, connections.stats())
+        finally:
+            settings_dict["CONN_MAX_AGE"] = configured
+            post.category.delete()
+            user.delete()
+
+    def _request(self, client, url, data):
+        # The test client skips the request_started / request_finished
+        # connection handling of a real server, so it is done here
+        close_old_connections()
+        response = client.post(url, data)
+        close_old_connections()
+        if response.status_code != 200:
+            raise CommandError(f"{url} answered {response.status_code}, timings would not measure the view")
+
+    def _report(self, name, mode, timings, stats):
+        median, p95 = percentiles(timings)
+        requests = stats["requests"] or 1
+        self.stdout.write(
+            f"{name:<14} {mode:<12} {median:>10.3f} {p95:>10.3f} {stats['connects']:>9} "
+            f"{stats['connect_ms'] / requests:>11.3f} {stats['health_check_ms'] / requests:>10.3f}"
+        )
@@ -0,0 +1,62 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+
+from news.benchmarks import percentiles, time_calls
+from news.models import Category, Comment, Post
+from news.views import like_comment
+
+
+class Command(BaseCommand):
+    help = (
+        "Time like_comment toggles on comments with increasing numbers of "
+        "existing likes. Seed data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="10,1000,10000,100000")
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        largest = max(sizes)
+
+        with transaction.atomic():
+            users = User.objects.bulk_create(
+                [User(username=f"bench-like-{i}") for i in range(largest + 1)],
+                batch_size=5000,
+            )
+            if users[0].pk is None:
+                users = list(User.objects.filter(username__startswith="bench-like-").order_by("id"))
+
+            viewer, likers = users[0], users[1:]
+            post = Post.objects.create(
+                title="Like benchmark",
+                category=Category.objects.create(name="bench-likes"),
+            )
+
+            self.stdout.write(f"{'likes':>10} {'median ms':>10} {'p95 ms':>10}")
+
+            for size in sizes:
+                self._report(size, self._time_toggles(post, viewer, likers[:size], options["repeat"]))
+
+            transaction.set_rollback(True)
+
+    def _time_toggles(self, post, viewer, likers, repeat):
+        comment = Comment.objects.create(user=viewer, post=post, text="bench")
+        through = Comment.likes.through
+        through.objects.bulk_create(
+            [through(comment_id=comment.pk, user_id=user.pk) for user in likers],
+            batch_size=5000,
+        )
+        Comment.objects.filter(pk=comment.pk).update(like_count=len(likers))
+
+        request = RequestFactory().post("/comment/like/", {"comment_id": str(comment.pk)})
+        request.user = viewer
+
+        return time_calls(lambda: like_comment(request), repeat)
+
+    def _report(self, size, timings):
+        median, p95 = percentiles(timings)
+        self.stdout.write(f"{size:>10} {median:>10.3f} {p95:>10.3f}")
@@ -0,0 +1,62 @@
+import random
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from news import search
+from news.benchmarks import percentiles, time_calls
+from news.models import Category, Post
+
+# A Zipf-ish vocabulary: a few words appear everywhere, most are rare
+VOCABULARY = [f"word{i}" for i in range(20000)]
+CUM_WEIGHTS = list(accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+
+
+class Command(BaseCommand):
+    help = (
+        "Time ranked full-text searches on a seeded set of posts "
+        "(1M by default). Seed data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=1_000_000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._seed(options["posts"])
+
+            queries = {
+                "common word": VOCABULARY[0],
+                "mid word": VOCABULARY[200],
+                "rare word": VOCABULARY[15000],
+                "two words": f"{VOCABULARY[3]} {VOCABULARY[40]}",
+            }
+
+            self.stdout.write(f"{'query':>14} {'page':>5} {'median ms':>10} {'p95 ms':>10}")
+            for name, query in queries.items():
+                for page in (1, 5):
+                    timings = time_calls(lambda: search.search_posts(query, page=page), options["repeat"])
+                    median, p95 = percentiles(timings)
+                    self.stdout.write(f"{name:>14} {page:>5} {median:>10.3f} {p95:>10.3f}")
+
+            transaction.set_rollback(True)
+
+    def _seed(self, count):
+        category = Category.objects.create(name="bench-search")
+        self.stdout.write(f"Seeding {count} posts...")
+
+        for start in range(0, count, 10000):
+            Post.objects.bulk_create([
+                Post(
+                    title=" ".join(random.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=6)),
+                    description=" ".join(random.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=40)),
+                    category=category,
+                )
+                for _ in range(start, min(start + 10000, count))
+            ])
+
+        # bulk_create skips the post_save receivers that keep the index current
+        search.install()
+        search.rebuild()
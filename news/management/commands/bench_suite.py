@@ -0,0 +1,249 @@
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from news.benchmarks import benchmark_client, summary
+from news.likes import toggle_like
+from news.models import Comment, Post, PostLike
+
+SCENARIOS = ("index", "newsview", "admin_dashboard", "post_like", "like_comment", "add_comment")
+
+# Reported by InstrumentationMiddleware (news/instrumentation.py)
+_QUERIES = re.compile(r'db;[^,]*desc="(\d+) queries"')
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive index, newsview, admin_dashboard, post_like, like_comment and "
+        "add_comment and report p50/p95/p99 latency, throughput and query "
+        "counts as JSON. Runs in process through the test client (as the "
+        "first ALLOWED_HOSTS entry), or with "
+        "--url against a running server from --concurrency threads (the "
+        "server must share this database and session store). Run seed_data "
+        "first; likes and comments made by the benchmark user are undone."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+        parser.add_argument("--requests", type=int, default=200, help="Measured requests per scenario.")
+        parser.add_argument("--warmup", type=int, default=10)
+        parser.add_argument("--url", help="Base URL of a running server, e.g. http://127.0.0.1:8000")
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--sample", type=int, default=1000, help="Requests pick from the newest N posts.")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+        parser.add_argument("--baseline", help="An earlier JSON report to compare p95 and throughput with.")
+
+    def handle(self, *args, **options):
+        scenarios = [name.strip() for name in options["scenarios"].split(",") if name.strip()]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        self.random = random.Random(options["seed"])
+        self.posts = list(Post.objects.order_by("-created_at").values_list("pk", flat=True)[:options["sample"]])
+        if not self.posts:
+            raise CommandError("No posts to request; run seed_data first.")
+        self.comments = list(
+            Comment.objects
+            .filter(post_id__in=self.posts, parent=None)
+            .values_list("pk", flat=True)[:options["sample"]]
+        )
+        if "like_comment" in scenarios and not self.comments:
+            raise CommandError("No comments to like; run seed_data first.")
+
+        started_at = timezone.now()
+        user = User.objects.create_superuser(f"bench-suite-{get_random_string(8).lower()}")
+        try:
+            run = self._run_http if options["url"] else self._run_client
+            results = {name: run(user, name, options) for name in scenarios}
+        finally:
+            self._cleanup(user)
+
+        # Latencies of rejected requests would describe the wrong code path
+        failed = {name: result["status"] for name, result in results.items() if result["errors"]}
+        if failed:
+            raise CommandError(
+                "Non-2xx responses, no report written: "
+                + "; ".join(f"{name} {statuses}" for name, statuses in failed.items())
+            )
+
+        report = {
+            "mode": "http" if options["url"] else "client",
+            "target": options["url"] or "test-client",
+            "started_at": started_at.isoformat(),
+            "database": connection.vendor,
+            "dataset": {
+                "posts": Post.objects.count(),
+                "comments": Comment.objects.count(),
+                "post_likes": PostLike.objects.count(),
+                "users": User.objects.count(),
+            },
+            "options": {
+                name: options[name] for name in ("requests", "warmup", "concurrency", "sample", "seed")
+            },
+            "scenarios": results,
+        }
+        if not options["url"]:
+            report["options"]["concurrency"] = 1
+
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w") as handle:
+                handle.write(output + "\n")
+            # stdout is free for the human-readable summary
+            notes = self.stdout
+            self._table(results, notes)
+        else:
+            self.stdout.write(output)
+            notes = self.stderr
+
+        if options["baseline"]:
+            with open(options["baseline"]) as handle:
+                self._compare(json.load(handle)["scenarios"], results, notes)
+
+    # Requests
+
+    def _request(self, name, rng):
+        post_id = str(rng.choice(self.posts))
+        if name == "index":
+            return "get", reverse("index"), None
+        if name == "newsview":
+            return "get", reverse("newsview", args=[post_id]), None
+        if name == "admin_dashboard":
+            return "get", reverse("admin-dashboard"), None
+        if name == "post_like":
+            return "post", reverse("post_like"), {"post_id": post_id}
+        if name == "like_comment":
+            return "post", reverse("like_comment"), {"comment_id": str(rng.choice(self.comments))}
+        return "post", reverse("add_comment"), {"post_id": post_id, "text": f"Benchmark comment {rng.random()}"}
+
+    def _queries(self, server_timing):
+        match = _QUERIES.search(server_timing or "")
+        return int(match.group(1)) if match else None
+
+    def _run_client(self, user, name, options):
+        client = benchmark_client()
+        client.force_login(user)
+
+        def call():
+            method, path, data = self._request(name, self.random)
+            started = time.perf_counter()
+            response = getattr(client, method)(path, data)
+            elapsed = (time.perf_counter() - started) * 1000
+            return elapsed, response.status_code, self._queries(response.get("Server-Timing"))
+
+        for _ in range(options["warmup"]):
+            call()
+
+        started = time.perf_counter()
+        samples = [call() for _ in range(options["requests"])]
+        return self._result(samples, time.perf_counter() - started)
+
+    def _run_http(self, user, name, options):
+        # A real session for the benchmark user, and a CSRF secret sent as
+        # both cookie and header
+        login = benchmark_client()
+        login.force_login(user)
+        session_id = login.cookies[settings.SESSION_COOKIE_NAME].value
+        csrf_token = get_random_string(32)
+        base_url = options["url"].rstrip("/")
+
+        remaining = Counter(warmup=options["warmup"], measured=options["requests"])
+        lock = threading.Lock()
+
+        def take():
+            with lock:
+                for phase in ("warmup", "measured"):
+                    if remaining[phase]:
+                        remaining[phase] -= 1
+                        return phase
+            return None
+
+        def worker(number):
+            rng = random.Random(options["seed"] * 1000 + number)
+            session = requests.Session()
+            session.cookies.set(settings.SESSION_COOKIE_NAME, session_id)
+            session.cookies.set(settings.CSRF_COOKIE_NAME, csrf_token)
+            session.headers.update({"X-CSRFToken": csrf_token, "Referer": base_url + "/"})
+
+            samples = []
+            while (phase := take()) is not None:
+                method, path, data = self._request(name, rng)
+                started = time.perf_counter()
+                try:
+                    response = session.request(method, base_url + path, data=data, timeout=30, allow_redirects=False)
+                    status, server_timing = response.status_code, response.headers.get("Server-Timing")
+                except requests.RequestException:
+                    status, server_timing = None, None
+                elapsed = (time.perf_counter() - started) * 1000
+                if phase == "measured":
+                    samples.append((elapsed, status, self._queries(server_timing)))
+            return samples
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["concurrency"]) as pool:
+            samples = [sample for batch in pool.map(worker, range(options["concurrency"])) for sample in batch]
+        return self._result(samples, time.perf_counter() - started)
+
+    def _result(self, samples, elapsed):
+        latencies = [latency for latency, _, _ in samples]
+        queries = [count for _, _, count in samples if count is not None]
+        statuses = Counter(str(status) if status else "error" for _, status, _ in samples)
+
+        return {
+            "requests": len(samples),
+            "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+            "status": dict(statuses),
+            "duration_s": round(elapsed, 3),
+            "throughput_rps": round(len(samples) / elapsed, 1),
+            "latency_ms": summary(latencies),
+            "queries": summary(queries) if queries else None,
+        }
+
+    def _cleanup(self, user):
+        # Unlike through toggle_like, so the like counters stay right;
+        # the benchmark's comments go with the user
+        for post_id in PostLike.objects.filter(user=user).values_list("post_id", flat=True):
+            toggle_like(PostLike, Post(pk=post_id), user, "post")
+        through = Comment.likes.through
+        for comment_id in through.objects.filter(user=user).values_list("comment_id", flat=True):
+            toggle_like(through, Comment(pk=comment_id), user, "comment")
+        user.delete()
+
+    # Output
+
+    def _table(self, results, out):
+        out.write(
+            f"{'scenario':<16} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8} {'errors':>7}"
+        )
+        for name, result in results.items():
+            latency = result["latency_ms"]
+            queries = result["queries"]["max"] if result["queries"] else "-"
+            out.write(
+                f"{name:<16} {result['throughput_rps']:>8} {latency['p50']:>9} {latency['p95']:>9} "
+                f"{latency['p99']:>9} {queries:>8} {result['errors']:>7}"
+            )
+
+    def _compare(self, baseline, results, out):
+        out.write(f"\n{'scenario':<16} {'p95 change':>11} {'req/s change':>13}")
+        for name, result in results.items():
+            if name not in baseline:
+                continue
+            before = baseline[name]
+            p95 = result["latency_ms"]["p95"] / before["latency_ms"]["p95"] - 1
+            throughput = result["throughput_rps"] / before["throughput_rps"] - 1
+            out.write(f"{name:<16} {p95:>+11.1%} {throughput:>+13.1%}")
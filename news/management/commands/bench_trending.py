@@ -0,0 +1,94 @@
+import random
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from news import trending
+from news.benchmarks import explicit_timestamps, percentiles, time_calls
+from news.models import Category, Comment, Post, PostLike
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the materialized trending feed with a live GROUP BY over "
+        "likes and comments. Seed data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=100_000)
+        parser.add_argument("--likes", type=int, default=500_000)
+        parser.add_argument("--comments", type=int, default=100_000)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._seed(options["posts"], options["likes"], options["comments"])
+
+            started = time.perf_counter()
+            trending.refresh()
+            self.stdout.write(f"refresh: {(time.perf_counter() - started) * 1000:.0f} ms\n")
+
+            since = timezone.now() - trending.TRENDING_WINDOW
+
+            # What the feed would have to run per request without the table
+            live = lambda: list(
+                Post.objects
+                .annotate(
+                    score=(
+                        Count("likes", filter=Q(likes__created_at__gte=since), distinct=True)
+                        * trending.LIKE_WEIGHT
+                        + Count("comments", filter=Q(comments__created_at__gte=since), distinct=True)
+                        * trending.COMMENT_WEIGHT
+                    )
+                )
+                .filter(score__gt=0)
+                .order_by("-score", "-id")[:24]
+            )
+            materialized = lambda: trending.trending_page(Post.objects.all())
+
+            self.stdout.write(f"{'query':>14} {'median ms':>10} {'p95 ms':>10}")
+            for name, query in [("GROUP BY", live), ("materialized", materialized)]:
+                median, p95 = percentiles(time_calls(query, options["repeat"]))
+                self.stdout.write(f"{name:>14} {median:>10.3f} {p95:>10.3f}")
+
+            transaction.set_rollback(True)
+
+    def _seed(self, posts, likes, comments):
+        self.stdout.write(f"Seeding {posts} posts, {likes} likes, {comments} comments...")
+        now = timezone.now()
+        category = Category.objects.create(name="bench-trending")
+        users = User.objects.bulk_create(
+            [User(username=f"bench-trending-{i}") for i in range(1000)]
+        )
+        if users[0].pk is None:
+            users = list(User.objects.filter(username__startswith="bench-trending-"))
+
+        post_ids = [
+            post.id for post in Post.objects.bulk_create(
+                [Post(title=f"Bench {i}", category=category) for i in range(posts)],
+                batch_size=10000,
+            )
+        ]
+
+        def recent():
+            return now - timedelta(seconds=random.randrange(14 * 86400))
+
+        with explicit_timestamps(PostLike), explicit_timestamps(Comment):
+            pairs = {(random.choice(users).pk, random.choice(post_ids)) for _ in range(likes)}
+            PostLike.objects.bulk_create(
+                [PostLike(user_id=u, post_id=p, created_at=recent()) for u, p in pairs],
+                batch_size=10000,
+            )
+            Comment.objects.bulk_create(
+                [
+                    Comment(user=random.choice(users), post_id=random.choice(post_ids),
+                            text="bench", created_at=recent())
+                    for _ in range(comments)
+                ],
+                batch_size=10000,
+            )
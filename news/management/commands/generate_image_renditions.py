@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from news import images
+from news.fragments import bump_generation
+from news.models import Post, Story
+
+
+class Command(BaseCommand):
+    help = (
+        "Build responsive renditions for post and story images that have "
+        "none yet (uploads from before the pipeline). --force rebuilds all."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true")
+
+    def handle(self, *args, **options):
+        built = failed = 0
+
+        for model, prefix in ((Post, "post"), (Story, "story")):
+            objects = model.objects.exclude(image__isnull=True).exclude(image="")
+            if not options["force"]:
+                objects = objects.filter(image_renditions={})
+
+            for obj in objects.only("pk", "image", "image_renditions").iterator():
+                try:
+                    images.refresh(obj, prefix)
+                    built += 1
+                except Exception as error:
+                    failed += 1
+                    self.stderr.write(f"{prefix} {obj.pk}: {error}")
+
+        if built:
+            # Cached feed and story fragments still point at the originals
+            bump_generation()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built renditions for {built} image(s), {failed} failed."
+        ))
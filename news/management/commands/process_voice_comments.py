@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news import voice
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-encode queued voice comments. Runs the queue once, or keeps "
+        "polling with --loop as a standalone worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true")
+        parser.add_argument("--interval", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        while True:
+            ready = voice.process_pending()
+            if ready:
+                self.stdout.write(self.style.SUCCESS(f"{ready} voice comment(s) processed."))
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from news import search
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the post search index if needed and rebuild it from news_post, "
+        "e.g. after rows were written with bulk_create or raw SQL."
+    )
+
+    def handle(self, *args, **options):
+        if not search.install() or not search.rebuild():
+            self.stdout.write(self.style.WARNING(
+                "This database has no full-text index, search uses icontains."
+            ))
+            return
+
+        self.stdout.write(self.style.SUCCESS("Search index rebuilt."))
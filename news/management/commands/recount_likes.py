@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from news.models import Comment, Post, PostLike
+
+
+def _repair(model, likes):
+    """
+    Rewrites `like_count` from the source table on rows that have drifted.
+    Returns the number of rows fixed.
+    """
+    actual = Coalesce(
+        Subquery(
+            likes.values("target").annotate(total=Count("*")).values("total"),
+            output_field=IntegerField(),
+        ),
+        0,
+    )
+
+    drifted = (
+        model.objects
+        .annotate(actual=actual)
+        .exclude(like_count=F("actual"))
+        .values("pk")
+    )
+
+    return model.objects.filter(pk__in=drifted).update(like_count=actual)
+
+
+class Command(BaseCommand):
+    help = "Recompute Post.like_count and Comment.like_count from the like tables"
+
+    def handle(self, *args, **options):
+        post_likes = (
+            PostLike.objects
+            .filter(post=OuterRef("pk"))
+            .annotate(target=F("post"))
+        )
+        comment_likes = (
+            Comment.likes.through.objects
+            .filter(comment=OuterRef("pk"))
+            .annotate(target=F("comment"))
+        )
+
+        posts = _repair(Post, post_likes)
+        comments = _repair(Comment, comment_likes)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired like counts on {posts} post(s) and {comments} comment(s)."
+        ))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news import related
+
+
+class Command(BaseCommand):
+    help = (
+        "Compute related posts for posts not computed yet (run after "
+        "publishing, e.g. from cron). --full recomputes the whole pool."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = related.refresh(full=options["full"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Updated related posts for {count} post(s) in {time.perf_counter() - started:.1f}s."
+        ))
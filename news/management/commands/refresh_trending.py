@@ -0,0 +1,20 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news import trending
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute time-decayed trending scores from recent likes and "
+        "comments. Run every few minutes, e.g. from cron."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        count = trending.refresh()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{count} trending post(s) in {time.perf_counter() - started:.1f}s."
+        ))
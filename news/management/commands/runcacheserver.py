@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from news.cache_server import StandInCacheServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the in-memory Redis stand-in so several local workers can share "
+        "one cache. Point CACHE_URL at the printed address."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=6379)
+
+    def handle(self, *args, **options):
+        server = StandInCacheServer(options["host"], options["port"])
+        self.stdout.write(self.style.SUCCESS(f"CACHE_URL={server.url}"))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from news.smtp_server import StandInSmtpServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the in-memory SMTP stand-in for local runs of the email outbox. "
+        "Point EMAIL_HOST / EMAIL_PORT at it with EMAIL_USE_TLS off."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=1025)
+
+    def handle(self, *args, **options):
+        server = StandInSmtpServer(options["host"], options["port"])
+        host, port = server.server_address
+        self.stdout.write(self.style.SUCCESS(f"EMAIL_HOST={host} EMAIL_PORT={port}"))
+
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stdout.write(f"{len(server.messages)} message(s) received.")
+            server.server_close()
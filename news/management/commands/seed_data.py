@@ -0,0 +1,204 @@
+import random
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from news.benchmarks import explicit_timestamps
+from news.fragments import bump_generation
+from news.models import Category, Comment, Post, PostLike, Profile, Story
+
+WORDS = (
+    "election government market economy climate storm football league final "
+    "minister court ruling health hospital vaccine school students budget tax "
+    "energy oil prices inflation bank startup technology phone launch space "
+    "mission science study research city council police traffic rail airport "
+    "festival film music award record season coach transfer injury weather "
+    "flood drought harvest farmers trade exports summit talks treaty border "
+    "protest strike workers wages housing rent mayor village river bridge"
+).split()
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with synthetic news data for load tests: categories, "
+        "posts, stories, users with profiles, threaded comments and likes, "
+        "written with bulk_create. Activity favours recent posts and like "
+        "counters match the like tables. Posts and stories carry no media. "
+        "Seed users are named <prefix>-<n> and share the password given by "
+        "--password."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=1_000_000)
+        parser.add_argument("--stories", type=int, default=200)
+        parser.add_argument("--users", type=int, default=20_000)
+        parser.add_argument("--comments", type=int, default=2_000_000)
+        parser.add_argument("--replies", type=float, default=0.4, help="Share of comments that are replies.")
+        parser.add_argument("--likes", type=int, default=5_000_000, help="Post likes.")
+        parser.add_argument("--comment-likes", type=int, default=2_000_000)
+        parser.add_argument("--days", type=int, default=365, help="Posts are spread over this many days.")
+        parser.add_argument("--batch-size", type=int, default=10_000)
+        parser.add_argument("--prefix", default="seed")
+        parser.add_argument("--password", default="seed-password")
+        parser.add_argument("--seed", type=int, default=1, help="Random seed, for repeatable data sets.")
+        parser.add_argument(
+            "--skip-derived", action="store_true",
+            help="Do not rebuild the search index, trending and related posts afterwards.",
+        )
+
+    def handle(self, *args, **options):
+        self.random = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.replies = options["replies"]
+        self.now = timezone.now()
+        started = time.perf_counter()
+
+        categories = self._categories(options["prefix"], options["categories"])
+        user_ids = self._users(options["prefix"], options["users"], options["password"])
+        self._stories(options["prefix"], options["stories"])
+        self._posts(categories, user_ids, options)
+
+        if not options["skip_derived"]:
+            self.stdout.write("Rebuilding search index, trending and related posts...")
+            call_command("rebuild_search_index", stdout=self.stdout)
+            call_command("refresh_trending", stdout=self.stdout)
+            call_command("refresh_related_posts", full=True, stdout=self.stdout)
+        bump_generation()
+
+        self.stdout.write(self.style.SUCCESS(f"Seeded in {time.perf_counter() - started:.1f}s."))
+
+    # Text and time
+
+    def _words(self, low, high):
+        return " ".join(self.random.choices(WORDS, k=self.random.randint(low, high)))
+
+    def _popular(self, count):
+        # Index into newest-first posts, heavily skewed towards the newest
+        return int(count * self.random.random() ** 3)
+
+    def _after(self, moment, days=3):
+        return min(self.now, moment + timedelta(seconds=self.random.randrange(days * 86400)))
+
+    # Rows
+
+    def _categories(self, prefix, count):
+        categories = [Category(name=f"{prefix} {word}") for word in self.random.sample(WORDS, min(count, len(WORDS)))]
+        Category.objects.bulk_create(categories, ignore_conflicts=True)
+        return list(Category.objects.filter(name__in=[category.name for category in categories]))
+
+    def _users(self, prefix, count, password):
+        self.stdout.write(f"Seeding {count} users with profiles...")
+        # Hashing once keeps this fast; every seed user can still log in
+        hashed = make_password(password)
+        taken = User.objects.filter(username__startswith=f"{prefix}-").count()
+
+        for start in range(taken, taken + count, self.batch_size):
+            end = min(start + self.batch_size, taken + count)
+            with transaction.atomic():
+                users = User.objects.bulk_create([
+                    User(username=f"{prefix}-{i}", email=f"{prefix}-{i}@example.com", password=hashed)
+                    for i in range(start, end)
+                ])
+                if users[0].pk is None:
+                    users = list(User.objects.filter(username__in=[user.username for user in users]))
+                Profile.objects.bulk_create([
+                    Profile(user=user, full_name=user.username.replace("-", " ").title(), email=user.email)
+                    for user in users
+                ])
+
+        return list(
+            User.objects.filter(username__startswith=f"{prefix}-").values_list("pk", flat=True)
+        )
+
+    def _stories(self, prefix, count):
+        with explicit_timestamps(Story):
+            Story.objects.bulk_create([
+                Story(
+                    link=f"https://example.com/{prefix}/{i}",
+                    description=self._words(4, 10),
+                    created_at=self.now - timedelta(seconds=self.random.randrange(2 * 86400)),
+                )
+                for i in range(count)
+            ], batch_size=self.batch_size)
+
+    def _posts(self, categories, user_ids, options):
+        count = options["posts"]
+        self.stdout.write(
+            f"Seeding {count} posts, {options['comments']} comments, "
+            f"{options['likes']} post likes and {options['comment_likes']} comment likes..."
+        )
+
+        # Decided up front, so every post is written once with its counter
+        likes = Counter(self._popular(count) for _ in range(options["likes"]))
+        comments = Counter(self._popular(count) for _ in range(options["comments"]))
+        likes_per_comment = options["comment_likes"] / max(options["comments"], 1)
+        span = options["days"] * 86400
+
+        for start in range(0, count, self.batch_size):
+            end = min(start + self.batch_size, count)
+            posts = [
+                Post(
+                    title=self._words(5, 10).capitalize(),
+                    description=self._words(30, 80),
+                    category=self.random.choice(categories),
+                    # Index 0 is the newest post
+                    created_at=self.now - timedelta(seconds=span * i / count + self.random.randrange(60)),
+                    like_count=min(likes[i], len(user_ids)),
+                )
+                for i in range(start, end)
+            ]
+
+            thread = []
+            for i, post in zip(range(start, end), posts):
+                thread.extend(self._comments(post, comments[i], user_ids, likes_per_comment))
+
+            with transaction.atomic():
+                with explicit_timestamps(Post):
+                    Post.objects.bulk_create(posts)
+                self._post_likes(posts, user_ids)
+                with explicit_timestamps(Comment):
+                    Comment.objects.bulk_create(thread, batch_size=self.batch_size)
+                self._comment_likes(thread, user_ids)
+
+            self.stdout.write(f"  {end}/{count} posts")
+
+    def _comments(self, post, count, user_ids, likes_per_comment):
+        thread = []
+        for _ in range(count):
+            # Most comments get few likes, a handful get many
+            like_count = int(self.random.expovariate(1 / likes_per_comment)) if likes_per_comment else 0
+            # Replies answer an earlier comment of the same post
+            parent = self.random.choice(thread) if thread and self.random.random() < self.replies else None
+            thread.append(Comment(
+                post=post,
+                parent=parent,
+                user_id=self.random.choice(user_ids),
+                text=self._words(3, 25),
+                created_at=self._after(parent.created_at if parent else post.created_at),
+                like_count=min(like_count, len(user_ids)),
+            ))
+        return thread
+
+    def _post_likes(self, posts, user_ids):
+        with explicit_timestamps(PostLike):
+            PostLike.objects.bulk_create([
+                PostLike(post=post, user_id=user_id, created_at=self._after(post.created_at))
+                for post in posts if post.like_count
+                for user_id in self.random.sample(user_ids, post.like_count)
+            ], batch_size=self.batch_size)
+
+    def _comment_likes(self, comments, user_ids):
+        through = Comment.likes.through
+        through.objects.bulk_create([
+            through(comment_id=comment.pk, user_id=user_id)
+            for comment in comments if comment.like_count
+            for user_id in self.random.sample(user_ids, comment.like_count)
+        ], batch_size=self.batch_size)
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news import outbox
+from news.models import OutboxEmail
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued emails over one SMTP connection. Runs the outbox once, "
+        "or keeps polling with --loop as a standalone worker. --dead lists "
+        "dead letters, --requeue-dead retries them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--loop", action="store_true")
+        parser.add_argument("--interval", type=float, default=5.0)
+        parser.add_argument("--dead", action="store_true")
+        parser.add_argument("--requeue-dead", action="store_true")
+
+    def handle(self, *args, **options):
+        if options["dead"]:
+            for email in outbox.dead_letters():
+                self.stdout.write(
+                    f"{email.created_at:%Y-%m-%d %H:%M} {', '.join(email.to)} "
+                    f"\"{email.subject}\" after {email.attempts} attempt(s): {email.last_error}"
+                )
+            return
+
+        if options["requeue_dead"]:
+            count = outbox.requeue_dead()
+            self.stdout.write(self.style.SUCCESS(f"Requeued {count} dead letter(s)."))
+            return
+
+        while True:
+            counts = outbox.drain()
+            if any(counts.values()):
+                self.stdout.write(
+                    f"Sent {counts[OutboxEmail.SENT]}, retrying {counts[OutboxEmail.PENDING]}, "
+                    f"dead {counts[OutboxEmail.DEAD]}."
+                )
+
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,307 @@
+"""
+Background media uploads.
+
+Views stage an uploaded file on local disk, save the post as "processing"
+and queue a MediaUpload job; the request returns without talking to the
+media storage. Jobs are run by a small in-process thread pool once the
+transaction commits, and `manage.py process_media_uploads` drains anything
+left behind (worker restarts, MEDIA_UPLOAD_WORKERS = 0). A failed attempt
+is resubmitted to the pool after RETRY_BACKOFF, doubling per attempt. On
+success the file is attached to the post, images get their responsive
+renditions (news/images.py) and the post flips to "ready"; the stored file
+that is no longer shown (the one replaced, or this one when a newer upload
+for the post is queued) is deleted from storage.
+
+The storage is pluggable through MEDIA_UPLOAD_BACKEND:
+
+* news.media.CloudinaryBackend  (default) pushes to Cloudinary
+* news.media.LocalBackend       copies into a directory, for local runs and tests
+"""
+import logging
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import images
+from .fragments import bump_generation
+from .models import MediaUpload, Post
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+# First retry after half a minute, doubling per attempt
+RETRY_BACKOFF = timedelta(seconds=30)
+# Running jobs older than this are assumed lost with their worker
+STALE_AFTER = timedelta(minutes=30)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def staging_dir():
+    path = Path(_setting("MEDIA_UPLOAD_STAGING_DIR", Path(settings.BASE_DIR) / "media_staging"))
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+class CloudinaryBackend:
+
+    def upload(self, path, kind):
+        from cloudinary import uploader
+
+        with open(path, "rb") as handle:
+            # File exposes .size, so large videos go through upload_large in chunks
+            return uploader.upload_resource(File(handle), resource_type=kind)
+
+    def delete(self, public_id, kind):
+        from cloudinary import uploader
+
+        uploader.destroy(public_id, resource_type=kind, invalidate=True)
+
+
+class LocalBackend:
+    """
+    Copies files into MEDIA_UPLOAD_LOCAL_DIR and returns a Cloudinary-style
+    public id, so posts look the same as after a real upload.
+    """
+
+    def upload(self, path, kind):
+        target = self._directory()
+        target.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(path, target / Path(path).name)
+        return f"{kind}/upload/v1/{Path(path).stem}"
+
+    def delete(self, public_id, kind):
+        for path in self._directory().glob(f"{public_id}.*"):
+            path.unlink()
+
+    def _directory(self):
+        return Path(_setting("MEDIA_UPLOAD_LOCAL_DIR", Path(settings.MEDIA_ROOT) / "uploads"))
+
+
+def get_backend():
+    return import_string(_setting("MEDIA_UPLOAD_BACKEND", "news.media.CloudinaryBackend"))()
+
+
+def media_kind(upload):
+    content_type = getattr(upload, "content_type", "") or ""
+    if content_type.startswith("image/"):
+        return "image"
+    if content_type.startswith("video/"):
+        return "video"
+    return None
+
+
+def _stage(upload):
+    suffix = Path(upload.name).suffix.lower()[:10]
+    path = staging_dir() / f"{uuid.uuid4().hex}{suffix}"
+
+    # Chunked copy: large videos are never read into memory
+    with open(path, "wb") as out:
+        for chunk in upload.chunks():
+            out.write(chunk)
+    return path
+
+
+def save_with_media(post, upload):
+    """
+    Saves `post` and queues `upload` for it. Without a usable upload the
+    post is just saved. The post keeps its current media until the new
+    file is live.
+    """
+    kind = media_kind(upload) if upload else None
+    if kind is None:
+        post.save()
+        return None
+
+    path = _stage(upload)
+    post.media_status = Post.MEDIA_PROCESSING
+
+    with transaction.atomic():
+        post.save()
+        job = MediaUpload.objects.create(post=post, kind=kind, staged_path=str(path))
+
+    transaction.on_commit(lambda: submit(job.pk))
+    return job
+
+
+_executor = None
+
+
+def run_in_background(func, *args):
+    """
+    Runs `func(*args)` on the in-process media pool. Returns None when
+    MEDIA_UPLOAD_WORKERS = 0, leaving the work to the queue commands.
+    """
+    global _executor
+
+    workers = _setting("MEDIA_UPLOAD_WORKERS", 2)
+    if not workers:
+        return None
+
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="media-upload")
+    return _executor.submit(_run_in_thread, func, *args)
+
+
+def _run_in_thread(func, *args):
+    close_old_connections()
+    try:
+        func(*args)
+    finally:
+        close_old_connections()
+
+
+def submit(job_id):
+    return run_in_background(run, job_id)
+
+
+def build_renditions_later(obj, prefix):
+    """
+    Builds the renditions of a saved object's image on the pool once the
+    transaction commits; pages show the original until then. With the pool
+    off, `manage.py generate_image_renditions` fills them in.
+    """
+    model, pk = type(obj), obj.pk
+    transaction.on_commit(lambda: run_in_background(_build_renditions, model, prefix, pk))
+
+
+def _build_renditions(model, prefix, pk):
+    obj = model.objects.filter(pk=pk).only("pk", "image", "image_renditions").first()
+    if obj is None:
+        return
+    try:
+        images.refresh(obj, prefix)
+    except Exception:
+        logger.exception("Could not build renditions for %s %s", prefix, pk)
+        return
+    # Cached fragments still point at the original
+    bump_generation()
+
+
+def _retry_later(job_id, attempts):
+    """
+    Resubmits a failed job after its backoff. Timers die with the process;
+    process_pending() picks those jobs up.
+    """
+    if not _setting("MEDIA_UPLOAD_WORKERS", 2):
+        return None
+
+    delay = _setting("MEDIA_UPLOAD_RETRY_BACKOFF", RETRY_BACKOFF) * 2 ** (attempts - 1)
+    timer = threading.Timer(delay.total_seconds(), submit, args=[job_id])
+    timer.daemon = True
+    timer.start()
+    return timer
+
+
+def _claim(job_id):
+    # A conditional UPDATE works as a lock on every backend: one worker wins
+    claimed = MediaUpload.objects.filter(pk=job_id, status=MediaUpload.PENDING).update(
+        status=MediaUpload.RUNNING, updated_at=timezone.now()
+    )
+    return MediaUpload.objects.select_related("post").get(pk=job_id) if claimed else None
+
+
+def run(job_id, backend=None):
+    """
+    Pushes one staged file to storage. Returns True when the post is ready.
+    """
+    job = _claim(job_id)
+    if job is None:
+        return False
+
+    backend = backend or get_backend()
+    job.attempts += 1
+
+    try:
+        stored = backend.upload(job.staged_path, job.kind)
+    except Exception as error:
+        logger.exception("Media upload %s failed (attempt %s)", job.pk, job.attempts)
+        job.error = str(error)
+        job.status = MediaUpload.FAILED if job.attempts >= MAX_ATTEMPTS else MediaUpload.PENDING
+        job.save(update_fields=["attempts", "error", "status", "updated_at"])
+
+        if job.status == MediaUpload.FAILED:
+            Post.objects.filter(pk=job.post_id).update(media_status=Post.MEDIA_FAILED)
+            _discard(job.staged_path)
+        else:
+            _retry_later(job.pk, job.attempts)
+        return False
+
+    post = job.post
+    previous = post.image_renditions
+    replaced = [resource for resource in (post.image, post.video) if resource]
+    if job.kind == "image":
+        # Resized copies come from the staged file, no download needed
+        post.image, post.video = stored, None
+        post.image_renditions = images.safe_build(job.staged_path, "post", post.pk)
+    else:
+        post.image, post.video = None, stored
+        post.image_renditions = {}
+
+    with transaction.atomic():
+        # A newer upload for the same post wins; this one only stores its file
+        newer = post.media_uploads.filter(created_at__gt=job.created_at).exists()
+        if not newer:
+            post.media_status = Post.MEDIA_READY
+            post.save(update_fields=["image", "video", "image_renditions", "media_status"])
+
+        job.status = MediaUpload.DONE
+        job.error = ""
+        job.save(update_fields=["attempts", "error", "status", "updated_at"])
+
+    images.discard(post.image_renditions if newer else previous)
+    for resource in [post.image or post.video] if newer else replaced:
+        _delete_stored(backend, resource, job.kind)
+    _discard(job.staged_path)
+    return True
+
+
+def _delete_stored(backend, resource, kind):
+    # A fresh upload is still what the backend returned, not a resource
+    if not hasattr(resource, "public_id"):
+        resource = Post._meta.get_field(kind).to_python(resource)
+    try:
+        backend.delete(resource.public_id, resource.resource_type)
+    except Exception:
+        logger.exception("Could not delete replaced media %s", resource.public_id)
+
+
+def _discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def process_pending(limit=None, backend=None):
+    """
+    Runs queued jobs oldest first, requeueing ones stuck in "running".
+    Returns the number of posts made ready.
+    """
+    MediaUpload.objects.filter(
+        status=MediaUpload.RUNNING,
+        updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status=MediaUpload.PENDING)
+
+    pending = (
+        MediaUpload.objects
+        .filter(status=MediaUpload.PENDING)
+        .order_by("created_at")
+        .values_list("pk", flat=True)
+    )
+    if limit:
+        pending = pending[:limit]
+
+    return sum(run(job_id, backend=backend) for job_id in list(pending))
@@ -0,0 +1,121 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import instrumentation
+from .connections import request_timings, server_timing
+from .models import UserPresence
+
+PRESENCE_WRITE_INTERVAL = 60  # seconds
+# Users seen this recently count as online (the admin dashboard)
+ACTIVE_USER_MINUTES = 5
+
+
+class PresenceMiddleware:
+    """
+    Records `UserPresence.last_seen` for authenticated users.
+
+    A short-lived cache key throttles the write to one upsert per user per
+    PRESENCE_WRITE_INTERVAL, so most requests cost a single cache lookup.
+    Async-capable, so async views under ASGI are not pushed onto a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _upsert_kwargs(self, user):
+        return {
+            "objs": [UserPresence(user_id=user.pk, last_seen=timezone.now())],
+            "update_conflicts": True,
+            "unique_fields": ["user"],
+            "update_fields": ["last_seen"],
+        }
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        user = getattr(request, "user", None)
+
+        if user is not None and user.is_authenticated:
+            key = f"presence_seen_{user.pk}"
+
+            # cache.add only succeeds when the key is missing or expired
+            if cache.add(key, True, PRESENCE_WRITE_INTERVAL):
+                UserPresence.objects.bulk_create(**self._upsert_kwargs(user))
+
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        user = await request.auser() if hasattr(request, "auser") else None
+
+        if user is not None and user.is_authenticated:
+            if await cache.aadd(f"presence_seen_{user.pk}", True, PRESENCE_WRITE_INTERVAL):
+                await UserPresence.objects.abulk_create(**self._upsert_kwargs(user))
+
+        return await self.get_response(request)
+
+
+class ConnectionTimingMiddleware:
+    """
+    Reports the database connection setup of each request (new connections
+    and health checks, see news/connections.py) in a Server-Timing header.
+    First in MIDDLEWARE, so the session and user lookups are covered.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _add_header(self, response, timings):
+        if timings:
+            instrumentation.add_server_timing(response, server_timing(timings))
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        with request_timings() as timings:
+            response = self.get_response(request)
+        return self._add_header(response, timings)
+
+    async def __acall__(self, request):
+        with request_timings() as timings:
+            response = await self.get_response(request)
+        return self._add_header(response, timings)
+
+
+class InstrumentationMiddleware:
+    """
+    Query count, database and template time and fragment cache hits of
+    each request, per view (news/instrumentation.py). Near the top of
+    MIDDLEWARE, so the session, user and presence queries count as well.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        metrics, token = instrumentation.start_request()
+        response = self.get_response(request)
+        return instrumentation.finish_request(request, response, metrics, token)
+
+    async def __acall__(self, request):
+        metrics, token = instrumentation.start_request()
+        response = await self.get_response(request)
+        return instrumentation.finish_request(request, response, metrics, token)
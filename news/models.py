@@ -1,3 +1,5 @@
+import base64
+
 from django.db import models
 from django.core.exceptions import ValidationError
 import uuid
@@ -41,8 +43,16 @@ class Story(models.Model):
         null=True
     )
 
+    # Resized copies of `image`, see news/images.py
+    image_renditions = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["-created_at"], name="story_created_idx"),
+        ]
+
     def clean(self):
         # Require at least one media
         if not self.image and not self.video:
@@ -72,6 +82,8 @@ class Post(models.Model):
         null=True
     )
 
+    image_renditions = models.JSONField(default=dict, blank=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     user = models.ForeignKey(
@@ -82,6 +94,41 @@ class Post(models.Model):
         related_name="posts"
     )
 
+    # Denormalized PostLike count, see `recount_likes` to repair drift
+    like_count = models.PositiveIntegerField(default=0)
+
+    MEDIA_READY = "ready"
+    MEDIA_PROCESSING = "processing"
+    MEDIA_FAILED = "failed"
+    MEDIA_STATUS_CHOICES = [
+        (MEDIA_READY, "Ready"),
+        (MEDIA_PROCESSING, "Processing"),
+        (MEDIA_FAILED, "Failed"),
+    ]
+    # Uploads are pushed to storage in the background, see news/media.py
+    media_status = models.CharField(max_length=12, choices=MEDIA_STATUS_CHOICES, default=MEDIA_READY)
+    # When news.related last computed this post's recommendations (which
+    # may be none); posts it has not seen yet are picked up by the next refresh
+    related_refreshed_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        # Match the feed's (created_at, id) keyset ordering per access path
+        indexes = [
+            models.Index(fields=["-created_at", "-id"], name="post_created_idx"),
+            models.Index(fields=["category", "-created_at", "-id"], name="post_category_created_idx"),
+            models.Index(fields=["user", "-created_at", "-id"], name="post_user_created_idx"),
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="post_image_created_idx",
+                condition=models.Q(image__isnull=False) & ~models.Q(image=""),
+            ),
+            models.Index(
+                fields=["-created_at", "-id"],
+                name="post_video_created_idx",
+                condition=models.Q(video__isnull=False) & ~models.Q(video=""),
+            ),
+        ]
+
     def is_admin_post(self):
         return self.user and self.user.is_superuser
 
@@ -138,11 +185,57 @@ class Comment(models.Model):
     text = models.TextField(blank=True)
     audio = models.FileField(upload_to="comments/audio/", blank=True, null=True)
     likes = models.ManyToManyField(User, blank=True, related_name='liked_comments')
+    like_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    AUDIO_QUEUED = "queued"
+    AUDIO_PROCESSING = "processing"
+    AUDIO_READY = "ready"
+    AUDIO_FAILED = "failed"
+    AUDIO_STATUS_CHOICES = [
+        (AUDIO_QUEUED, "Queued"),
+        (AUDIO_PROCESSING, "Processing"),
+        (AUDIO_READY, "Ready"),
+        (AUDIO_FAILED, "Failed"),
+    ]
+    # Voice comments are re-encoded in the background, see news/voice.py.
+    # Until then (and if that fails) the raw upload is played.
+    audio_status = models.CharField(max_length=12, choices=AUDIO_STATUS_CHOICES, default=AUDIO_READY)
+    audio_duration = models.FloatField(null=True, blank=True)
+    # One unsigned byte per waveform bar
+    audio_peaks = models.BinaryField(blank=True, default=b"")
+    # When processing last changed the audio; part of the article's version
+    # stamp (news/conditional.py), so pages showing the raw upload revalidate
+    audio_updated_at = models.DateTimeField(null=True, blank=True)
+    # The raw upload a processed recording replaced, deleted once pages
+    # rendered before processing have had VOICE_RAW_RETENTION to revalidate
+    audio_raw = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["post", "created_at", "id"], name="comment_post_created_idx"),
+            models.Index(fields=["parent", "created_at", "id"], name="comment_parent_created_idx"),
+            # Covers the trending window scan in news/trending.py
+            models.Index(fields=["created_at", "post"], name="comment_created_post_idx"),
+            models.Index(
+                fields=["created_at"],
+                name="comment_audio_queue_idx",
+                condition=models.Q(audio_status="queued"),
+            ),
+            models.Index(
+                fields=["audio_updated_at"],
+                name="comment_audio_raw_idx",
+                condition=~models.Q(audio_raw=""),
+            ),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.post.id}"
 
+    @property
+    def audio_peaks_base64(self):
+        return base64.b64encode(bytes(self.audio_peaks)).decode() if self.audio_peaks else ""
+
 
 # @receiver(post_save, sender=User)
 # def create_profile(sender, instance, created, **kwargs):
@@ -156,5 +249,144 @@ class PostLike(models.Model):
 
     class Meta:
         unique_together = ("user", "post")  # one like per user
+        indexes = [
+            # Covers the trending window scan in news/trending.py
+            models.Index(fields=["created_at", "post"], name="postlike_created_post_idx"),
+        ]
+
+
+
+
+class UserPresence(models.Model):
+    """
+    Last time a user made a request, written by PresenceMiddleware
+    at most once per PRESENCE_WRITE_INTERVAL.
+    """
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="presence"
+    )
+    last_seen = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.last_seen}"
+
+
+class RelatedPost(models.Model):
+    """
+    Precomputed "related news" for a post, best first.
+    Written by news.related, read by newsview in `rank` order.
+    """
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="related_links")
+    related = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="related_backlinks")
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["post", "rank"], name="related_post_rank_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} → {self.related_id} (#{self.rank})"
+
+
+class PostTrending(models.Model):
+    """
+    Time-decayed popularity of a post, materialized by news.trending.refresh.
+    Scores are decayed to `computed_at`, so they compare directly.
+    """
+    post = models.OneToOneField(
+        Post,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="trending"
+    )
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-score", "-post"], name="trending_score_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id}: {self.score:.2f}"
+
+
+class MediaUpload(models.Model):
+    """
+    A staged upload waiting to be pushed to media storage (DB job queue).
+    """
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name="media_uploads")
+    kind = models.CharField(max_length=10)  # "image" or "video"
+    staged_path = models.CharField(max_length=500)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="mediaupload_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} for {self.post_id} ({self.status})"
+
+
+class OutboxEmail(models.Model):
+    """
+    An email waiting to be sent by the outbox worker (news/outbox.py).
+    """
+    PENDING = "pending"
+    SENDING = "sending"
+    SENT = "sent"
+    DEAD = "dead"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (DEAD, "Dead letter"),
+    ]
 
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Due time while pending, lease expiry while sending
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    lease = models.UUIDField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                name="outbox_due_idx",
+                condition=models.Q(status__in=["pending", "sending"]),
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} ({self.status})"
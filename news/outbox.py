@@ -0,0 +1,235 @@
+"""
+Database-backed email outbox.
+
+Views call `enqueue()`, which only inserts an OutboxEmail row; the request
+never waits for the SMTP relay. After the transaction commits, a single
+in-process sender thread drains the table (OUTBOX_SEND_IN_PROCESS), and
+`manage.py send_outbox --loop` does the same as a standalone worker. After
+each in-process drain a timer kicks the sender again when the earliest
+waiting message falls due, so retries do not wait for the next enqueue.
+
+A drain opens one SMTP connection and sends every due message over it,
+claiming OUTBOX_BATCH_SIZE rows at a time with a lease so several workers
+never send the same message twice. Failures are sorted by SMTP code:
+
+* 5xx (mailbox unknown, message refused): dead letter straight away
+* anything else (4xx, timeouts, relay down): retried with exponential
+  backoff, and a dead letter after OUTBOX_MAX_ATTEMPTS
+
+Dead letters stay in the table for `send_outbox --dead` to report and
+`--requeue-dead` to retry.
+"""
+import logging
+import random
+import smtplib
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_BATCH_SIZE = 50
+OUTBOX_MAX_ATTEMPTS = 6
+# First retry after a minute, doubling up to an hour
+OUTBOX_BACKOFF = timedelta(minutes=1)
+OUTBOX_MAX_BACKOFF = timedelta(hours=1)
+# A claimed message whose worker died is picked up again after this
+LEASE_TIME = timedelta(minutes=5)
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enqueue(subject, body, to, from_email=None):
+    email = OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+    transaction.on_commit(kick)
+    return email
+
+
+_sender = None
+
+
+def kick():
+    """
+    Drains the outbox on the sender thread. One thread per process, so
+    in-process drains never overlap.
+    """
+    global _sender
+
+    if not _setting("OUTBOX_SEND_IN_PROCESS", True):
+        return None
+
+    if _sender is None:
+        _sender = ThreadPoolExecutor(max_workers=1, thread_name_prefix="outbox")
+    return _sender.submit(_drain_in_thread)
+
+
+def _drain_in_thread():
+    close_old_connections()
+    try:
+        drain()
+        _schedule_wakeup()
+    except Exception:
+        logger.exception("Outbox drain failed")
+    finally:
+        close_old_connections()
+
+
+_wakeup = None
+_wakeup_lock = threading.Lock()
+
+
+def _schedule_wakeup():
+    """
+    Kicks the sender when the earliest pending (or leased) message falls
+    due, replacing the previous timer. Returns the timer, or None when
+    nothing waits.
+    """
+    global _wakeup
+
+    due = (
+        OutboxEmail.objects
+        .filter(status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING])
+        .order_by("next_attempt_at")
+        .values_list("next_attempt_at", flat=True)
+        .first()
+    )
+    with _wakeup_lock:
+        if _wakeup is not None:
+            _wakeup.cancel()
+            _wakeup = None
+        if due is None:
+            return None
+
+        _wakeup = threading.Timer(max((due - timezone.now()).total_seconds(), 0), kick)
+        _wakeup.daemon = True
+        _wakeup.start()
+        return _wakeup
+
+
+def backoff(attempts):
+    delay = min(OUTBOX_BACKOFF * 2 ** (attempts - 1), OUTBOX_MAX_BACKOFF)
+    # Jitter keeps retries from a relay outage from arriving all at once
+    return delay * random.uniform(0.9, 1.1)
+
+
+def _claim(limit):
+    now = timezone.now()
+    lease = uuid.uuid4()
+
+    due = (
+        OutboxEmail.objects
+        .filter(status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING], next_attempt_at__lte=now)
+        .order_by("next_attempt_at")
+        .values_list("pk", flat=True)[:limit]
+    )
+    # Conditional UPDATE: rows another worker claimed meanwhile are skipped
+    OutboxEmail.objects.filter(
+        pk__in=list(due),
+        status__in=[OutboxEmail.PENDING, OutboxEmail.SENDING],
+        next_attempt_at__lte=now,
+    ).update(status=OutboxEmail.SENDING, lease=lease, next_attempt_at=now + LEASE_TIME)
+
+    return list(OutboxEmail.objects.filter(lease=lease, status=OutboxEmail.SENDING))
+
+
+def _is_permanent(error):
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, smtplib.SMTPResponseException):
+        return error.smtp_code >= 500
+    return False
+
+
+def _failed(email, error):
+    email.attempts += 1
+    email.last_error = f"{type(error).__name__}: {error}"[:2000]
+
+    max_attempts = _setting("OUTBOX_MAX_ATTEMPTS", OUTBOX_MAX_ATTEMPTS)
+    if _is_permanent(error) or email.attempts >= max_attempts:
+        email.status = OutboxEmail.DEAD
+        logger.error("Dead letter %s to %s: %s", email.pk, email.to, email.last_error)
+    else:
+        email.status = OutboxEmail.PENDING
+        email.next_attempt_at = timezone.now() + backoff(email.attempts)
+
+    email.lease = None
+    email.save(update_fields=["attempts", "last_error", "status", "next_attempt_at", "lease"])
+    return email.status
+
+
+def _send_batch(connection, batch, counts):
+    """
+    Sends a claimed batch. Returns False when the relay is unreachable, in
+    which case the rest of the batch waits for its retry.
+    """
+    sent = []
+    try:
+        for index, email in enumerate(batch):
+            try:
+                # Keeps the open session, reconnects after a network error
+                connection.open()
+            except Exception as error:
+                for waiting in batch[index:]:
+                    counts[_failed(waiting, error)] += 1
+                return False
+
+            message = EmailMessage(email.subject, email.body, email.from_email, email.to, connection=connection)
+            try:
+                connection.send_messages([message])
+            except Exception as error:
+                counts[_failed(email, error)] += 1
+                if not isinstance(error, (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)):
+                    connection.close()
+            else:
+                sent.append(email.pk)
+        return True
+    finally:
+        OutboxEmail.objects.filter(pk__in=sent).update(
+            status=OutboxEmail.SENT, sent_at=timezone.now(), lease=None, last_error="",
+        )
+        counts[OutboxEmail.SENT] += len(sent)
+
+
+def drain(batch_size=None, connection=None):
+    """
+    Sends every due message over one SMTP connection. Returns the number
+    of messages sent, retried (back to pending) and dead, by status.
+    """
+    batch_size = batch_size or _setting("OUTBOX_BATCH_SIZE", OUTBOX_BATCH_SIZE)
+    counts = {OutboxEmail.SENT: 0, OutboxEmail.PENDING: 0, OutboxEmail.DEAD: 0}
+    connection = connection or get_connection(fail_silently=False)
+
+    try:
+        while True:
+            batch = _claim(batch_size)
+            if not batch or not _send_batch(connection, batch, counts):
+                break
+    finally:
+        connection.close()
+
+    return counts
+
+
+def dead_letters():
+    return OutboxEmail.objects.filter(status=OutboxEmail.DEAD).order_by("-created_at")
+
+
+def requeue_dead():
+    return OutboxEmail.objects.filter(status=OutboxEmail.DEAD).update(
+        status=OutboxEmail.PENDING, attempts=0, next_attempt_at=timezone.now(),
+    )
@@ -0,0 +1,66 @@
+import base64
+from datetime import datetime
+from uuid import UUID
+
+from django.db.models import Q
+
+
+def encode_cursor(obj):
+    """
+    Opaque cursor for keyset pagination on (created_at, id).
+    """
+    raw = f"{obj.created_at.isoformat()}|{obj.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Returns (created_at, id) or None for a missing / malformed cursor.
+    """
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        created_at, pk = raw.split("|", 1)
+        return datetime.fromisoformat(created_at), UUID(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_page(queryset, after=None, page_size=24, ascending=False):
+    """
+    Returns (items, next_cursor) for a queryset ordered newest first
+    (or oldest first with ascending=True).
+
+    Rows are located with an index-friendly
+    "(created_at, id) < (cursor.created_at, cursor.id)" predicate instead
+    of OFFSET, so every page costs the same however deep the reader scrolls.
+    """
+    if ascending:
+        queryset = queryset.order_by("created_at", "id")
+    else:
+        queryset = queryset.order_by("-created_at", "-id")
+
+    position = decode_cursor(after)
+    if position:
+        created_at, pk = position
+        if ascending:
+            queryset = queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+            )
+        else:
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+            )
+
+    # One extra row tells us whether another page exists without a COUNT(*)
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor(items[-1])
+
+    return items, next_cursor
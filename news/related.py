@@ -0,0 +1,247 @@
+"""
+Related-post recommendations, precomputed in batch.
+
+Posts in the candidate pool (the newest RELATED_POOL_SIZE) are turned into
+TF-IDF vectors over their title and description, held as CSR-style NumPy
+arrays together with the inverted (term → posts) layout. A post's
+neighbours are scored as
+
+    TEXT_WEIGHT * cosine + CATEGORY_WEIGHT * same category + RECENCY_WEIGHT * recency
+
+and the top RELATED_COUNT are stored in RelatedPost, so newsview reads
+them with one indexed lookup.
+
+`refresh()` only computes posts it has not seen yet, plus the posts they
+are most similar to; `refresh(full=True)` recomputes the whole pool. Both
+rebuild the model for the pool, so they run from
+`manage.py refresh_related_posts` (cron), never in a request.
+Only lists that changed are rewritten, and any change bumps the fragment
+generation, which is part of the article's ETag.
+"""
+import math
+import re
+from collections import Counter, defaultdict
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from .fragments import bump_generation
+from .models import Post, RelatedPost
+
+RELATED_COUNT = 10
+RELATED_POOL_SIZE = 50000
+
+TEXT_WEIGHT = 0.6
+CATEGORY_WEIGHT = 0.25
+RECENCY_WEIGHT = 0.15
+RECENCY_HALF_LIFE_DAYS = 30
+
+# Terms in more than this share of posts carry no signal
+MAX_DOCUMENT_FREQUENCY = 0.5
+
+_WORD = re.compile(r"[^\W\d_]{2,}", re.UNICODE)
+STOP_WORDS = frozenset("""
+    a an and are as at be but by for from has have in is it its of on or our
+    that the their this to was were will with you your we they he she his her
+    not no so if than then there these those been into about after over new
+""".split())
+
+
+def tokenize(text):
+    return [w for w in _WORD.findall((text or "").lower()) if w not in STOP_WORDS]
+
+
+class RelatedModel:
+    """
+    TF-IDF vectors and blend inputs for the candidate pool.
+    """
+
+    def __init__(self, posts, now=None):
+        now = now or timezone.now()
+        self.ids = [post["id"] for post in posts]
+        self.position = {pk: i for i, pk in enumerate(self.ids)}
+        self.size = len(self.ids)
+
+        self.category = np.array([post["category_id"] for post in posts], dtype=np.int64)
+        age_days = np.array(
+            [(now - post["created_at"]).total_seconds() / 86400 for post in posts],
+            dtype=np.float64,
+        )
+        self.recency = 0.5 ** (np.clip(age_days, 0, None) / RECENCY_HALF_LIFE_DAYS)
+
+        self._vectorize(posts)
+
+    def _vectorize(self, posts):
+        # Titles count twice, they say more about a story than the body
+        counts = [
+            Counter(tokenize(post["title"]) * 2 + tokenize(post["description"]))
+            for post in posts
+        ]
+
+        df = Counter(term for terms in counts for term in terms)
+        max_df = max(2, MAX_DOCUMENT_FREQUENCY * self.size)
+        vocabulary = {
+            term: i for i, term in enumerate(t for t, n in df.items() if 2 <= n <= max_df)
+        }
+        idf = {
+            term: math.log((1 + self.size) / (1 + df[term])) + 1 for term in vocabulary
+        }
+
+        indptr, indices, data = [0], [], []
+        for terms in counts:
+            row = [(vocabulary[t], (1 + math.log(n)) * idf[t]) for t, n in terms.items() if t in vocabulary]
+            indices.extend(i for i, _ in row)
+            data.extend(w for _, w in row)
+            indptr.append(len(indices))
+
+        self.indptr = np.array(indptr, dtype=np.int64)
+        self.indices = np.array(indices, dtype=np.int64)
+        self.data = np.array(data, dtype=np.float64)
+
+        # L2-normalize each row so dot products are cosines
+        rows = np.repeat(np.arange(self.size), np.diff(self.indptr))
+        norms = np.sqrt(np.bincount(rows, weights=self.data ** 2, minlength=self.size))
+        self.data /= np.where(norms > 0, norms, 1)[rows]
+
+        # Inverted layout: the posts containing each term
+        order = np.argsort(self.indices, kind="stable")
+        self.postings = rows[order]
+        self.postings_data = self.data[order]
+        self.term_ptr = np.concatenate((
+            [0], np.cumsum(np.bincount(self.indices, minlength=len(vocabulary)))
+        ))
+
+    def cosines(self, i):
+        """
+        Cosine similarity of post `i` against the whole pool.
+        """
+        start, end = self.indptr[i], self.indptr[i + 1]
+        terms, weights = self.indices[start:end], self.data[start:end]
+        if not len(terms):
+            return np.zeros(self.size)
+
+        spans = [slice(self.term_ptr[t], self.term_ptr[t + 1]) for t in terms]
+        posts = np.concatenate([self.postings[s] for s in spans])
+        products = np.concatenate([self.postings_data[s] * w for s, w in zip(spans, weights)])
+        return np.bincount(posts, weights=products, minlength=self.size)
+
+    def neighbours(self, i, k=RELATED_COUNT):
+        """
+        The `k` best (position, score) pairs for post `i`, best first.
+        """
+        cosine = self.cosines(i)
+        same_category = self.category == self.category[i]
+
+        scores = (
+            TEXT_WEIGHT * cosine
+            + CATEGORY_WEIGHT * same_category
+            + RECENCY_WEIGHT * self.recency
+        )
+        # Recency alone is no reason to recommend a post from another section
+        scores[~((cosine > 0) | same_category)] = -np.inf
+        scores[i] = -np.inf
+
+        k = min(k, self.size - 1)
+        if k <= 0:
+            return []
+
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(int(j), float(scores[j])) for j in top if np.isfinite(scores[j])]
+
+
+def _pool():
+    return list(
+        Post.objects
+        .order_by("-created_at", "-id")
+        .values("id", "category_id", "created_at", "title", "description", "related_refreshed_at")
+        [:RELATED_POOL_SIZE]
+    )
+
+
+def _store(model, positions, now):
+    """
+    Rewrites the lists of `positions` that changed. Returns how many did.
+    """
+    ids = [model.ids[i] for i in positions]
+    stored = defaultdict(list)
+    for post_id, related_id in (
+        RelatedPost.objects.filter(post_id__in=ids).order_by("post_id", "rank").values_list("post_id", "related_id")
+    ):
+        stored[post_id].append(related_id)
+
+    changed, rows = [], []
+    for i in positions:
+        neighbours = model.neighbours(i)
+        # Scores drift with recency alone; pages only show the order
+        if [model.ids[j] for j, _ in neighbours] == stored[model.ids[i]]:
+            continue
+        changed.append(model.ids[i])
+        rows.extend(
+            RelatedPost(post_id=model.ids[i], related_id=model.ids[j], rank=rank, score=score)
+            for rank, (j, score) in enumerate(neighbours)
+        )
+
+    with transaction.atomic():
+        RelatedPost.objects.filter(post_id__in=changed).delete()
+        RelatedPost.objects.bulk_create(rows, batch_size=5000)
+        # Posts without neighbours are done too, until the next full refresh
+        Post.objects.filter(pk__in=ids).update(related_refreshed_at=now)
+    return len(changed)
+
+
+def refresh(full=False, batch_size=1000):
+    """
+    Recomputes recommendations. Returns the number of posts whose list changed.
+
+    Without `full`, only posts not computed yet are, together with their
+    own top neighbours, which are the lists a new post is most likely to
+    enter.
+    """
+    posts = _pool()
+    if not posts:
+        return 0
+
+    now = timezone.now()
+    model = RelatedModel(posts, now)
+
+    if full:
+        targets = list(range(model.size))
+    else:
+        new = [i for i, post in enumerate(posts) if post["related_refreshed_at"] is None]
+        targets = set(new)
+        for i in new:
+            targets.update(j for j, _ in model.neighbours(i))
+        targets = sorted(targets)
+
+    changed = 0
+    for start in range(0, len(targets), batch_size):
+        changed += _store(model, targets[start:start + batch_size], now)
+
+    if changed:
+        bump_generation()
+    return changed
+
+
+def related_posts(post, limit=RELATED_COUNT):
+    """
+    Stored recommendations for `post`, or the newest posts of its category
+    until the next refresh has covered it.
+    """
+    related = list(
+        Post.objects
+        .filter(related_backlinks__post=post)
+        .select_related("category")
+        .order_by("related_backlinks__rank")[:limit]
+    )
+    if related:
+        return related
+
+    return list(
+        Post.objects
+        .filter(category_id=post.category_id)
+        .select_related("category")
+        .exclude(id=post.id)
+        .order_by("-created_at", "-id")[:limit]
+    )
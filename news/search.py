@@ -0,0 +1,256 @@
+"""
+Full-text search over post titles and descriptions.
+
+The index lives next to news_post in a backend-specific structure:
+
+* PostgreSQL: news_post_search(post_id, document tsvector) with a GIN index,
+  titles weighted above descriptions, ranked with ts_rank_cd.
+* SQLite: an FTS5 table (news_post_fts) keyed by the integer rowid of
+  news_post_search(post_id), ranked with bm25.
+
+Ranking is limited to the newest SEARCH_CANDIDATES matches, which keeps
+queries for very common words as fast as selective ones.
+
+install() creates it after migrate, the post_save / post_delete receivers in
+signals.py keep it current and `manage.py rebuild_search_index` backfills
+rows written without signals (bulk_create, raw SQL). Other databases fall
+back to an unranked icontains search.
+"""
+import re
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, transaction
+from django.db.models import Q
+
+from .models import Post
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE = 50
+MAX_QUERY_LENGTH = 200
+# Only the newest matches are ranked. Selective queries are ranked in full;
+# a word found in most posts would otherwise score the whole table.
+SEARCH_CANDIDATES = 5000
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def _db_id(pk, connection):
+    return Post._meta.pk.get_db_prep_value(pk, connection)
+
+
+class _PostgresIndex:
+
+    def install(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS news_post_search (
+                post_id uuid PRIMARY KEY,
+                created_at timestamp with time zone NOT NULL,
+                document tsvector NOT NULL
+            )
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS news_post_search_document_gin
+            ON news_post_search USING gin (document)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS news_post_search_created
+            ON news_post_search (created_at DESC)
+        """)
+
+    _DOCUMENT = """
+        setweight(to_tsvector('english', coalesce({title}, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce({description}, '')), 'B')
+    """
+
+    def index(self, cursor, post_id, created_at, title, description):
+        cursor.execute(f"""
+            INSERT INTO news_post_search (post_id, created_at, document)
+            VALUES (%s, %s, {self._DOCUMENT.format(title="%s", description="%s")})
+            ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document
+        """, [post_id, created_at, title, description])
+
+    def unindex(self, cursor, post_id):
+        cursor.execute("DELETE FROM news_post_search WHERE post_id = %s", [post_id])
+
+    def rebuild(self, cursor):
+        cursor.execute("DELETE FROM news_post_search WHERE post_id NOT IN (SELECT id FROM news_post)")
+        cursor.execute(f"""
+            INSERT INTO news_post_search (post_id, created_at, document)
+            SELECT id, created_at, {self._DOCUMENT.format(title="title", description="description")}
+            FROM news_post
+            ON CONFLICT (post_id) DO UPDATE SET document = EXCLUDED.document
+        """)
+
+    def search(self, cursor, terms, limit, offset):
+        cursor.execute("""
+            SELECT post_id
+            FROM (
+                SELECT post_id, created_at, document
+                FROM news_post_search
+                WHERE document @@ plainto_tsquery('english', %s)
+                ORDER BY created_at DESC
+                LIMIT %s
+            ) matches, plainto_tsquery('english', %s) query
+            ORDER BY ts_rank_cd(document, query) DESC, created_at DESC
+            LIMIT %s OFFSET %s
+        """, [" ".join(terms), SEARCH_CANDIDATES, " ".join(terms), limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+class _SqliteIndex:
+
+    def install(self, cursor):
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS news_post_search (
+                rowid INTEGER PRIMARY KEY,
+                post_id char(32) NOT NULL UNIQUE
+            )
+        """)
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS news_post_fts
+            USING fts5(title, description, tokenize = 'porter unicode61')
+        """)
+
+    def _rowid(self, cursor, post_id):
+        cursor.execute("INSERT OR IGNORE INTO news_post_search (post_id) VALUES (%s)", [post_id])
+        cursor.execute("SELECT rowid FROM news_post_search WHERE post_id = %s", [post_id])
+        return cursor.fetchone()[0]
+
+    def index(self, cursor, post_id, created_at, title, description):
+        # rowids grow with insertion, so newer posts have larger ones
+        rowid = self._rowid(cursor, post_id)
+        cursor.execute("DELETE FROM news_post_fts WHERE rowid = %s", [rowid])
+        cursor.execute(
+            "INSERT INTO news_post_fts (rowid, title, description) VALUES (%s, %s, %s)",
+            [rowid, title, description or ""],
+        )
+
+    def unindex(self, cursor, post_id):
+        cursor.execute("SELECT rowid FROM news_post_search WHERE post_id = %s", [post_id])
+        row = cursor.fetchone()
+        if row:
+            cursor.execute("DELETE FROM news_post_fts WHERE rowid = %s", [row[0]])
+            cursor.execute("DELETE FROM news_post_search WHERE rowid = %s", [row[0]])
+
+    def rebuild(self, cursor):
+        cursor.execute("DELETE FROM news_post_fts")
+        cursor.execute("DELETE FROM news_post_search")
+        cursor.execute(
+            "INSERT INTO news_post_search (post_id) SELECT id FROM news_post ORDER BY created_at, id"
+        )
+        cursor.execute("""
+            INSERT INTO news_post_fts (rowid, title, description)
+            SELECT s.rowid, p.title, coalesce(p.description, '')
+            FROM news_post_search s JOIN news_post p ON p.id = s.post_id
+        """)
+
+    def search(self, cursor, terms, limit, offset):
+        # Every word must match; quoting keeps FTS5 operators out of user input
+        match = " ".join(f'"{term}"' for term in terms)
+        cursor.execute("""
+            SELECT s.post_id
+            FROM (
+                SELECT rowid, bm25(news_post_fts, 2.0, 1.0) AS score
+                FROM news_post_fts
+                WHERE news_post_fts MATCH %s
+                ORDER BY rowid DESC
+                LIMIT %s
+            ) f JOIN news_post_search s ON s.rowid = f.rowid
+            ORDER BY f.score, f.rowid DESC
+            LIMIT %s OFFSET %s
+        """, [match, SEARCH_CANDIDATES, limit, offset])
+        return [row[0] for row in cursor.fetchall()]
+
+
+_INDEXES = {
+    "postgresql": _PostgresIndex(),
+    "sqlite": _SqliteIndex(),
+}
+
+
+def _index_for(connection):
+    return _INDEXES.get(connection.vendor)
+
+
+def install(using=DEFAULT_DB_ALIAS):
+    """
+    Creates the search index structures. Safe to run repeatedly.
+    Returns False when this database has no full-text support.
+    """
+    connection = connections[using]
+    index = _index_for(connection)
+    if index is None:
+        return False
+
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            index.install(cursor)
+    except OperationalError:
+        # e.g. SQLite built without FTS5: use the icontains fallback instead
+        _INDEXES.pop(connection.vendor, None)
+        return False
+    return True
+
+
+def index_post(post, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    index = _index_for(connection)
+    if index:
+        with connection.cursor() as cursor:
+            index.index(
+                cursor, _db_id(post.pk, connection), post.created_at, post.title, post.description,
+            )
+
+
+def unindex_post(post, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    index = _index_for(connection)
+    if index:
+        with connection.cursor() as cursor:
+            index.unindex(cursor, _db_id(post.pk, connection))
+
+
+def rebuild(using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    index = _index_for(connection)
+    if index is None:
+        return False
+
+    with transaction.atomic(using=using), connection.cursor() as cursor:
+        index.rebuild(cursor)
+    return True
+
+
+def search_terms(query):
+    return _WORD.findall(query[:MAX_QUERY_LENGTH].lower())
+
+
+def search_posts(query, page=1, page_size=SEARCH_PAGE_SIZE):
+    """
+    Returns (posts, has_next) for one page of results, best match first.
+    """
+    terms = search_terms(query)
+    if not terms:
+        return [], False
+
+    page = max(1, min(page, SEARCH_MAX_PAGE))
+    offset = (page - 1) * page_size
+    posts = Post.objects.select_related("category")
+
+    connection = connections[DEFAULT_DB_ALIAS]
+    index = _index_for(connection)
+
+    if index is None:
+        for term in terms:
+            posts = posts.filter(Q(title__icontains=term) | Q(description__icontains=term))
+        found = list(posts.order_by("-created_at", "-id")[offset:offset + page_size + 1])
+        return found[:page_size], len(found) > page_size
+
+    with connection.cursor() as cursor:
+        ids = index.search(cursor, terms, page_size + 1, offset)
+
+    # One more row than the page tells us whether a next page exists
+    has_next = len(ids) > page_size
+    ids = ids[:page_size]
+
+    by_id = {_db_id(post.pk, connection): post for post in posts.filter(pk__in=ids)}
+    return [by_id[pk] for pk in ids if pk in by_id], has_next
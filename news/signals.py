@@ -1,9 +1,13 @@
 # news/signals.py
 from django.dispatch import receiver
-from django.db.models.signals import post_save
+from django.db.backends.signals import connection_created
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
 from django.contrib.auth.models import User
 from allauth.socialaccount.signals import social_account_added, social_account_updated
-from .models import Profile
+from . import images, instrumentation, search
+from .fragments import bump_generation
+from .models import Category, Post, Profile, Story
 
 # @receiver(post_save, sender=User)
 # def create_profile(sender, instance, created, **kwargs):
@@ -28,3 +32,45 @@ def update_profile_from_google(sender, request, sociallogin, **kwargs):
     profile.provider = "google"
     profile.save()
 
+
+# Any published, edited or removed post, story or category retires the
+# cached home page fragments
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Story)
+@receiver(post_delete, sender=Story)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def invalidate_fragments(sender, **kwargs):
+    bump_generation()
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using, **kwargs):
+    if sender.label == "news":
+        search.install(using)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, using, **kwargs):
+    search.index_post(instance, using)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, using, **kwargs):
+    search.unindex_post(instance, using)
+
+
+@receiver(post_delete, sender=Post)
+@receiver(post_delete, sender=Story)
+def discard_renditions(sender, instance, **kwargs):
+    # Kept if the delete is rolled back
+    renditions = instance.image_renditions
+    transaction.on_commit(lambda: images.discard(renditions))
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    # Runs on every reconnect of the same wrapper, so only install it once
+    if instrumentation.time_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(instrumentation.time_query)
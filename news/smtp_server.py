@@ -0,0 +1,109 @@
+"""
+A small in-memory SMTP server for tests and local runs.
+
+It accepts plain (no TLS, no AUTH) SMTP and keeps every message, so the
+email outbox can be exercised end to end without a relay:
+
+    server = StandInSmtpServer().start()
+    ...  # EMAIL_HOST, EMAIL_PORT = server.server_address, EMAIL_USE_TLS = False
+    server.stop()
+
+Recipients in `reject` get a permanent 550, those in `defer` a temporary
+451, and `delay` slows every reply down like an overloaded relay.
+"""
+import socketserver
+import threading
+import time
+from email import message_from_bytes
+
+
+class _Handler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        if self.server.delay:
+            time.sleep(self.server.delay)
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+
+        sender, recipients = None, []
+        self.reply("220 stand-in ESMTP ready")
+
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command, _, argument = line.decode("utf-8", "replace").strip().partition(" ")
+            command = command.upper()
+
+            if command in ("EHLO", "HELO"):
+                self.reply("250-stand-in\r\n250 8BITMIME" if command == "EHLO" else "250 stand-in")
+            elif command == "MAIL":
+                sender, recipients = argument.partition(":")[2].strip("<> "), []
+                self.reply("250 OK")
+            elif command == "RCPT":
+                address = argument.partition(":")[2].strip("<> ")
+                if address in server.reject:
+                    self.reply("550 5.1.1 Mailbox unavailable")
+                elif address in server.defer:
+                    self.reply("451 4.3.0 Try again later")
+                else:
+                    recipients.append(address)
+                    self.reply("250 OK")
+            elif command == "DATA":
+                if not recipients:
+                    self.reply("503 No valid recipients")
+                    continue
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                data = self._read_data()
+                with server.lock:
+                    server.messages.append((sender, recipients, message_from_bytes(data)))
+                sender, recipients = None, []
+                self.reply("250 Queued")
+            elif command == "RSET":
+                sender, recipients = None, []
+                self.reply("250 OK")
+            elif command == "NOOP":
+                self.reply("250 OK")
+            elif command == "QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("502 Command not implemented")
+
+    def _read_data(self):
+        lines = []
+        while True:
+            line = self.rfile.readline()
+            if not line or line in (b".\r\n", b".\n"):
+                break
+            # Undo dot-stuffing
+            lines.append(line[1:] if line.startswith(b"..") else line)
+        return b"".join(lines)
+
+
+class StandInSmtpServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), _Handler)
+        self.lock = threading.Lock()
+        self.messages = []
+        self.connections = 0
+        self.reject = set()
+        self.defer = set()
+        self.delay = 0
+
+    def start(self):
+        # A short poll interval keeps stop() quick in tests
+        self._thread = threading.Thread(target=self.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,163 @@
+"""
+Serving of uploaded media (story videos, voice comments, images) from
+MEDIA_ROOT.
+
+Files are streamed in MEDIA_STREAM_CHUNK_SIZE blocks, never read whole,
+and single byte ranges are answered with 206 Partial Content so players
+can seek without downloading the whole clip again. If-Range falls back to
+the full file when the client's copy is stale.
+
+Under a WSGI server with wsgi.file_wrapper (gunicorn, uWSGI) the response
+goes out with sendfile(): the file is positioned at the range start and
+the server copies Content-Length bytes in the kernel. Behind nginx,
+MEDIA_ACCEL_REDIRECT hands the whole transfer (ranges included) to an
+internal location:
+
+    location /protected-media/ { internal; alias /srv/app/media/; }
+    MEDIA_ACCEL_REDIRECT = "/protected-media/"
+"""
+import mimetypes
+import os
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+
+MEDIA_STREAM_CHUNK_SIZE = 64 * 1024
+# Uploads get unique names, so clients may keep them for a day
+MEDIA_CACHE_MAX_AGE = 24 * 60 * 60
+
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class RangeFile:
+    """
+    Read-only view of `length` bytes of an open file from its current
+    position. Exposes fileno() so wsgi.file_wrapper can still sendfile().
+    """
+
+    def __init__(self, handle, length):
+        self.handle = handle
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.handle.read(size) if size else b""
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.handle.fileno()
+
+    def close(self):
+        self.handle.close()
+
+
+def parse_range(header, size):
+    """
+    (start, end) inclusive for a single "bytes=" range, None to serve the
+    whole file, or ValueError when the range is unsatisfiable.
+    """
+    match = _RANGE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        # Malformed and multi-range requests get the full file (RFC 9110 14.2)
+        return None
+
+    first, last = match.groups()
+    if first:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    else:
+        # Suffix range: the last N bytes
+        if int(last) == 0:
+            raise ValueError("empty suffix range")
+        start, end = max(0, size - int(last)), size - 1
+
+    if start >= size:
+        raise ValueError("range starts past the end")
+    return start, end
+
+
+def _etag(stats):
+    return f'"{stats.st_size:x}-{stats.st_mtime_ns:x}"'
+
+
+def _if_range_matches(request, etag, last_modified):
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith('"'):
+        # Strong comparison only
+        return value == etag
+    date = parse_http_date_safe(value)
+    return date is not None and date == last_modified
+
+
+@require_safe
+def serve_media(request, path):
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+        stats = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404("File not found")
+    if not stat.S_ISREG(stats.st_mode):
+        raise Http404("File not found")
+
+    size = stats.st_size
+    etag = _etag(stats)
+    last_modified = int(stats.st_mtime)
+
+    not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+
+    byte_range = None
+    if "Range" in request.headers and _if_range_matches(request, etag, last_modified):
+        try:
+            byte_range = parse_range(request.headers["Range"], size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Accept-Ranges"] = "bytes"
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or "application/octet-stream"
+
+    accel_prefix = _setting("MEDIA_ACCEL_REDIRECT", None)
+    if accel_prefix:
+        # nginx reads the file and answers the Range itself
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = accel_prefix + path
+    else:
+        handle = open(full_path, "rb")
+        if byte_range:
+            start, end = byte_range
+            handle.seek(start)
+            response = FileResponse(RangeFile(handle, end - start + 1), status=206, content_type=content_type)
+            response["Content-Length"] = end - start + 1
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        else:
+            response = FileResponse(handle, content_type=content_type)
+        response.block_size = _setting("MEDIA_STREAM_CHUNK_SIZE", MEDIA_STREAM_CHUNK_SIZE)
+
+    if encoding:
+        response["Content-Encoding"] = encoding
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=_setting("MEDIA_CACHE_MAX_AGE", MEDIA_CACHE_MAX_AGE))
+    return response
@@ -0,0 +1,48 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from django.utils.safestring import mark_safe
+
+from news import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_image(source, renditions, sizes="100vw", css_class="", alt="", eager=False):
+    """
+    <picture> with AVIF / WebP / JPEG srcsets and a blurred placeholder,
+    or a plain <img> of the original while there are no renditions.
+    """
+    loading = "eager" if eager else "lazy"
+    if not renditions:
+        return format_html(
+            '<img src="{}" class="{}" alt="{}" loading="{}" decoding="async">',
+            getattr(source, "url", source), css_class, alt, loading,
+        )
+
+    store = images.storage()
+    key, widths = renditions["key"], renditions["widths"]
+
+    def srcset(fmt):
+        return ", ".join(f"{store.url(images.rendition_name(key, w, fmt))} {w}w" for w in widths)
+
+    sources = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        ((images.MIME_TYPES[fmt], srcset(fmt), sizes) for fmt in renditions["formats"] if fmt != "jpeg"),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" width="{}" height="{}" class="{}" alt="{}"'
+        ' loading="{}" decoding="async"{} style="background:url({}) center/cover"></picture>',
+        sources,
+        store.url(images.rendition_name(key, widths[-1], "jpeg")),
+        srcset("jpeg"),
+        sizes,
+        renditions["width"],
+        renditions["height"],
+        css_class,
+        alt,
+        loading,
+        mark_safe(' fetchpriority="high"') if eager else "",
+        renditions["placeholder"],
+    )
@@ -0,0 +1,18 @@
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the suite with QUERY_BUDGETS enforced: a request over its URL's
+    query budget raises QueryBudgetExceeded and fails its test.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._budgets = override_settings(QUERY_BUDGET_RAISE=True)
+        self._budgets.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self._budgets.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,1836 @@
-from django.test import TestCase
+import importlib
+import importlib.util
+import json
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+import unittest
+import uuid
+import wave
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.backends.sqlite3 import base as sqlite_base
+from django.db.models import F, Sum
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import AsyncClient, Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import clear_url_caches, resolve, reverse
+from django.utils import timezone
+
+from news_backend import urls as project_urls
+
+from .cache_server import StandInCacheServer
+from .comments import build_comment_tree, comment_replies, comment_threads
+from .benchmarks import benchmark_client
+from .dashboard import table_page
+from .management.commands import bench_suite
+from .connections import TimedConnectionMixin
+from .middleware import ConnectionTimingMiddleware, PresenceMiddleware
+from .models import (
+    Category, Comment, MediaUpload, OutboxEmail, Post, PostLike, PostTrending, Profile,
+    RelatedPost, Signup, Story, UserPresence,
+)
+from .pagination import decode_cursor, keyset_page
+from .fragments import get_generation
+from .related import RelatedModel, refresh, related_posts
+from . import connections, images, instrumentation, media, outbox, trending, voice
+from .search import SEARCH_MAX_PAGE, search_posts
+from .smtp_server import StandInSmtpServer
+from .streaming import serve_media
+from . import async_views, urls as news_urls, views
+from .views import MAX_ATTEMPTS, _filtered_posts
+
+
+class FeedPaginationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="World")
+        cls.other = Category.objects.create(name="Sport")
+
+        posts = [
+            Post.objects.create(title=f"Post {i}", category=cls.category)
+            for i in range(7)
+        ]
+        # Same timestamp on every row so the id tie-breaker is exercised
+        Post.objects.filter(id__in=[p.id for p in posts]).update(
+            created_at=timezone.now()
+        )
+        Post.objects.create(title="Other", category=cls.other)
+
+    def test_keyset_pages_cover_every_post_once(self):
+        seen = []
+        cursor = None
+
+        while True:
+            items, cursor = keyset_page(Post.objects.all(), after=cursor, page_size=3)
+            seen.extend(p.id for p in items)
+            if not cursor:
+                break
+
+        self.assertEqual(len(seen), Post.objects.count())
+        self.assertEqual(len(set(seen)), len(seen))
+
+    def test_malformed_cursor_starts_from_first_page(self):
+        self.assertIsNone(decode_cursor("not-a-cursor"))
+
+        items, _ = keyset_page(Post.objects.all(), after="not-a-cursor", page_size=3)
+        first, _ = keyset_page(Post.objects.all(), page_size=3)
+        self.assertEqual(items, first)
+
+    def test_feed_endpoint_keeps_category_filter(self):
+        response = self.client.get(reverse("feed"), {"category": self.other.id})
+        data = response.json()
+
+        self.assertEqual(data["count"], 1)
+        self.assertIsNone(data["next"])
+        self.assertIn("Other", data["html"])
+
+
+class FeedDateFilterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="World")
+        for title, moment in [
+            ("April", datetime(2024, 4, 30, 23, 0, tzinfo=dt_timezone.utc)),
+            ("Late May 1st", datetime(2024, 5, 1, 20, 0, tzinfo=dt_timezone.utc)),
+            ("May 2nd", datetime(2024, 5, 2, 12, 0, tzinfo=dt_timezone.utc)),
+        ]:
+            post = Post.objects.create(title=title, category=category)
+            Post.objects.filter(pk=post.pk).update(created_at=moment)
+
+    def _titles(self, **params):
+        request = RequestFactory().get("/", params)
+        return set(_filtered_posts(request).values_list("title", flat=True))
+
+    def test_single_day(self):
+        self.assertEqual(self._titles(date="2024-05-01"), {"Late May 1st"})
+
+    def test_inclusive_range(self):
+        self.assertEqual(self._titles(**{"from": "2024-05-01", "to": "2024-05-02"}),
+                         {"Late May 1st", "May 2nd"})
+        self.assertEqual(self._titles(to="2024-04-30"), {"April"})
+
+    @override_settings(TIME_ZONE="Asia/Kolkata")
+    def test_day_boundaries_follow_site_timezone(self):
+        # 20:00 UTC on May 1st is already May 2nd in UTC+05:30
+        self.assertEqual(self._titles(date="2024-05-02"), {"Late May 1st", "May 2nd"})
+
+    def test_malformed_dates_are_ignored(self):
+        self.assertEqual(len(self._titles(date="2024-13-01")), 3)
+        self.assertEqual(len(self._titles(**{"from": "yesterday"})), 3)
+
+
+class FragmentCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="World")
+        Post.objects.create(title="First post", category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_repeat_anonymous_visit_is_served_from_cache(self):
+        self.client.get(reverse("index"))
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("index"))
+
+        self.assertContains(response, "First post")
+        self.assertContains(response, "World")
+        # Only allauth's social app lookup for the login link remains
+        news_queries = [q["sql"] for q in queries if '"news_' in q["sql"]]
+        self.assertEqual(news_queries, [])
+
+    def test_filters_are_cached_separately(self):
+        other = Category.objects.create(name="Sport")
+        self.client.get(reverse("index"))
+
+        response = self.client.get(reverse("index"), {"category": other.id})
+        self.assertNotContains(response, "First post")
+
+    def test_publishing_invalidates_cached_fragments(self):
+        self.client.get(reverse("index"))
+        self.client.get(reverse("feed"))
+
+        Post.objects.create(title="Breaking", category=Category.objects.create(name="Tech"))
+
+        response = self.client.get(reverse("index"))
+        self.assertContains(response, "Breaking")
+        self.assertContains(response, "Tech")
+        self.assertIn("Breaking", self.client.get(reverse("feed")).json()["html"])
+
+    def test_category_nav_follows_the_generation_on_every_page(self):
+        # search renders base.html without setting the generation itself
+        self.client.get(reverse("search"), {"q": "post"})
+        Category.objects.create(name="Tech")
+
+        self.assertContains(self.client.get(reverse("search"), {"q": "post"}), "Tech")
+
+    def test_deleting_invalidates_cached_fragments(self):
+        self.client.get(reverse("index"))
+        Post.objects.filter(title="First post").delete()
+
+        self.assertNotContains(self.client.get(reverse("index")), "First post")
+
+
+@unittest.skipUnless(importlib.util.find_spec("redis"), "redis client not installed")
+class SharedCacheTests(TestCase):
+    """
+    Runs the cache against the in-memory Redis stand-in, the way several
+    workers would share one server.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = StandInCacheServer().start()
+        cls.settings_override = override_settings(CACHES={
+            "default": {
+                "BACKEND": "django.core.cache.backends.redis.RedisCache",
+                "LOCATION": cls.server.url,
+                "KEY_PREFIX": "news",
+            },
+            "template_fragments": {
+                "BACKEND": "news.cache.TieredCache",
+                "OPTIONS": {"L2": "default", "L1_TIMEOUT": 30, "MAX_ENTRIES": 3},
+            },
+        })
+        cls.settings_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.settings_override.disable()
+        cls.server.stop()
+
+    def setUp(self):
+        cache.clear()
+
+    def _other_worker(self, alias="default"):
+        # A separate client connection, as another process would have
+        return caches.create_connection(alias)
+
+    def test_cache_api_round_trip(self):
+        cache.set("a", {"nested": [1, 2]}, 60)
+        cache.set_many({"b": 2, "c": "three"})
+
+        self.assertEqual(cache.get("a"), {"nested": [1, 2]})
+        self.assertEqual(cache.get_many(["a", "b", "c", "missing"]),
+                         {"a": {"nested": [1, 2]}, "b": 2, "c": "three"})
+        self.assertFalse(cache.add("b", 5))
+        self.assertEqual(cache.incr("b", 3), 5)
+        self.assertTrue(cache.delete("c"))
+        self.assertIsNone(cache.get("c"))
+
+        cache.set("short", 1, 1)
+        time.sleep(1.1)
+        self.assertFalse(cache.has_key("short"))
+
+    def test_counters_are_atomic_across_connections(self):
+        def fail_logins():
+            worker = self._other_worker()
+            for _ in range(50):
+                worker.add("attempts", 0)
+                worker.incr("attempts")
+            worker.close()
+
+        threads = [threading.Thread(target=fail_logins) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(cache.get("attempts"), 400)
+
+    @override_settings(PASSWORD_HASHERS=["django.contrib.auth.hashers.MD5PasswordHasher"])
+    def test_login_lockout_is_shared_between_workers(self):
+        for _ in range(MAX_ATTEMPTS):
+            self.client.post(reverse("login"), {"username": "admin", "password": "wrong"})
+
+        worker = self._other_worker()
+        self.assertEqual(worker.get("login_attempts_admin"), MAX_ATTEMPTS)
+        self.assertTrue(worker.get("login_block_admin"))
+
+    def test_tiered_cache_serves_hot_keys_locally(self):
+        fragments = caches["template_fragments"]
+        fragments.set("page", "<p>cached</p>")
+
+        # Gone from the shared server, still answered by this worker's L1
+        self.server.store.data.clear()
+        self.assertEqual(fragments.get("page"), "<p>cached</p>")
+
+        # Another worker starts with an empty L1 and sees the shared state
+        self.assertIsNone(self._other_worker("template_fragments").get("page"))
+
+    def test_tiered_cache_reads_through_and_bounds_l1(self):
+        fragments = caches["template_fragments"]
+        self._other_worker("template_fragments").set("shared", "from another worker")
+        self.assertEqual(fragments.get("shared"), "from another worker")
+
+        for i in range(10):
+            fragments.set(f"key-{i}", i)
+        self.assertLessEqual(len(fragments._l1), 3)
+        self.assertEqual(fragments.get("key-0"), 0)
+
+    def test_tiered_cache_l1_follows_the_timeout(self):
+        fragments = caches["template_fragments"]
+        fragments.set("brief", "soon gone", 1)
+        fragments.set("never", "not stored", 0)
+
+        self.assertIsNone(fragments.get("never"))
+        self.assertNotIn(fragments.make_and_validate_key("never"), fragments._l1)
+
+        expires_at = fragments._l1[fragments.make_and_validate_key("brief")][1]
+        self.assertLessEqual(expires_at - time.monotonic(), 1)
+
+
+class ConditionalGetTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader")
+        cls.post = Post.objects.create(title="Story", category=Category.objects.create(name="World"))
+
+    def setUp(self):
+        cache.clear()
+
+    def _revalidate(self, url, response):
+        return self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+
+    def test_unchanged_article_is_not_modified(self):
+        url = reverse("newsview", args=[self.post.id])
+        response = self.client.get(url)
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        with self.assertNumQueries(1):
+            revalidated = self._revalidate(url, response)
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_comments_and_likes_change_the_article_version(self):
+        url = reverse("newsview", args=[self.post.id])
+
+        response = self.client.get(url)
+        comment = Comment.objects.create(user=self.user, post=self.post, text="First")
+        self.assertEqual(self._revalidate(url, response).status_code, 200)
+
+        response = self.client.get(url)
+        Comment.objects.filter(pk=comment.pk).update(like_count=1)
+        self.assertEqual(self._revalidate(url, response).status_code, 200)
+
+        response = self.client.get(url)
+        Post.objects.filter(pk=self.post.pk).update(like_count=1)
+        self.assertEqual(self._revalidate(url, response).status_code, 200)
+
+    def test_article_version_is_per_viewer(self):
+        url = reverse("newsview", args=[self.post.id])
+        response = self.client.get(url)
+
+        self.client.force_login(self.user)
+        self.assertEqual(self._revalidate(url, response).status_code, 200)
+
+    def test_missing_article_is_still_404(self):
+        response = self.client.get(reverse("newsview", args=[uuid.uuid4()]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_feed_revalidates_until_next_publish(self):
+        url = reverse("index")
+        response = self.client.get(url)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self._revalidate(url, response).status_code, 304)
+
+        Post.objects.create(title="Breaking", category=self.post.category)
+        self.assertEqual(self._revalidate(url, response).status_code, 200)
+
+        filtered = self.client.get(url, {"category": self.post.category_id})
+        self.assertNotEqual(filtered["ETag"], self.client.get(url)["ETag"])
+
+
+class SearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name="World")
+        cls.in_title = Post.objects.create(
+            title="Election results announced", description="Counting ended overnight.",
+            category=category,
+        )
+        cls.in_description = Post.objects.create(
+            title="Morning briefing", description="What the election means for markets.",
+            category=category,
+        )
+        for i in range(3):
+            Post.objects.create(title=f"Weather update {i}", category=category)
+
+    def test_title_matches_rank_first(self):
+        posts, has_next = search_posts("election")
+        self.assertEqual(posts, [self.in_title, self.in_description])
+        self.assertFalse(has_next)
+
+    def test_every_word_must_match(self):
+        posts, _ = search_posts("election markets")
+        self.assertEqual(posts, [self.in_description])
+
+    def test_results_are_paginated(self):
+        first, has_next = search_posts("weather", page_size=2)
+        second, last = search_posts("weather", page=2, page_size=2)
+
+        self.assertTrue(has_next)
+        self.assertFalse(last)
+        self.assertEqual(len(set(first) | set(second)), 3)
+
+    def test_index_follows_edits_and_deletes(self):
+        self.in_title.title = "Referendum results announced"
+        self.in_title.save()
+        self.assertEqual(search_posts("referendum")[0], [self.in_title])
+        self.assertEqual(search_posts("election")[0], [self.in_description])
+
+        self.in_description.delete()
+        self.assertEqual(search_posts("election")[0], [])
+
+    def test_query_syntax_is_not_interpreted(self):
+        posts, _ = search_posts('"election" (*')
+        self.assertEqual(posts, [self.in_title, self.in_description])
+        self.assertEqual(search_posts("!!!"), ([], False))
+
+    def test_search_page(self):
+        response = self.client.get(reverse("search"), {"q": "Election", "page": "x"})
+        self.assertContains(response, "Election results announced")
+        self.assertContains(response, "Morning briefing")
+        self.assertNotContains(response, "Weather update")
+
+    def test_search_page_shows_the_page_it_served(self):
+        response = self.client.get(reverse("search"), {"q": "Election", "page": "9999"})
+
+        self.assertEqual(response.context["page"], SEARCH_MAX_PAGE)
+        self.assertContains(response, f"page {SEARCH_MAX_PAGE}")
+        self.assertFalse(response.context["has_next"])
+
+
+class RelatedPostsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.politics = Category.objects.create(name="Politics")
+        cls.sport = Category.objects.create(name="Sport")
+
+        def post(title, category, description=""):
+            return Post.objects.create(title=title, category=category, description=description)
+
+        cls.budget = post("Parliament passes budget", cls.politics, "Finance minister defends budget cuts.")
+        cls.budget_vote = post("Budget vote splits parliament", cls.politics, "Opposition rejects budget.")
+        cls.election = post("Election date announced", cls.politics)
+        cls.match = post("Derby ends in draw", cls.sport, "Late goal rescues a point.")
+        cls.budget_sport = post("Club budget questioned", cls.sport, "Fans ask about the budget.")
+        post("Coach signs contract", cls.sport)
+        post("Tennis final postponed", cls.sport, "Rain stops play.")
+
+    def test_text_similarity_outranks_plain_recency(self):
+        refresh()
+        related = related_posts(self.budget)
+
+        self.assertEqual(related[0], self.budget_vote)
+        self.assertNotIn(self.budget, related)
+        # Unrelated posts from other categories are never suggested
+        self.assertNotIn(self.match, related)
+        self.assertIn(self.budget_sport, related)
+
+    def test_cosines_match_dense_computation(self):
+        posts = list(Post.objects.values("id", "category_id", "created_at", "title", "description"))
+        model = RelatedModel(posts)
+
+        dense = np.zeros((model.size, model.term_ptr.size - 1))
+        for i in range(model.size):
+            start, end = model.indptr[i], model.indptr[i + 1]
+            dense[i, model.indices[start:end]] = model.data[start:end]
+
+        for i in range(model.size):
+            np.testing.assert_allclose(model.cosines(i), dense @ dense[i])
+
+    def test_incremental_refresh_covers_new_posts(self):
+        self.assertEqual(refresh(), Post.objects.count())
+        self.assertEqual(refresh(), 0)
+
+        latest = Post.objects.create(
+            title="Budget talks resume", category=self.politics, description="Parliament returns.",
+        )
+        refreshed = refresh()
+
+        self.assertGreater(refreshed, 1)
+        self.assertLess(refreshed, Post.objects.count())
+        self.assertIn(latest, related_posts(self.budget))
+        self.assertTrue(RelatedPost.objects.filter(post=latest).exists())
+
+    def test_only_changed_lists_bump_the_generation(self):
+        refresh()
+        generation = get_generation()
+
+        refresh(full=True)
+        self.assertEqual(get_generation(), generation)
+
+        Post.objects.create(title="Budget talks resume", category=self.politics)
+        generation = get_generation()
+        refresh()
+        self.assertNotEqual(get_generation(), generation)
+
+    def test_posts_without_neighbours_are_computed_once(self):
+        almanac = Post.objects.create(title="Quarterly weather almanac", category=Category.objects.create(name="Almanac"))
+
+        # Its list stays empty, so it is not counted as changed
+        self.assertEqual(refresh(), Post.objects.count() - 1)
+        almanac.refresh_from_db()
+        self.assertIsNotNone(almanac.related_refreshed_at)
+        self.assertEqual(refresh(), 0)
+
+    def test_falls_back_to_category_until_refreshed(self):
+        related = related_posts(self.election)
+        self.assertEqual(set(related), {self.budget, self.budget_vote})
+
+    def test_newsview_reads_stored_recommendations_in_one_query(self):
+        refresh()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse("newsview", args=[self.budget.id]))
+
+        related_queries = [q for q in queries if "news_relatedpost" in q["sql"]]
+        self.assertEqual(len(related_queries), 1)
+
+
+class TrendingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [User.objects.create_user(f"reader{i}") for i in range(4)]
+        category = Category.objects.create(name="World")
+        cls.posts = [Post.objects.create(title=f"Post {i}", category=category) for i in range(6)]
+
+    def setUp(self):
+        cache.clear()
+
+    def _activity(self, post, likes=0, comments=0, age=timedelta()):
+        for user in self.users[:likes]:
+            PostLike.objects.create(user=user, post=post)
+        for _ in range(comments):
+            Comment.objects.create(user=self.users[0], post=post, text="!")
+
+        when = timezone.now() - age
+        PostLike.objects.filter(post=post).update(created_at=when)
+        Comment.objects.filter(post=post).update(created_at=when)
+
+    def test_scores_decay_with_age(self):
+        self._activity(self.posts[0], likes=4)
+        self._activity(self.posts[1], likes=4, age=trending.TRENDING_HALF_LIFE)
+        self._activity(self.posts[2], comments=1)
+        self._activity(self.posts[3], likes=4, age=trending.TRENDING_WINDOW + timedelta(hours=1))
+
+        scores = trending.compute_scores()
+
+        self.assertAlmostEqual(scores[self.posts[0].id], 4, places=3)
+        self.assertAlmostEqual(scores[self.posts[1].id], 2, places=3)
+        self.assertAlmostEqual(scores[self.posts[2].id], trending.COMMENT_WEIGHT, places=3)
+        self.assertNotIn(self.posts[3].id, scores)
+
+    def test_refresh_replaces_stale_rows(self):
+        self._activity(self.posts[0], likes=1)
+        self.assertEqual(trending.refresh(), 1)
+
+        PostLike.objects.all().delete()
+        self._activity(self.posts[1], likes=2)
+        self.assertEqual(trending.refresh(), 1)
+        self.assertEqual(list(PostTrending.objects.values_list("post_id", flat=True)), [self.posts[1].id])
+
+    def test_only_a_new_top_order_bumps_the_generation(self):
+        self._activity(self.posts[0], likes=2)
+        self._activity(self.posts[1], likes=1)
+        trending.refresh()
+        generation = get_generation()
+
+        # Same order, decayed scores
+        trending.refresh(timezone.now() + timedelta(hours=1))
+        self.assertEqual(get_generation(), generation)
+
+        self._activity(self.posts[2], likes=3)
+        trending.refresh()
+        self.assertNotEqual(get_generation(), generation)
+
+    def test_trending_feed_pages_by_score(self):
+        for i, post in enumerate(self.posts[:5]):
+            self._activity(post, likes=1 + i % 3)
+        trending.refresh()
+
+        seen, cursor = [], None
+        while True:
+            items, cursor = trending.trending_page(Post.objects.all(), after=cursor, page_size=2)
+            seen.extend(items)
+            if not cursor:
+                break
+
+        scores = [post.trending.score for post in seen]
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertNotIn(self.posts[5], seen)
+
+    def test_feed_endpoint_sorts_by_trending(self):
+        self._activity(self.posts[0], likes=3)
+        self._activity(self.posts[4], likes=1)
+        trending.refresh()
+
+        data = self.client.get(reverse("feed"), {"sort": "trending"}).json()
+        self.assertEqual(data["count"], 2)
+        self.assertLess(data["html"].index("Post 0"), data["html"].index("Post 4"))
+
+    def test_refresh_retires_cached_trending_pages(self):
+        self._activity(self.posts[0], likes=3)
+        self._activity(self.posts[4], likes=1)
+        trending.refresh()
+        cursor = trending._encode(Post.objects.select_related("trending").get(pk=self.posts[0].pk))
+        query = {"sort": "trending", "after": cursor}
+        self.assertEqual(self.client.get(reverse("feed"), query).json()["count"], 1)
+
+        # Same top order, so the generation stays; every score has decayed
+        # below the one in the cursor
+        generation = get_generation()
+        trending.refresh(timezone.now() + timedelta(hours=1))
+        self.assertEqual(get_generation(), generation)
+
+        self.assertEqual(self.client.get(reverse("feed"), query).json()["count"], 2)
+
+
+class FailingBackend:
+
+    def upload(self, path, kind):
+        raise ConnectionError("storage unavailable")
+
+
+class MediaUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("author")
+        cls.category = Category.objects.create(name="World")
+
+    def setUp(self):
+        staging = tempfile.TemporaryDirectory()
+        stored = tempfile.TemporaryDirectory()
+        self.addCleanup(staging.cleanup)
+        self.addCleanup(stored.cleanup)
+        self.stored = Path(stored.name)
+
+        override = override_settings(
+            MEDIA_UPLOAD_STAGING_DIR=staging.name,
+            MEDIA_UPLOAD_LOCAL_DIR=stored.name,
+            MEDIA_UPLOAD_BACKEND="news.media.LocalBackend",
+            MEDIA_UPLOAD_WORKERS=0,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client.force_login(self.user)
+
+    def _upload(self, name="clip.mp4", content_type="video/mp4"):
+        return SimpleUploadedFile(name, b"\0" * 4096, content_type=content_type)
+
+    def test_post_is_saved_before_media_is_pushed(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            self.client.post(reverse("profile"), {
+                "title": "Flood footage", "category": self.category.id, "media": self._upload(),
+            })
+
+        post = Post.objects.get(title="Flood footage")
+        job = post.media_uploads.get()
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(post.media_status, Post.MEDIA_PROCESSING)
+        self.assertFalse(post.video)
+        self.assertTrue(Path(job.staged_path).exists())
+
+        self.assertEqual(media.process_pending(), 1)
+
+        post.refresh_from_db()
+        self.assertEqual(post.media_status, Post.MEDIA_READY)
+        self.assertEqual(post.video.public_id, Path(job.staged_path).stem)
+        self.assertFalse(Path(job.staged_path).exists())
+        self.assertTrue((self.stored / Path(job.staged_path).name).exists())
+
+    def test_edit_keeps_current_media_until_replacement_is_live(self):
+        post = Post.objects.create(title="Old", category=self.category, user=self.user)
+        Post.objects.filter(pk=post.pk).update(image="image/upload/v1/old")
+
+        self.client.post(reverse("edit_post_ajax", args=[post.id]), {
+            "title": "New", "description": "", "media": self._upload(),
+        })
+
+        post.refresh_from_db()
+        self.assertEqual(post.title, "New")
+        self.assertEqual(post.image.public_id, "old")
+        self.assertEqual(post.media_status, Post.MEDIA_PROCESSING)
+
+        media.process_pending()
+        post.refresh_from_db()
+        self.assertFalse(post.image)
+        self.assertTrue(post.video)
+
+    def test_failed_uploads_are_retried_then_marked(self):
+        post = Post(title="Doomed", category=self.category)
+        job = media.save_with_media(post, self._upload("photo.jpg", "image/jpeg"))
+
+        with self.assertLogs("news.media", "ERROR"):
+            for _ in range(media.MAX_ATTEMPTS):
+                self.assertEqual(media.process_pending(backend=FailingBackend()), 0)
+
+        job.refresh_from_db()
+        post.refresh_from_db()
+        self.assertEqual(job.status, MediaUpload.FAILED)
+        self.assertEqual(job.attempts, media.MAX_ATTEMPTS)
+        self.assertEqual(post.media_status, Post.MEDIA_FAILED)
+
+    @override_settings(MEDIA_UPLOAD_WORKERS=2)
+    def test_failed_attempts_are_resubmitted_after_backoff(self):
+        job = media.save_with_media(Post(title="Flaky", category=self.category), self._upload())
+
+        with mock.patch.object(media.threading, "Timer") as timer, self.assertLogs("news.media", "ERROR"):
+            media.run(job.pk, backend=FailingBackend())
+            media.run(job.pk, backend=FailingBackend())
+            media.run(job.pk, backend=FailingBackend())
+
+        self.assertEqual(
+            [call.args for call in timer.call_args_list],
+            [(30.0, media.submit), (60.0, media.submit)],
+        )
+        self.assertEqual(timer.call_args.kwargs, {"args": [job.pk]})
+        job.refresh_from_db()
+        self.assertEqual(job.status, MediaUpload.FAILED)
+
+    def test_replaced_media_is_deleted_from_storage(self):
+        post = Post(title="Footage", category=self.category)
+        first = media.save_with_media(post, self._upload())
+        media.run(first.pk)
+        post.refresh_from_db()
+
+        second = media.save_with_media(post, self._upload())
+        third = media.save_with_media(post, self._upload())
+        # Finishes after the third was queued, so it is never shown
+        media.run(second.pk)
+        media.run(third.pk)
+
+        post.refresh_from_db()
+        self.assertEqual(
+            [path.stem for path in self.stored.iterdir()],
+            [Path(third.staged_path).stem],
+        )
+        self.assertEqual(post.video.public_id, Path(third.staged_path).stem)
+
+    def test_jobs_are_claimed_once(self):
+        job = media.save_with_media(Post(title="Once", category=self.category), self._upload())
+
+        self.assertTrue(media.run(job.pk))
+        self.assertFalse(media.run(job.pk))
+
+    def test_other_files_are_rejected(self):
+        self.client.post(reverse("profile"), {
+            "title": "Notes", "category": self.category.id,
+            "media": self._upload("notes.pdf", "application/pdf"),
+        })
+        self.assertFalse(Post.objects.filter(title="Notes").exists())
+
+
+def jpeg_bytes(width, height):
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+class ImageRenditionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="World")
+
+    def setUp(self):
+        for name in ("staging", "stored", "renditions"):
+            directory = tempfile.TemporaryDirectory()
+            self.addCleanup(directory.cleanup)
+            setattr(self, name, Path(directory.name))
+
+        override = override_settings(
+            MEDIA_UPLOAD_STAGING_DIR=str(self.staging),
+            MEDIA_UPLOAD_LOCAL_DIR=str(self.stored),
+            MEDIA_UPLOAD_BACKEND="news.media.LocalBackend",
+            MEDIA_UPLOAD_WORKERS=0,
+            IMAGE_RENDITION_ROOT=str(self.renditions),
+            IMAGE_RENDITION_URL="/media/renditions/",
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def test_widths_and_formats(self):
+        original = jpeg_bytes(1600, 900)
+        renditions = images.build(BytesIO(original), "post", uuid.uuid4())
+
+        self.assertEqual(renditions["widths"], [320, 640, 960, 1280])
+        self.assertEqual((renditions["width"], renditions["height"]), (1600, 900))
+        self.assertTrue(renditions["placeholder"].startswith("data:image/webp;base64,"))
+
+        for width in renditions["widths"]:
+            for fmt in renditions["formats"]:
+                path = self.renditions / images.rendition_name(renditions["key"], width, fmt)
+                self.assertLess(path.stat().st_size, len(original))
+
+    def test_small_images_keep_their_size(self):
+        renditions = images.build(BytesIO(jpeg_bytes(200, 150)), "story", uuid.uuid4())
+        self.assertEqual(renditions["widths"], [200])
+
+    def test_uploaded_image_gets_renditions(self):
+        post = Post(title="Skyline", category=self.category)
+        upload = SimpleUploadedFile("skyline.jpg", jpeg_bytes(1000, 600), content_type="image/jpeg")
+        media.save_with_media(post, upload)
+        media.process_pending()
+
+        post.refresh_from_db()
+        first = post.image_renditions
+        self.assertEqual(first["widths"], [320, 640, 960])
+
+        media.save_with_media(post, SimpleUploadedFile("clip.mp4", b"\0", content_type="video/mp4"))
+        media.process_pending()
+
+        post.refresh_from_db()
+        self.assertEqual(post.image_renditions, {})
+        self.assertFalse(list((self.renditions / first["key"]).iterdir()))
+
+    def test_template_tag(self):
+        template = Template(
+            '{% load responsive %}{% responsive_image src renditions sizes="50vw" alt="Sky" %}'
+        )
+        renditions = images.build(BytesIO(jpeg_bytes(700, 400)), "post", uuid.uuid4())
+
+        html = template.render(Context({"src": "/original.jpg", "renditions": renditions}))
+        self.assertIn('<source type="image/webp"', html)
+        self.assertIn(f'/media/renditions/{renditions["key"]}/640.jpg 640w', html)
+        self.assertIn('sizes="50vw"', html)
+        self.assertIn(renditions["placeholder"], html)
+        self.assertNotIn("/original.jpg", html)
+
+        html = template.render(Context({"src": "/original.jpg", "renditions": {}}))
+        self.assertIn('<img src="/original.jpg"', html)
+
+    def test_story_renditions_are_built_after_the_response(self):
+        self.client.force_login(User.objects.create_superuser("editor"))
+        upload = SimpleUploadedFile("story.jpg", jpeg_bytes(800, 600), content_type="image/jpeg")
+
+        with override_settings(MEDIA_ROOT=str(self.stored)):
+            with mock.patch.object(media, "run_in_background", lambda func, *args: func(*args)):
+                with self.captureOnCommitCallbacks(execute=True):
+                    self.client.post(reverse("admin-dashboard"), {
+                        "action": "add_story", "link": "", "description": "Skyline", "media": upload,
+                    })
+                    # The original is shown until the pool has run
+                    self.assertEqual(Story.objects.get().image_renditions, {})
+
+        self.assertEqual(Story.objects.get().image_renditions["widths"], [320, 640])
+
+    def test_deleting_discards_renditions(self):
+        renditions = images.build(BytesIO(jpeg_bytes(700, 400)), "post", uuid.uuid4())
+        post = Post.objects.create(title="Skyline", category=self.category, image_renditions=renditions)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+
+        self.assertFalse(list((self.renditions / renditions["key"]).iterdir()))
+
+
+class MediaStreamingTests(SimpleTestCase):
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+
+        override = override_settings(MEDIA_ROOT=root.name, MEDIA_ACCEL_REDIRECT=None)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.data = bytes(range(256)) * 800
+        clip = Path(root.name) / "stories" / "videos" / "clip.mp4"
+        clip.parent.mkdir(parents=True)
+        clip.write_bytes(self.data)
+        self.url = "/media/stories/videos/clip.mp4"
+
+    def _get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        self.addCleanup(response.close)
+        return response
+
+    def test_full_file_is_streamed_in_chunks(self):
+        response = self._get()
+        chunks = list(response.streaming_content)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "video/mp4")
+        self.assertEqual(response["Content-Length"], str(len(self.data)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertIn("public", response["Cache-Control"])
+        self.assertEqual(b"".join(chunks), self.data)
+        self.assertLessEqual(max(map(len, chunks)), 64 * 1024)
+
+    def test_ranges(self):
+        size = len(self.data)
+        for header, start, end in [
+            ("bytes=100-199", 100, 199),
+            ("bytes=200000-", 200000, size - 1),
+            ("bytes=-10", size - 10, size - 1),
+            ("bytes=0-999999999", 0, size - 1),
+        ]:
+            with self.subTest(header):
+                response = self._get(Range=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/{size}")
+                self.assertEqual(response["Content-Length"], str(end - start + 1))
+                self.assertEqual(b"".join(response.streaming_content), self.data[start:end + 1])
+
+    def test_range_response_can_be_sent_with_sendfile(self):
+        # The test client rewraps streaming responses, so call the view
+        request = RequestFactory().get(self.url, headers={"Range": "bytes=5000-"})
+        response = serve_media(request, "stories/videos/clip.mp4")
+        self.addCleanup(response.close)
+
+        fd = response.file_to_stream.fileno()
+        self.assertEqual(os.lseek(fd, 0, os.SEEK_CUR), 5000)
+
+    def test_unsatisfiable_and_ignored_ranges(self):
+        response = self._get(Range=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+
+        for header in ("bytes=0-1,5-6", "items=0-1", "bytes=9-3"):
+            self.assertEqual(self._get(Range=header).status_code, 200)
+
+    def test_if_range(self):
+        etag = self._get()["ETag"]
+
+        self.assertEqual(self._get(Range="bytes=0-9", If_Range=etag).status_code, 206)
+        self.assertEqual(self._get(Range="bytes=0-9", If_Range='"stale"').status_code, 200)
+
+    def test_revalidation(self):
+        etag = self._get()["ETag"]
+        self.assertEqual(self._get(If_None_Match=etag).status_code, 304)
+
+    def test_paths_outside_media_root(self):
+        for url in ("/media/../settings.py", "/media/stories/", "/media/missing.mp4"):
+            self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(MEDIA_ACCEL_REDIRECT="/protected-media/")
+    def test_accel_redirect(self):
+        response = self._get(Range="bytes=0-9")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/stories/videos/clip.mp4")
+        self.assertEqual(response.content, b"")
+
+
+def tone(segments, rate=voice.SAMPLE_RATE):
+    """
+    Mono 16-bit samples: a 440 Hz tone at each (seconds, amplitude) segment.
+    """
+    parts = []
+    for seconds, amplitude in segments:
+        t = np.arange(int(seconds * rate)) / rate
+        parts.append(amplitude * np.sin(2 * np.pi * 440 * t))
+    return np.concatenate(parts).astype(np.int16)
+
+
+def wav_bytes(samples, rate=voice.SAMPLE_RATE):
+    buffer = BytesIO()
+    with wave.open(buffer, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        out.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+class WavTranscoder:
+    """
+    Stand-in for ffmpeg: "decodes" and "encodes" WAV files.
+    """
+
+    extension = "wav"
+
+    def decode(self, data, rate, max_seconds):
+        with wave.open(BytesIO(data)) as source:
+            return source.readframes(int(max_seconds * rate))
+
+    def encode(self, pcm, rate):
+        return wav_bytes(np.frombuffer(pcm, dtype="<i2"), rate)
+
+
+class BrokenTranscoder(WavTranscoder):
+
+    def decode(self, data, rate, max_seconds):
+        raise subprocess.CalledProcessError(1, "ffmpeg")
+
+
+class VoiceCommentTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("speaker")
+        cls.post = Post.objects.create(title="Story", category=Category.objects.create(name="World"))
+
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.root = Path(root.name)
+
+        override = override_settings(
+            MEDIA_ROOT=root.name,
+            MEDIA_UPLOAD_WORKERS=0,
+            VOICE_TRANSCODER="news.tests.WavTranscoder",
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.client.force_login(self.user)
+
+    def _comment(self, samples):
+        upload = SimpleUploadedFile("comment_audio_1.wav", wav_bytes(samples), content_type="audio/wav")
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(reverse("add_comment"), {"post_id": self.post.id, "audio": upload})
+        self.assertEqual(len(callbacks), 1)
+        return response
+
+    def test_silence_is_stripped(self):
+        rate = voice.SAMPLE_RATE
+        samples = tone([(1, 0), (1, 8000), (3, 0), (1, 8000), (1, 0)])
+
+        stripped = voice.strip_silence(samples, rate)
+
+        self.assertAlmostEqual(len(stripped) / rate, 2 + voice.MAX_PAUSE_SECONDS, delta=0.05)
+
+    def test_waveform_peaks(self):
+        peaks = voice.waveform_peaks(tone([(1, 16000), (1, 4000)]), bars=8)
+
+        self.assertEqual(len(peaks), 8)
+        self.assertEqual(list(peaks[:4]), [255] * 4)
+        self.assertEqual(list(peaks[4:]), [64] * 4)
+
+    def test_comment_is_visible_while_audio_is_processed(self):
+        response = self._comment(tone([(2, 0), (3, 8000), (2, 0)]))
+        self.assertEqual(response.json()["audio_status"], Comment.AUDIO_QUEUED)
+
+        comment = Comment.objects.get(pk=response.json()["id"])
+        raw = self.root / comment.audio.name
+        raw_size = raw.stat().st_size
+        self.assertIn(comment, comment_threads(self.post)[0])
+
+        self.assertEqual(voice.process_pending(), 1)
+
+        comment.refresh_from_db()
+        self.assertEqual(comment.audio_status, Comment.AUDIO_READY)
+        self.assertAlmostEqual(comment.audio_duration, 3, delta=0.05)
+        self.assertEqual(len(comment.audio_peaks), voice.VOICE_PEAKS)
+        # Only the three seconds of speech are left
+        self.assertLess((self.root / comment.audio.name).stat().st_size, raw_size / 2)
+        # Pages rendered earlier still play the raw file for a while
+        self.assertTrue(raw.exists())
+        self.assertEqual(voice.delete_raw_uploads(), 0)
+
+        with override_settings(VOICE_RAW_RETENTION=-1):
+            self.assertEqual(voice.delete_raw_uploads(), 1)
+        self.assertFalse(raw.exists())
+        self.assertTrue((self.root / comment.audio.name).exists())
+
+    def test_processing_changes_the_article_etag(self):
+        url = reverse("newsview", args=[self.post.id])
+        self._comment(tone([(1, 8000)]))
+        # Last-Modified has whole seconds; processing takes longer than that
+        Post.objects.update(created_at=F("created_at") - timedelta(seconds=5))
+        Comment.objects.update(created_at=F("created_at") - timedelta(seconds=5))
+        queued = self.client.get(url)
+
+        voice.process_pending()
+
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": queued["ETag"]}).status_code, 200)
+        self.assertEqual(
+            self.client.get(url, headers={"If-Modified-Since": queued["Last-Modified"]}).status_code, 200
+        )
+
+    @override_settings(VOICE_MAX_SECONDS=1)
+    def test_duration_is_capped(self):
+        self._comment(tone([(5, 8000)]))
+        voice.process_pending()
+
+        self.assertAlmostEqual(Comment.objects.get().audio_duration, 1, delta=0.05)
+
+    @override_settings(VOICE_MAX_UPLOAD_BYTES=1000)
+    def test_large_uploads_are_rejected(self):
+        upload = SimpleUploadedFile("long.wav", wav_bytes(tone([(1, 8000)])), content_type="audio/wav")
+        response = self.client.post(reverse("add_comment"), {"post_id": self.post.id, "audio": upload})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_failed_processing_keeps_the_recording(self):
+        self._comment(tone([(1, 8000)]))
+
+        with self.assertLogs("news.voice", "ERROR"):
+            self.assertEqual(voice.process_pending(transcoder=BrokenTranscoder()), 0)
+
+        comment = Comment.objects.get()
+        self.assertEqual(comment.audio_status, Comment.AUDIO_FAILED)
+        self.assertTrue((self.root / comment.audio.name).exists())
+
+    def test_stale_processing_is_requeued(self):
+        self._comment(tone([(1, 8000)]))
+        comment = Comment.objects.get()
+        # A worker claimed it and died
+        Comment.objects.update(audio_status=Comment.AUDIO_PROCESSING, audio_updated_at=timezone.now())
+
+        self.assertEqual(voice.process_pending(), 0)
+
+        Comment.objects.update(audio_updated_at=timezone.now() - media.STALE_AFTER - timedelta(minutes=1))
+        self.assertEqual(voice.process_pending(), 1)
+        comment.refresh_from_db()
+        self.assertEqual(comment.audio_status, Comment.AUDIO_READY)
+
+    @unittest.skipUnless(shutil.which("ffmpeg"), "ffmpeg is not installed")
+    def test_ffmpeg_reencodes_to_opus(self):
+        transcoder = voice.FfmpegTranscoder()
+        pcm = transcoder.decode(wav_bytes(tone([(3, 8000)])), voice.SAMPLE_RATE, 120)
+        encoded = transcoder.encode(pcm, voice.SAMPLE_RATE)
+
+        self.assertTrue(encoded.startswith(b"\x1aE\xdf\xa3"))
+        self.assertLess(len(encoded), len(pcm) / 10)
+
+
+class OutboxTests(TestCase):
+
+    def setUp(self):
+        self.server = StandInSmtpServer().start()
+        self.addCleanup(self.server.stop)
+
+        host, port = self.server.server_address
+        override = override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST=host,
+            EMAIL_PORT=port,
+            EMAIL_USE_TLS=False,
+            EMAIL_HOST_USER="",
+            EMAIL_HOST_PASSWORD="",
+            EMAIL_TIMEOUT=5,
+            OUTBOX_SEND_IN_PROCESS=False,
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _queue(self, *recipients):
+        return [outbox.enqueue("Hello", "Body", [address]) for address in recipients]
+
+    def test_reset_request_only_queues_the_email(self):
+        Signup.objects.create(username="reader", email="reader@example.com", password="x")
+        self.server.delay = 1
+
+        started = time.perf_counter()
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post("/forgot-password-ajax/", {"username": "reader"})
+
+        self.assertLess(time.perf_counter() - started, 0.5)
+        self.assertTrue(response.json()["success"])
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(self.server.connections, 0)
+
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, ["reader@example.com"])
+        self.assertIn("/reset-password/", email.body)
+
+    def test_batches_share_one_connection(self):
+        self._queue(*[f"user{i}@example.com" for i in range(7)])
+
+        counts = outbox.drain(batch_size=3)
+
+        self.assertEqual(counts[OutboxEmail.SENT], 7)
+        self.assertEqual(self.server.connections, 1)
+        self.assertEqual(len(self.server.messages), 7)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.SENT).exists())
+
+    def test_permanent_failures_become_dead_letters(self):
+        self.server.reject.add("gone@example.com")
+        gone, ok = self._queue("gone@example.com", "ok@example.com")
+
+        with self.assertLogs("news.outbox", "ERROR"):
+            counts = outbox.drain()
+
+        self.assertEqual((counts[OutboxEmail.SENT], counts[OutboxEmail.DEAD]), (1, 1))
+        gone.refresh_from_db()
+        self.assertEqual(gone.status, OutboxEmail.DEAD)
+        self.assertIn("550", gone.last_error)
+        self.assertEqual(list(outbox.dead_letters()), [gone])
+        self.assertEqual(self.server.connections, 1)
+
+    @override_settings(OUTBOX_MAX_ATTEMPTS=2)
+    def test_temporary_failures_are_retried_with_backoff(self):
+        self.server.defer.add("busy@example.com")
+        email, = self._queue("busy@example.com")
+
+        self.assertEqual(outbox.drain()[OutboxEmail.PENDING], 1)
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (OutboxEmail.PENDING, 1))
+        self.assertGreater(email.next_attempt_at, timezone.now() + timedelta(seconds=50))
+
+        # Not due yet
+        self.assertEqual(outbox.drain()[OutboxEmail.PENDING], 0)
+
+        OutboxEmail.objects.update(next_attempt_at=timezone.now())
+        with self.assertLogs("news.outbox", "ERROR"):
+            outbox.drain()
+        email.refresh_from_db()
+        self.assertEqual(email.status, OutboxEmail.DEAD)
+
+    def test_sender_wakes_up_when_a_retry_falls_due(self):
+        self.server.defer.add("busy@example.com")
+        self._queue("busy@example.com")
+        outbox.drain()
+
+        with mock.patch.object(outbox.threading, "Timer") as timer:
+            outbox._schedule_wakeup()
+            delay, target = timer.call_args.args
+            self.assertAlmostEqual(delay, 60, delta=7)
+            self.assertIs(target, outbox.kick)
+            timer.return_value.start.assert_called_once()
+
+            OutboxEmail.objects.all().delete()
+            self.assertIsNone(outbox._schedule_wakeup())
+            timer.return_value.cancel.assert_called_once()
+
+    def test_unreachable_relay_defers_the_batch(self):
+        self._queue("a@example.com", "b@example.com")
+        self.server.stop()
+
+        counts = outbox.drain()
+
+        self.assertEqual(counts[OutboxEmail.PENDING], 2)
+        self.assertFalse(OutboxEmail.objects.exclude(status=OutboxEmail.PENDING).exists())
+
+    def test_claimed_messages_are_not_sent_twice(self):
+        self._queue("a@example.com")
+        claimed = outbox._claim(10)
+
+        self.assertEqual(len(claimed), 1)
+        self.assertEqual(outbox._claim(10), [])
+
+
+class AsyncViewTests(TestCase):
+    """
+    The ASGI profile (ASYNC_VIEWS) against the same URLs as the sync views.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.enterClassContext(override_settings(ASYNC_VIEWS=True))
+        cls._reload_urls()
+        cls.addClassCleanup(cls._reload_urls)
+
+    @staticmethod
+    def _reload_urls():
+        importlib.reload(news_urls)
+        importlib.reload(project_urls)
+        clear_url_caches()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader")
+        cls.category = Category.objects.create(name="World")
+        cls.post = Post.objects.create(title="Story", category=cls.category)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_urls_point_at_async_views(self):
+        self.assertEqual(resolve(reverse("index")).func.__module__, "news.async_views")
+
+    async def test_feed_and_article_revalidate(self):
+        for url in (reverse("index"), reverse("newsview", args=[self.post.id])):
+            response = await self.async_client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertContains(response, "Story")
+
+            revalidated = await self.async_client.get(url, headers={"If-None-Match": response["ETag"]})
+            self.assertEqual(revalidated.status_code, 304)
+
+        missing = await self.async_client.get(reverse("newsview", args=[uuid.uuid4()]))
+        self.assertEqual(missing.status_code, 404)
+
+    def _article_request(self):
+        request = RequestFactory().get(reverse("newsview", args=[self.post.id]))
+        # A fresh user each time, as per request, so no relation is cached
+        request.user = User.objects.get(pk=self.user.pk)
+
+        async def auser():
+            return request.user
+        request.auser = auser
+        return request
+
+    def test_article_queries_match_the_sync_view(self):
+        Comment.objects.create(user=self.user, post=self.post, text="First")
+        # Warms the per-process Site cache
+        views.newsview(self._article_request(), post_id=self.post.id)
+
+        with CaptureQueriesContext(connection) as sync_queries:
+            views.newsview(self._article_request(), post_id=self.post.id)
+        with CaptureQueriesContext(connection) as async_queries:
+            response = async_to_sync(async_views.newsview)(self._article_request(), post_id=self.post.id)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "First")
+        self.assertEqual(len(async_queries), len(sync_queries))
+
+    async def test_like_and_comment_endpoints(self):
+        await self.async_client.aforce_login(self.user)
+
+        liked = await self.async_client.post(reverse("post_like"), {"post_id": str(self.post.id)})
+        self.assertEqual(liked.json(), {"likes_count": 1, "user_liked": True})
+
+        added = await self.async_client.post(reverse("add_comment"), {
+            "post_id": str(self.post.id), "text": "Async hello",
+        })
+        self.assertEqual(added.json()["username"], "reader")
+        comment_id = added.json()["id"]
+
+        reply = await self.async_client.post(reverse("add_comment"), {
+            "post_id": str(self.post.id), "text": "Reply", "parent_id": comment_id,
+        })
+        self.assertEqual(reply.json()["parent_id"], comment_id)
+
+        like = await self.async_client.post(reverse("like_comment"), {"comment_id": comment_id})
+        self.assertEqual(like.json(), {"likes_count": 1})
+
+        page = await self.async_client.get(reverse("post_comments", args=[self.post.id]))
+        self.assertIn("Async hello", page.json()["html"])
+        self.assertIsNone(page.json()["next"])
+
+    async def test_endpoints_still_require_login(self):
+        response = await self.async_client.post(reverse("like_comment"), {"comment_id": str(uuid.uuid4())})
+        self.assertEqual(response.status_code, 302)
+
+        empty = await self.async_client.get(reverse("post_like"))
+        self.assertEqual(empty.status_code, 302)
+
+    @override_settings(ALLOWED_HOSTS=["newslive.example.com"])
+    async def test_benchmark_client_sends_an_allowed_host(self):
+        url = reverse("newsview", args=[self.post.id])
+
+        response = await benchmark_client(AsyncClient).get(url)
+
+        self.assertEqual(response.status_code, 200)
+        with self.assertLogs("django.security"):
+            rejected = await self.async_client.get(url)
+        self.assertEqual(rejected.status_code, 400)
+
+
+class NewsviewQueryCountTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="World")
+        cls.viewer = User.objects.create_user("viewer", password="pass12345")
+
+    def _render_with_comments(self, count):
+        post = Post.objects.create(title="Story", category=self.category)
+
+        for i in range(count):
+            author = User.objects.create_user(f"author-{count}-{i}")
+            Profile.objects.create(user=author, full_name=f"Author {i}")
+            comment = Comment.objects.create(user=author, post=post, text=f"Comment {i}")
+            comment.likes.add(author, self.viewer)
+
+        call_command("recount_likes", stdout=StringIO())
+        # Same presence write (see PresenceMiddleware) on every measured request
+        cache.clear()
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("newsview", args=[post.id]))
+
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_is_independent_of_comment_count(self):
+        self.client.force_login(self.viewer)
+
+        _, few = self._render_with_comments(2)
+        response, many = self._render_with_comments(25)
+
+        self.assertEqual(few, many)
+        self.assertEqual(len(response.context["liked_comment_ids"]), 25)
+        self.assertTrue(all(c.like_count == 2 for c in response.context["comments"]))
+
+
+class CommentTreeTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader")
+        cls.post = Post.objects.create(
+            title="Story",
+            category=Category.objects.create(name="World"),
+        )
+        cls.root = Comment.objects.create(user=cls.user, post=cls.post, text="root")
+        cls.replies = [
+            Comment.objects.create(user=cls.user, post=cls.post, parent=cls.root, text=f"reply {i}")
+            for i in range(5)
+        ]
+        Comment.objects.create(user=cls.user, post=cls.post, parent=cls.replies[0], text="nested")
+
+    def test_tree_is_built_from_one_query(self):
+        with self.assertNumQueries(1):
+            threads, next_cursor = comment_threads(self.post, inline=2)
+
+        self.assertIsNone(next_cursor)
+        self.assertEqual(threads, [self.root])
+        self.assertEqual(threads[0].inline_replies, self.replies[:2])
+        self.assertEqual(threads[0].more_replies, 3)
+        self.assertEqual(threads[0].inline_replies[0].more_replies, 1)
+
+    def test_remaining_replies_continue_after_inline_ones(self):
+        threads, _ = comment_threads(self.post, inline=2)
+        replies, next_cursor = comment_replies(self.root, after=threads[0].replies_cursor)
+
+        self.assertEqual(replies, self.replies[2:])
+        self.assertIsNone(next_cursor)
+
+    def test_replies_endpoint_pages_with_cursor(self):
+        response = self.client.get(reverse("comment_replies", args=[self.root.id]))
+        data = response.json()
+
+        self.assertIsNone(data["next"])
+        self.assertEqual(data["html"].count('class="commentItem"'), 5)
+
+    def test_orphaned_parent_is_treated_as_root(self):
+        orphan = Comment(user=self.user, post=self.post, parent_id=self.root.id)
+        self.assertEqual(build_comment_tree([orphan]), [orphan])
+
+
+class LikeCounterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("reader")
+        cls.post = Post.objects.create(
+            title="Story",
+            category=Category.objects.create(name="World"),
+        )
+        cls.comment = Comment.objects.create(user=cls.user, post=cls.post, text="hi")
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_post_like_toggle_keeps_counter(self):
+        liked = self.client.post(reverse("post_like"), {"post_id": self.post.id}).json()
+        self.assertEqual(liked, {"likes_count": 1, "user_liked": True})
+
+        unliked = self.client.post(reverse("post_like"), {"post_id": self.post.id}).json()
+        self.assertEqual(unliked, {"likes_count": 0, "user_liked": False})
+
+    def test_comment_like_toggle_keeps_counter(self):
+        url = reverse("like_comment")
+
+        self.assertEqual(self.client.post(url, {"comment_id": self.comment.id}).json()["likes_count"], 1)
+        self.assertEqual(self.client.post(url, {"comment_id": self.comment.id}).json()["likes_count"], 0)
+
+    def test_recount_repairs_drift(self):
+        PostLike.objects.create(user=self.user, post=self.post)
+        Comment.objects.filter(pk=self.comment.pk).update(like_count=7)
+
+        call_command("recount_likes", stdout=StringIO())
+
+        self.post.refresh_from_db()
+        self.comment.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.assertEqual(self.comment.like_count, 0)
+
+
+class PresenceTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user("reader")
+        self.client.force_login(self.user)
+
+    def test_last_seen_is_written_once_per_interval(self):
+        self.client.get(reverse("index"))
+        first = UserPresence.objects.get(user=self.user).last_seen
+
+        request = RequestFactory().get("/")
+        request.user = self.user
+
+        with self.assertNumQueries(0):
+            PresenceMiddleware(lambda r: None)(request)
+
+        self.assertEqual(UserPresence.objects.get(user=self.user).last_seen, first)
+        self.assertTrue(table_page("users", {})["results"][0]["is_active"])
+
+    def test_stale_presence_is_not_active(self):
+        UserPresence.objects.create(
+            user=self.user,
+            last_seen=timezone.now() - timedelta(minutes=30),
+        )
+        self.assertFalse(table_page("users", {})["results"][0]["is_active"])
+
+
+class TimedSqliteWrapper(TimedConnectionMixin, sqlite_base.DatabaseWrapper):
+    pass
+
+
+class ConnectionTimingTests(SimpleTestCase):
+
+    def setUp(self):
+        connections.reset_stats()
+        self.database = TimedSqliteWrapper(
+            {**connection.settings_dict, "NAME": ":memory:", "CONN_HEALTH_CHECKS": True},
+            alias="timing",
+        )
+        self.addCleanup(self.database.close)
+
+    def _query(self, request=None):
+        with self.database.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        return HttpResponse()
+
+    def test_new_connection_is_timed_and_reuse_is_health_checked(self):
+        response = ConnectionTimingMiddleware(self._query)(RequestFactory().get("/"))
+        self.assertRegex(response["Server-Timing"], r"^db-connect;dur=\d+\.\d$")
+
+        # Next request: the persistent connection is pinged, not reopened
+        self.database.close_if_unusable_or_obsolete()
+        response = ConnectionTimingMiddleware(self._query)(RequestFactory().get("/"))
+        self.assertRegex(response["Server-Timing"], r"^db-health;dur=")
+
+        stats = connections.stats()
+        self.assertEqual((stats["requests"], stats["connects"], stats["health_checks"]), (2, 1, 1))
+
+    def test_request_without_setup_has_no_header(self):
+        self.database.ensure_connection()
+        self.database.health_check_done = True
+
+        response = ConnectionTimingMiddleware(self._query)(RequestFactory().get("/"))
+        self.assertFalse(response.has_header("Server-Timing"))
+
+    def test_async_requests_are_timed(self):
+        async def get_response(request):
+            return await sync_to_async(self._query)()
+
+        middleware = ConnectionTimingMiddleware(get_response)
+        response = async_to_sync(middleware)(RequestFactory().get("/"))
+        self.assertIn("db-connect", response["Server-Timing"])
+
+
+class InstrumentationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.post = Post.objects.create(title="Story", category=Category.objects.create(name="World"))
+
+    def setUp(self):
+        cache.clear()
+        caches["template_fragments"].clear()
+        instrumentation.reset()
+
+    def _timing(self, response):
+        return dict(re.findall(r"(\w+);([^,]*)", response["Server-Timing"]))
+
+    def test_server_timing_reports_queries_templates_and_fragments(self):
+        url = reverse("index")
+
+        cold = self._timing(self.client.get(url))
+        self.assertRegex(cold["db"], r'^dur=\d+\.\d;desc="[1-9]\d* queries"$')
+        self.assertRegex(cold["tpl"], r"^dur=\d+\.\d$")
+        self.assertIn("miss=", cold["cache"])
+
+        warm = self._timing(self.client.get(url))
+        self.assertNotIn("hit=0 ", warm["cache"])
+
+    def test_metrics_endpoint_aggregates_per_view(self):
+        url = reverse("newsview", args=[self.post.id])
+        self.client.get(url)
+        self.client.get(url)
+
+        self.client.force_login(User.objects.create_superuser("admin"))
+        views = self.client.get(reverse("metrics")).json()["views"]
+        self.assertEqual(views["newsview"]["latency_ms"]["count"], 2)
+        self.assertEqual(views["newsview"]["queries"]["buckets"]["+Inf"], 2)
+        self.assertEqual(views["newsview"]["over_budget"], 0)
+
+    @override_settings(METRICS_TOKEN="s3cret")
+    def test_metrics_need_a_superuser_or_the_token(self):
+        url = reverse("metrics")
+        # Local, as every request is behind a proxy on the same host
+        self.assertEqual(self.client.get(url, REMOTE_ADDR="127.0.0.1").status_code, 404)
+        self.assertEqual(self.client.get(url, headers={"Authorization": "Bearer wrong"}).status_code, 404)
+        self.assertEqual(self.client.get(url, headers={"Authorization": "Bearer s3cret"}).status_code, 200)
+
+        self.client.force_login(User.objects.create_user("reader"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(QUERY_BUDGETS={"newsview": 1}, QUERY_BUDGET_RAISE=True)
+    def test_query_budget_raises_in_tests(self):
+        with self.assertRaisesMessage(instrumentation.QueryBudgetExceeded, "over its budget of 1"):
+            self.client.get(reverse("newsview", args=[self.post.id]))
+
+    @override_settings(QUERY_BUDGETS={"newsview": 1}, QUERY_BUDGET_RAISE=False)
+    def test_query_budget_logs_in_production(self):
+        with self.assertLogs("news.instrumentation", "WARNING") as logs:
+            response = self.client.get(reverse("newsview", args=[self.post.id]))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("newsview ran", logs.output[0])
+        self.assertEqual(instrumentation.snapshot()["newsview"]["over_budget"], 1)
+
+    def test_async_requests_are_counted(self):
+        response = async_to_sync(self.async_client.get)(reverse("newsview", args=[self.post.id]))
+        self.assertNotIn('desc="0 queries"', response["Server-Timing"])
+
+
+class SeedAndBenchmarkTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command(
+            "seed_data", categories=3, posts=40, stories=2, users=12, comments=120,
+            likes=150, comment_likes=60, batch_size=15, stdout=StringIO(),
+        )
+
+    def test_seeded_counters_and_threads_are_consistent(self):
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(Profile.objects.filter(user__username__startswith="seed-").count(), 12)
+        self.assertEqual(Post.objects.aggregate(total=Sum("like_count"))["total"], PostLike.objects.count())
+        self.assertEqual(
+            Comment.objects.aggregate(total=Sum("like_count"))["total"],
+            Comment.likes.through.objects.count(),
+        )
+
+        replies = Comment.objects.filter(parent__isnull=False)
+        self.assertTrue(replies.exists())
+        self.assertFalse(replies.exclude(post=F("parent__post")).exists())
+        self.assertTrue(self.client.login(username="seed-0", password="seed-password"))
+
+    def test_suite_reports_every_scenario_and_cleans_up(self):
+        cache.clear()
+        likes = PostLike.objects.count()
+        comments = Comment.objects.count()
+        out = StringIO()
+
+        call_command("bench_suite", requests=4, warmup=1, stdout=out, stderr=StringIO())
+        report = json.loads(out.getvalue())
+
+        self.assertEqual(report["mode"], "client")
+        self.assertEqual(report["dataset"]["posts"], 40)
+        self.assertEqual(set(report["scenarios"]), {
+            "index", "newsview", "admin_dashboard", "post_like", "like_comment", "add_comment",
+        })
+        for result in report["scenarios"].values():
+            self.assertEqual((result["requests"], result["errors"]), (4, 0))
+            self.assertLessEqual(result["latency_ms"]["p50"], result["latency_ms"]["p99"])
+            self.assertGreater(result["queries"]["max"], 0)
+
+        self.assertEqual(PostLike.objects.count(), likes)
+        self.assertEqual(Comment.objects.count(), comments)
+        self.assertEqual(Post.objects.aggregate(total=Sum("like_count"))["total"], likes)
+
+
+    @override_settings(ALLOWED_HOSTS=["newslive.example.com"])
+    def test_suite_uses_an_allowed_host(self):
+        out = StringIO()
+        call_command("bench_suite", scenarios="index,newsview", requests=2, warmup=0, stdout=out, stderr=StringIO())
+
+        for result in json.loads(out.getvalue())["scenarios"].values():
+            self.assertEqual(result["status"], {"200": 2})
+
+    @override_settings(ALLOWED_HOSTS=["newslive.example.com"])
+    def test_suite_fails_on_rejected_requests(self):
+        # The test client's default host, as before ALLOWED_HOSTS was honoured
+        with mock.patch.object(bench_suite, "benchmark_client", Client):
+            with self.assertRaisesMessage(CommandError, "index {'400': 2}"), self.assertLogs("django.security"):
+                call_command("bench_suite", scenarios="index", requests=2, warmup=0, stdout=StringIO())
+
+
+class DashboardTableTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", password="pass12345")
+        category = Category.objects.create(name="World")
+        for title in ["Alpha", "Bravo", "Charlie"]:
+            Post.objects.create(title=title, category=category)
+        User.objects.create_user("reader")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_dashboard_shell_renders(self):
+        response = self.client.get(reverse("admin-dashboard"))
+        self.assertEqual(response.status_code, 200)
+
+    def test_search_sort_and_paginate_in_the_database(self):
+        url = reverse("dashboard-table", args=["posts"])
+
+        data = self.client.get(url, {"sort": "title", "page_size": 2}).json()
+        self.assertEqual([row["title"] for row in data["results"]], ["Alpha", "Bravo"])
+        self.assertEqual((data["count"], data["num_pages"], data["has_next"]), (3, 2, True))
+
+        data = self.client.get(url, {"q": "charl"}).json()
+        self.assertEqual([row["title"] for row in data["results"]], ["Charlie"])
+
+    def test_unknown_sort_falls_back_to_default(self):
+        url = reverse("dashboard-table", args=["users"])
+        data = self.client.get(url, {"sort": "password"}).json()
+
+        self.assertEqual([row["username"] for row in data["results"]], ["reader"])
+
+    def test_malformed_sort_falls_back_to_default(self):
+        url = reverse("dashboard-table", args=["posts"])
+        default = self.client.get(url).json()["results"]
+
+        response = self.client.get(url, {"sort": "--title"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["results"], default)
+
+    def test_unknown_table_and_non_admin_are_rejected(self):
+        self.assertEqual(self.client.get(reverse("dashboard-table", args=["sessions"])).status_code, 404)
+
+        self.client.force_login(User.objects.get(username="reader"))
+        response = self.client.get(reverse("dashboard-table", args=["posts"]))
+        self.assertEqual(response.status_code, 302)
+
+    def test_users_table_query_count_is_constant(self):
+        for i in range(25):
+            user = User.objects.create_user(f"member-{i}")
+            if i % 2:
+                Profile.objects.create(user=user, provider="google", avatar=f"https://img/{i}.png")
+
+        # One COUNT for the paginator, one joined SELECT for the page
+        with self.assertNumQueries(2):
+            data = table_page("users", {"page_size": 50})
+
+        rows = {row["username"]: row for row in data["results"]}
+        self.assertEqual(rows["member-1"]["avatar"], "https://img/1.png")
+        self.assertEqual(rows["member-1"]["provider"], "google")
+        self.assertEqual(rows["member-0"]["avatar"], "/static/images/users.jpg")
+        self.assertEqual(rows["member-0"]["provider"], "local")
+
+
+class IndexUsageTests(TestCase):
+    """
+    Runs the feed, article and profile views on a seeded dataset and
+    EXPLAINs every query they send for the indexed tables. A sequential
+    scan on any of them means an access path lost its index.
+    """
+
+    WATCHED_TABLES = {"news_post", "news_comment", "news_story"}
+    SEQ_SCAN = re.compile(r"Seq Scan on (\w+)|\bSCAN (\w+)\b(?! USING)")
+    # SQLite sorts in a temp b-tree when no index provides the ORDER BY
+    UNINDEXED_SORT = "USE TEMP B-TREE FOR ORDER BY"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("author")
+        categories = [Category.objects.create(name=f"Category {i}") for i in range(4)]
+
+        Post.objects.bulk_create([
+            Post(
+                title=f"Post {i}",
+                category=categories[i % 4],
+                user=cls.user if i % 5 == 0 else None,
+            )
+            for i in range(300)
+        ])
+        cls.post = Post.objects.filter(category=categories[0]).first()
+
+        comments = Comment.objects.bulk_create([
+            Comment(user=cls.user, post=cls.post, text=f"Comment {i}")
+            for i in range(50)
+        ])
+        Comment.objects.bulk_create([
+            Comment(user=cls.user, post=cls.post, parent=comments[0], text=f"Reply {i}")
+            for i in range(30)
+        ])
+
+    def _plan_problems(self, sql):
+        if connection.vendor == "postgresql":
+            # With seqscan disabled the planner only falls back to one when no index fits
+            prefix = "SET LOCAL enable_seqscan = off; EXPLAIN"
+        else:
+            prefix = connection.ops.explain_query_prefix()
+
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefix} {sql}")
+            plan = " ".join(str(col) for row in cursor.fetchall() for col in row)
+
+        problems = {f"scan {a or b}" for a, b in self.SEQ_SCAN.findall(plan)}
+        problems = {p for p in problems if p.split()[1] in self.WATCHED_TABLES}
+
+        if self.UNINDEXED_SORT in plan and any(t in sql for t in self.WATCHED_TABLES):
+            problems.add("sort")
+
+        return problems
+
+    def assertViewUsesIndexes(self, url):
+        # Cached fragments would hide the queries under test
+        cache.clear()
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+
+        for query in queries:
+            sql = query["sql"]
+            if not sql.startswith("SELECT"):
+                continue
+            with self.subTest(sql=sql):
+                self.assertEqual(self._plan_problems(sql), set())
+
+    def test_index_feed(self):
+        self.assertViewUsesIndexes(reverse("index"))
+
+    def test_index_feed_with_filters(self):
+        category = self.post.category_id
+        self.assertViewUsesIndexes(f"{reverse('index')}?category={category}")
+        self.assertViewUsesIndexes(f"{reverse('index')}?media=Image")
+        self.assertViewUsesIndexes(f"{reverse('index')}?date={timezone.localdate()}")
+        self.assertViewUsesIndexes(
+            f"{reverse('index')}?category={category}&from=2024-01-01&to=2024-12-31"
+        )
+
+    def test_trending_feed(self):
+        PostTrending.objects.bulk_create([
+            PostTrending(post=post, score=i, computed_at=timezone.now())
+            for i, post in enumerate(Post.objects.all()[:100])
+        ])
+        self.assertViewUsesIndexes(f"{reverse('index')}?sort=trending")
+
+    def test_newsview(self):
+        self.client.force_login(self.user)
+        self.assertViewUsesIndexes(reverse("newsview", args=[self.post.id]))
+
+    def test_comment_replies(self):
+        parent = Comment.objects.filter(parent__isnull=True).first()
+        self.assertViewUsesIndexes(reverse("comment_replies", args=[parent.id]))
+
+    def test_profile_view(self):
+        self.client.force_login(self.user)
+        self.assertViewUsesIndexes(reverse("profile"))
@@ -0,0 +1,162 @@
+"""
+Trending posts: likes and comments from the last TRENDING_WINDOW, each
+weighted and halved every TRENDING_HALF_LIFE, summed per post into
+PostTrending. The feed reads that table in score order instead of
+aggregating the activity tables on every request.
+
+Every refresh also bumps `version()`, which is part of the cache key of
+trending feed pages: scores and cursors change with each run, not only
+when the first page would.
+"""
+import base64
+import time
+from collections import defaultdict
+from datetime import timedelta
+from uuid import UUID
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .fragments import bump_generation
+from .models import Comment, PostLike, PostTrending
+
+TRENDING_WINDOW = timedelta(days=7)
+TRENDING_HALF_LIFE = timedelta(hours=24)
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+# The trending posts a visitor sees first: one page of the feed
+TRENDING_TOP = 24
+VERSION_KEY = "trending:version"
+
+
+def _decayed(weight, at, now):
+    return weight * 0.5 ** ((now - at) / TRENDING_HALF_LIFE)
+
+
+def compute_scores(now=None):
+    """
+    {post_id: score} for every post with activity inside the window.
+    """
+    now = now or timezone.now()
+    since = now - TRENDING_WINDOW
+    scores = defaultdict(float)
+
+    for weight, model in [(LIKE_WEIGHT, PostLike), (COMMENT_WEIGHT, Comment)]:
+        activity = (
+            model.objects
+            .filter(created_at__gte=since)
+            .values_list("post_id", "created_at")
+            .iterator(chunk_size=10000)
+        )
+        for post_id, created_at in activity:
+            scores[post_id] += _decayed(weight, created_at, now)
+
+    return scores
+
+
+def version():
+    """
+    Current version of the trending scores, bumped by every refresh.
+    """
+    current = cache.get(VERSION_KEY)
+    if current is None:
+        # Seeded from the clock, like the fragment generation
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        current = cache.get(VERSION_KEY)
+    return current
+
+
+def _bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+def _top():
+    return list(
+        PostTrending.objects
+        .order_by("-score", "-post")
+        .values_list("post_id", flat=True)[:TRENDING_TOP]
+    )
+
+
+def refresh(now=None):
+    """
+    Rewrites PostTrending from the activity window. Returns the number of
+    trending posts.
+    """
+    now = now or timezone.now()
+    scores = compute_scores(now)
+
+    with transaction.atomic():
+        before = _top()
+        PostTrending.objects.exclude(post_id__in=list(scores)).delete()
+        PostTrending.objects.bulk_create(
+            [
+                PostTrending(post_id=post_id, score=score, computed_at=now)
+                for post_id, score in scores.items()
+            ],
+            batch_size=5000,
+            update_conflicts=True,
+            unique_fields=["post"],
+            update_fields=["score", "computed_at"],
+        )
+        after = _top()
+
+    # Scores decay on every run, so trending feed pages (and the scores in
+    # their cursors) are retired each time; the other fragments only when
+    # the first page would list other posts or another order
+    _bump_version()
+    if after != before:
+        bump_generation()
+    return len(scores)
+
+
+def _encode(post):
+    raw = f"{post.trending.score!r}|{post.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def _decode(cursor):
+    if not cursor:
+        return None
+
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        score, pk = base64.urlsafe_b64decode(padded.encode()).decode().split("|", 1)
+        return float(score), UUID(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def trending_page(posts, after=None, page_size=24):
+    """
+    Returns (items, next_cursor) for posts ordered by trending score, the
+    same contract as pagination.keyset_page. Posts without activity in the
+    window are left out.
+    """
+    posts = (
+        posts
+        .filter(trending__isnull=False)
+        .select_related("trending")
+        .order_by("-trending__score", "-trending__post")
+    )
+
+    position = _decode(after)
+    if position:
+        score, pk = position
+        posts = posts.filter(
+            Q(trending__score__lt=score) | Q(trending__score=score, trending__post__lt=pk)
+        )
+
+    items = list(posts[:page_size + 1])
+    next_cursor = None
+
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = _encode(items[-1])
+
+    return items, next_cursor
@@ -1,33 +1,46 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 from . views import *
 
+# The ASGI profile serves the read-heavy pages and JSON endpoints with
+# native async views (news/async_views.py)
+if settings.ASYNC_VIEWS:
+    from . import async_views as reads
+else:
+    reads = views
+
 urlpatterns = [
     # -----------------------
     # User panel URLs
     # -----------------------
-    path("", index, name="index"),
-    path("news/<uuid:post_id>/", newsview, name="newsview"),
+    path("", reads.index, name="index"),
+    path("news/<uuid:post_id>/", reads.newsview, name="newsview"),
+    path("feed/", feed, name="feed"),
+    path("search/", search, name="search"),
 
     # -----------------------
     # Admin URLs
     # -----------------------
     path('adminlogin/', views.superuser_login, name='login'),
     path('dashboard/', views.admin_dashboard, name='admin-dashboard'),
+    path('dashboard/tables/<str:table>/', views.dashboard_table, name='dashboard-table'),
     path('adminlogout/', views.user_logout, name='logout'),
 
     path('stories/delete/', views.delete_story, name='delete-story'),
     path('add-post/', views.add_post, name='add-post'),
     path('news/edit/<uuid:pk>/', views.edit_news, name='edit-news'),
     path('news/delete/', views.delete_news, name='delete-news'),
-    path('comment/add/', views.add_comment, name='add_comment'),
-    path('comment/like/', views.like_comment, name='like_comment'),
+    path('comment/add/', reads.add_comment, name='add_comment'),
+    path('comment/like/', reads.like_comment, name='like_comment'),
     path('comment/delete/', views.delete_comment, name='delete_comment'),
-    path('post/like/', views.post_like, name='post_like'),
+    path('comment/<uuid:comment_id>/replies/', views.load_replies, name='comment_replies'),
+    path('news/<uuid:post_id>/comments/', reads.load_comments, name='post_comments'),
+    path('post/like/', reads.post_like, name='post_like'),
     path('profile',views.profile_view, name='profile'),
 
-    path("post/edit/<int:post_id>/", views.edit_post_ajax, name="edit_post_ajax"),
-    path("post/delete/<int:post_id>/", views.delete_post_ajax, name="delete_post_ajax"),
+    path("post/edit/<uuid:post_id>/", views.edit_post_ajax, name="edit_post_ajax"),
+    path("post/delete/<uuid:post_id>/", views.delete_post_ajax, name="delete_post_ajax"),
 
 
     # -----------------------
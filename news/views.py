@@ -2,16 +2,15 @@ from django.contrib.auth import authenticate, login, logout
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
-from django.views.decorators.cache import never_cache
+from django.views.decorators.cache import cache_control, never_cache
 from django.core.cache import cache
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta
 from . models import *
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import condition, require_POST
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.tokens import default_token_generator
-from django.core.mail import send_mail
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
 from django.contrib.sessions.models import Session
@@ -69,8 +68,15 @@ def superuser_login(request):
             return redirect("admin-dashboard")
         else:
             # Failed attempt
-            attempts = cache.get(attempts_key, 0) + 1
-            cache.set(attempts_key, attempts, LOCKOUT_TIME)
+            # add + incr is atomic in the shared cache, so concurrent
+            # workers can't lose each other's failures
+            cache.add(attempts_key, 0, LOCKOUT_TIME)
+            try:
+                attempts = cache.incr(attempts_key)
+            except ValueError:
+                # Expired between add and incr
+                cache.set(attempts_key, 1, LOCKOUT_TIME)
+                attempts = 1
 
             remaining = MAX_ATTEMPTS - attempts
 
@@ -172,6 +178,8 @@ from django.views.decorators.cache import never_cache
 from django.contrib.auth.models import User
 from django.contrib.sessions.models import Session
 from django.utils import timezone
+from django.utils.safestring import mark_safe
+from .dashboard import table_page
 
 @never_cache
 @login_required(login_url="/login/")
@@ -226,6 +234,8 @@ def admin_dashboard(request):
                 return redirect("admin-dashboard")
 
             story.save()
+            if story.image:
+                build_renditions_later(story, "story")
             messages.success(request, "Story added successfully")
 
         # ================= DELETE USER =================
@@ -248,70 +258,34 @@ def admin_dashboard(request):
         return redirect("admin-dashboard")
 
     # ========================= GET =========================
-
-    categories = Category.objects.order_by("-id")
-    stories = Story.objects.order_by("-created_at")
-    news_posts = Post.objects.order_by("-created_at")
-    all_posts = news_posts
-
-    # ================= USERS LIST =================
-
-    django_users = User.objects.filter(
-        is_superuser=False
-    ).order_by("-date_joined")
-
-    active_sessions = Session.objects.filter(
-        expire_date__gte=timezone.now()
-    )
-
-    active_user_ids = set()
-
-    for session in active_sessions:
-        data = session.get_decoded()
-        uid = data.get("_auth_user_id")
-        if uid:
-            active_user_ids.add(int(uid))
-
-    users = []
-
-    for user in django_users:
-        profile = getattr(user, "profile", None)
-
-        provider = "local"
-        avatar_url = "/static/images/users.jpg"
-
-        if profile:
-            if profile.provider:
-                provider = profile.provider
-
-            if profile.avatar:
-                avatar_url = profile.avatar.url
-
-        users.append({
-            "signup": user,
-            "is_active": user.id in active_user_ids,
-            "last_login": user.last_login,
-            "provider": provider,
-            "avatar": avatar_url,
-            "id": user.id,
-        })
-
-    # Active users first
-    users.sort(key=lambda x: x["is_active"], reverse=True)
+    # Posts, stories, users and categories are loaded lazily by the
+    # dashboard through `dashboard_table`; the shell only needs the
+    # category names for the post forms.
+    categories = Category.objects.order_by("name").only("id", "name")
 
     return render(
         request,
         "admin_dashboard.html",
         {
             "categories": categories,
-            "stories": stories,
-            "news_posts": news_posts,
-            "all_posts": all_posts,
-            "users": users,
         }
     )
 
 
+@never_cache
+@login_required(login_url="/login/")
+@user_passes_test(lambda u: u.is_superuser)
+def dashboard_table(request, table):
+    """
+    Paginated, searchable, sortable JSON for one admin dashboard tab.
+    """
+    data = table_page(table, request.GET)
+    if data is None:
+        return JsonResponse({"error": "Unknown table"}, status=404)
+
+    return JsonResponse(data)
+
+
 @login_required
 @require_POST
 def edit_news(request, pk):
@@ -334,17 +308,9 @@ def edit_news(request, pk):
         post.description = description
         post.category_id = category_id
 
-        # Handle media uploads
-        if request.FILES.get("media"):
-            file = request.FILES["media"]
-            if file.content_type.startswith("image"):
-                post.image = file
-                post.video = None  # Clear previous video
-            elif file.content_type.startswith("video"):
-                post.video = file
-                post.image = None  # Clear previous image
-
-        post.save()
+        # New media is uploaded in the background, the current one stays
+        # visible until it is live
+        save_with_media(post, request.FILES.get("media"))
 
         # Determine media type for response
         media_type = None
@@ -361,6 +327,7 @@ def edit_news(request, pk):
             "description": post.description,
             "media_type": media_type,
             "media_url": media_url,
+            "media_status": post.media_status,
         })
 
     except Exception as e:
@@ -424,14 +391,10 @@ def add_post(request):
             description=description
         )
 
-        if media:
-            if media.content_type.startswith("image"):
-                post.image = media
-            elif media.content_type.startswith("video"):
-                post.video = media
-
-        post.save()
-        messages.success(request, "Post published successfully")
+        if save_with_media(post, media):
+            messages.success(request, "Post published, media is still processing")
+        else:
+            messages.success(request, "Post published successfully")
         return redirect("admin-dashboard")
 
 def base(request):
@@ -457,51 +420,114 @@ def base(request):
     return render(request, "base.html", context)
 
 import random
+from django.template.loader import render_to_string
+from .pagination import keyset_page
+from .likes import toggle_like
+from .comments import comment_threads, comment_replies, liked_comment_ids
+from .fragments import FEED_FILTERS, cached_fragment
+from .conditional import feed_etag, post_etag, post_last_modified
+from .search import SEARCH_MAX_PAGE, search_posts
+from .related import related_posts
+from .trending import trending_page, version as trending_version
+from .media import build_renditions_later, media_kind, save_with_media
+from . import outbox, voice
+
+FEED_PAGE_SIZE = 24
+
+
+def _filtered_posts(request):
+    """
+    Feed queryset with the category / media / date filters from the query string.
+    """
+    posts = Post.objects.select_related("category")
 
-def index(request):
-    posts = (
-        Post.objects
-        .select_related("category")
-        .order_by("-created_at")
-    )
-
-    stories = Story.objects.order_by("-created_at")
-    categories = Category.objects.all()
-
-    # --------------------
-    # Filters
-    # --------------------
     category_id = request.GET.get("category")
     media_type = request.GET.get("media")
-    date = request.GET.get("date")
 
-    # ✅ UUID-safe category filter
-    if category_id:
-        try:
-            UUID(category_id)
-            posts = posts.filter(category_id=category_id)
-        except ValueError:
-            pass  # ignore invalid UUIDs
+    # Category ids are integers, ignore anything else
+    if category_id and category_id.isdigit():
+        posts = posts.filter(category_id=category_id)
 
     if media_type == "Image":
         posts = posts.filter(image__isnull=False).exclude(image="")
     elif media_type == "Video":
         posts = posts.filter(video__isnull=False).exclude(video="")
 
-    if date:
-        posts = posts.filter(created_at__date=date)
+    # ?date=YYYY-MM-DD for one day, or ?from= / ?to= for an inclusive range.
+    # Compared as a half-open [start, end) range on the raw column so the
+    # created_at index can serve it; malformed dates are ignored.
+    day = _parse_day(request.GET.get("date"))
+    start = day or _parse_day(request.GET.get("from"))
+    end = day or _parse_day(request.GET.get("to"))
 
-    # --------------------
-    # BIG POST POSITIONS
-    # --------------------
-    total = posts.count()
+    if start:
+        posts = posts.filter(created_at__gte=_start_of_day(start))
+    if end:
+        posts = posts.filter(created_at__lt=_start_of_day(end + timedelta(days=1)))
 
-    possible_indexes = list(range(0, total, 6))
-    big_indexes = random.sample(
+    return posts
+
+
+def _parse_day(value):
+    try:
+        return date.fromisoformat(value) if value else None
+    except ValueError:
+        return None
+
+
+def _start_of_day(day):
+    # Midnight in the site timezone
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _big_indexes(count):
+    # BIG POST POSITIONS (per page)
+    possible_indexes = list(range(0, count, 6))
+    return random.sample(
         possible_indexes,
         min(3, len(possible_indexes))
     )
 
+
+def _feed_page(request, after=None):
+    """
+    One rendered page of the home feed: {"html", "next", "count"}.
+    Cached per filter combination and cursor until the next publish, and
+    trending pages until the next trending refresh.
+    """
+    trending = request.GET.get("sort") == "trending"
+
+    def build():
+        # ?sort=trending reads the materialized scores, see news/trending.py
+        paginate = trending_page if trending else keyset_page
+        posts, next_cursor = paginate(
+            _filtered_posts(request),
+            after=after,
+            page_size=FEED_PAGE_SIZE,
+        )
+        # Rendered without the request, the cards are the same for every visitor
+        html = render_to_string("feed_items.html", {
+            "posts": posts,
+            "big_indexes": _big_indexes(len(posts)),
+        })
+        return {"html": html, "next": next_cursor, "count": len(posts)}
+
+    params = {name: request.GET.get(name) for name in FEED_FILTERS}
+    params["after"] = after
+    if trending:
+        params["trending"] = trending_version()
+    return cached_fragment("feed", params, build)
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=feed_etag)
+def index(request):
+    feed_page = _feed_page(request)
+
+    # Left lazy: only queried when their cached fragment has expired
+    stories = Story.objects.order_by("-created_at")
+    categories = Category.objects.all()
+
     profile = (
         getattr(request.user, "profile", None)
         if request.user.is_authenticated
@@ -509,33 +535,60 @@ def index(request):
     )
 
     return render(request, "index.html", {
-        "posts": posts,
+        "feed_html": mark_safe(feed_page["html"]),
+        "feed_count": feed_page["count"],
+        "next_cursor": feed_page["next"],
         "stories": stories,
         "categories": categories,
         "profile": profile,
-        "big_indexes": big_indexes,
     })
 
 
+def feed(request):
+    """
+    Next page of the home feed for infinite scroll.
+    Returns the rendered cards plus the cursor for the following page.
+    """
+    return JsonResponse(_feed_page(request, after=request.GET.get("after")))
+
+
+def search(request):
+    """
+    Ranked full-text search over post titles and descriptions.
+    """
+    query = request.GET.get("q", "").strip()
+
+    try:
+        # Deeper pages are answered as the last one, so show that number
+        page = max(1, min(int(request.GET.get("page", 1)), SEARCH_MAX_PAGE))
+    except ValueError:
+        page = 1
+
+    posts, has_next = search_posts(query, page=page)
+    has_next = has_next and page < SEARCH_MAX_PAGE
+
+    return render(request, "search.html", {
+        "query": query,
+        "posts": posts,
+        "big_indexes": (),
+        "page": page,
+        "has_next": has_next,
+        "categories": Category.objects.all(),
+    })
+
+
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=post_etag, last_modified_func=post_last_modified)
 def newsview(request, post_id):
     post = get_object_or_404(Post, id=post_id)
 
     categories = Category.objects.all().order_by("name")
 
-    comments = (
-        Comment.objects
-        .filter(post=post)
-        .select_related("user", "user__profile")
-        .order_by("-created_at")
-    )
+    comments, comments_cursor = comment_threads(post)
+    liked_ids = liked_comment_ids(request.user, post)
 
-    # ✅ RELATED NEWS (same category, exclude current post)
-    related_posts = (
-        Post.objects
-        .filter(category=post.category)
-        .exclude(id=post.id)
-        .order_by("-created_at")[:10]
-    )
+    # ✅ RELATED NEWS (precomputed, see news/related.py)
+    related = related_posts(post)
 
     profile = (
         getattr(request.user, "profile", None)
@@ -549,10 +602,42 @@ def newsview(request, post_id):
         "media_types": ["Image", "Video"],
         "profile": profile,
         "comments": comments,
-        "related_posts": related_posts,
+        "comments_cursor": comments_cursor,
+        "liked_comment_ids": liked_ids,
+        "related_posts": related,
     })
 
 
+def load_comments(request, post_id):
+    """
+    Next page of top-level comment threads for a post.
+    """
+    post = get_object_or_404(Post, id=post_id)
+    threads, next_cursor = comment_threads(post, after=request.GET.get("cursor"))
+
+    html = render_to_string("comment_items.html", {
+        "comments": threads,
+        "liked_comment_ids": liked_comment_ids(request.user, post),
+    }, request=request)
+
+    return JsonResponse({"html": html, "next": next_cursor})
+
+
+def load_replies(request, comment_id):
+    """
+    Replies of a comment that were not rendered inline.
+    """
+    comment = get_object_or_404(Comment, id=comment_id)
+    replies, next_cursor = comment_replies(comment, after=request.GET.get("cursor"))
+
+    html = render_to_string("comment_items.html", {
+        "comments": replies,
+        "liked_comment_ids": liked_comment_ids(request.user, comment.post_id),
+    }, request=request)
+
+    return JsonResponse({"html": html, "next": next_cursor})
+
+
 # Patterns
 USERNAME_PATTERN = re.compile(r'^[a-zA-Z0-9_.-]{3,30}$')  # letters, numbers, _.- allowed
 EMAIL_PATTERN = re.compile(r'^[\w\.-]+@[\w\.-]+\.\w+$')
@@ -689,16 +774,13 @@ def forgot_password_ajax(request):
     token = user.generate_reset_token()
     reset_link = f"http://127.0.0.1:8000/reset-password/{token}/"
 
-    try:
-        send_mail(
-            subject="Reset Your Password",
-            message=f"Hello {user.username},\n\nClick this link to reset your password:\n{reset_link}\n\nThis link expires in 1 hour.",
-            from_email="News App <no-reply@smtp-brevo.com>",
-            recipient_list=[user.email],
-            fail_silently=False,
-        )
-    except Exception as e:
-        return JsonResponse({"success": False, "error": f"Failed to send email: {str(e)}"})
+    # Sent by the outbox worker, the relay is never waited on here
+    outbox.enqueue(
+        subject="Reset Your Password",
+        body=f"Hello {user.username},\n\nClick this link to reset your password:\n{reset_link}\n\nThis link expires in 1 hour.",
+        from_email="News App <no-reply@smtp-brevo.com>",
+        to=[user.email],
+    )
 
     return JsonResponse({"success": True, "message": "Password reset link sent to your email."})
 
@@ -752,6 +834,9 @@ def add_comment(request):
     if not text and not audio:
         return JsonResponse({"error": "Empty comment"}, status=400)
 
+    if audio and voice.too_large(audio):
+        return JsonResponse({"error": "Voice comment is too large"}, status=400)
+
     post = get_object_or_404(Post, id=post_id)
 
     profile, _ = Profile.objects.get_or_create(
@@ -771,13 +856,17 @@ def add_comment(request):
         post=post,
         parent=parent,
         text=text,
-        audio=audio
+        audio=audio,
+        audio_status=Comment.AUDIO_QUEUED if audio else Comment.AUDIO_READY,
     )
+    if audio:
+        voice.schedule(comment.pk)
 
     return JsonResponse({
         "id": comment.id,
         "text": comment.text,
         "audio": comment.audio.url if comment.audio else "",
+        "audio_status": comment.audio_status,
         "username": request.user.username,
         "avatar": profile.avatar or "/static/avatar.png",
         "parent_id": parent.id if parent else None,
@@ -789,15 +878,12 @@ def add_comment(request):
 @require_POST
 def like_comment(request):
     comment_id = request.POST.get("comment_id")
-    comment = get_object_or_404(Comment, id=comment_id)
+    comment = get_object_or_404(Comment.objects.only("id"), id=comment_id)
 
-    if request.user in comment.likes.all():
-        comment.likes.remove(request.user)  # unlike
-    else:
-        comment.likes.add(request.user)     # like
+    _, likes_count = toggle_like(Comment.likes.through, comment, request.user, "comment")
 
     return JsonResponse({
-        "likes_count": comment.likes.count()
+        "likes_count": likes_count
     })
 
 
@@ -858,21 +944,12 @@ def post_like(request):
     if request.method == "POST":
         post_id = request.POST.get("post_id")
         try:
-            post = Post.objects.get(id=post_id)
+            post = Post.objects.only("id").get(id=post_id)
         except Post.DoesNotExist:
             return JsonResponse({"error": "Post not found"}, status=404)
 
-        # Check if user already liked
-        liked = PostLike.objects.filter(post=post, user=request.user).first()
-        if liked:
-            liked.delete()
-            user_liked = False
-        else:
-            PostLike.objects.create(post=post, user=request.user)
-            user_liked = True
+        user_liked, likes_count = toggle_like(PostLike, post, request.user, "post")
 
-        # Return updated like count
-        likes_count = post.likes.count()  # this uses related_name="likes"
         return JsonResponse({"likes_count": likes_count, "user_liked": user_liked})
 
     return JsonResponse({"error": "Invalid request"}, status=400)
@@ -881,7 +958,7 @@ def post_like(request):
 @login_required
 def profile_view(request):
     categories = Category.objects.all()
-    posts = Post.objects.filter(user=request.user).order_by("-id")
+    posts = Post.objects.filter(user=request.user).order_by("-created_at", "-id")
 
     if request.method == "POST":
         title = request.POST.get("title", "").strip()
@@ -893,27 +970,19 @@ def profile_view(request):
             messages.error(request, "Title and category are required.")
             return redirect("profile")
 
-        image = video = None
-
-        if media:
-            if media.content_type.startswith("image/"):
-                image = media
-            elif media.content_type.startswith("video/"):
-                video = media
-            else:
-                messages.error(request, "Upload a valid image or video.")
-                return redirect("profile")
+        if media and not media_kind(media):
+            messages.error(request, "Upload a valid image or video.")
+            return redirect("profile")
 
         category = get_object_or_404(Category, id=category_id)
 
-        Post.objects.create(
+        post = Post(
             title=title,
             category=category,
             description=description,
-            image=image,
-            video=video,
             user=request.user
         )
+        save_with_media(post, media)
 
         messages.success(request, "Post uploaded successfully!")
         return redirect("profile")
@@ -931,17 +1000,8 @@ def edit_post_ajax(request, post_id):
     post.title = request.POST.get("title")
     post.description = request.POST.get("description")
 
-    media = request.FILES.get("media")
-    if media:
-        if media.content_type.startswith("image/"):
-            post.image = media
-            post.video = None
-        elif media.content_type.startswith("video/"):
-            post.video = media
-            post.image = None
-
-    post.save()
-    return JsonResponse({"success": True})
+    save_with_media(post, request.FILES.get("media"))
+    return JsonResponse({"success": True, "media_status": post.media_status})
 
 @login_required
 @require_POST
@@ -0,0 +1,246 @@
+"""
+Background processing of voice comments.
+
+`add_comment` rejects recordings over VOICE_MAX_UPLOAD_BYTES. It stores
+the browser's upload as is and saves the comment as "queued", so the
+comment shows up (playing the raw file) straight away. Once the
+transaction commits, the media worker pool (news/media.py) runs
+`process()`:
+
+1. decode to mono PCM, cut at VOICE_MAX_SECONDS
+2. strip leading / trailing silence and shorten long pauses
+3. re-encode as Opus at VOICE_BITRATE, replacing the raw file
+4. store the duration and VOICE_PEAKS waveform bars (one byte each)
+
+Processing stamps `audio_updated_at`, which changes the article's ETag, so
+cached pages still pointing at the raw file revalidate. The raw file itself
+is deleted VOICE_RAW_RETENTION seconds later, by `delete_raw_uploads()`.
+
+`manage.py process_voice_comments` drains the queue when the pool is off,
+and requeues comments left "processing" by a worker that died.
+Decoding and encoding go through VOICE_TRANSCODER (ffmpeg by default);
+everything else is NumPy on the decoded samples.
+"""
+import logging
+import subprocess
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .media import STALE_AFTER, run_in_background
+from .models import Comment
+
+logger = logging.getLogger(__name__)
+
+VOICE_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+VOICE_MAX_SECONDS = 120
+VOICE_BITRATE = "16k"
+VOICE_PEAKS = 64
+VOICE_RAW_RETENTION = 24 * 60 * 60
+
+SAMPLE_RATE = 48000
+FRAME_SECONDS = 0.02
+# Frames quieter than this (dBFS RMS) count as silence
+SILENCE_THRESHOLD_DB = -45
+# Pauses longer than this are shortened to it
+MAX_PAUSE_SECONDS = 0.6
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+class FfmpegTranscoder:
+    """
+    Pipes audio through the ffmpeg binary; nothing touches the disk.
+    """
+
+    extension = "webm"
+    timeout = 120
+
+    def __init__(self, binary=None):
+        self.binary = binary or _setting("VOICE_FFMPEG", "ffmpeg")
+
+    def _run(self, args, data):
+        return subprocess.run(
+            [self.binary, "-hide_banner", "-loglevel", "error", *args],
+            input=data, capture_output=True, check=True, timeout=self.timeout,
+        ).stdout
+
+    def decode(self, data, rate, max_seconds):
+        """
+        Mono signed 16-bit PCM of the first `max_seconds` of `data`.
+        """
+        return self._run(
+            ["-i", "pipe:0", "-t", str(max_seconds), "-ac", "1", "-ar", str(rate), "-f", "s16le", "pipe:1"],
+            data,
+        )
+
+    def encode(self, pcm, rate):
+        return self._run(
+            [
+                "-f", "s16le", "-ar", str(rate), "-ac", "1", "-i", "pipe:0",
+                "-c:a", "libopus", "-b:a", _setting("VOICE_BITRATE", VOICE_BITRATE),
+                "-application", "voip", "-f", "webm", "pipe:1",
+            ],
+            pcm,
+        )
+
+
+def get_transcoder():
+    return import_string(_setting("VOICE_TRANSCODER", "news.voice.FfmpegTranscoder"))()
+
+
+def too_large(upload):
+    return upload.size > _setting("VOICE_MAX_UPLOAD_BYTES", VOICE_MAX_UPLOAD_BYTES)
+
+
+def schedule(comment_id):
+    """
+    Processes a comment saved as "queued" once the transaction commits.
+    """
+    transaction.on_commit(lambda: run_in_background(process, comment_id))
+
+
+def strip_silence(samples, rate):
+    """
+    Drops silence before and after speech and shortens pauses to
+    MAX_PAUSE_SECONDS, working on FRAME_SECONDS frames.
+    """
+    frame = int(rate * FRAME_SECONDS)
+    count = len(samples) // frame
+    if not count:
+        return samples[:0]
+
+    frames = samples[:count * frame].reshape(count, frame).astype(np.float64)
+    rms = np.sqrt((frames ** 2).mean(axis=1))
+    loud = 20 * np.log10(np.maximum(rms, 1) / 32768) > SILENCE_THRESHOLD_DB
+    if not loud.any():
+        return samples[:0]
+
+    voiced = np.flatnonzero(loud)
+    keep = np.zeros(count, dtype=bool)
+    keep[voiced[0]:voiced[-1] + 1] = True
+
+    # Within the speech, keep only the start of every silent run
+    max_pause = int(MAX_PAUSE_SECONDS / FRAME_SECONDS)
+    run_start = None
+    for i in range(voiced[0], voiced[-1] + 1):
+        if loud[i]:
+            run_start = None
+        elif run_start is None:
+            run_start = i
+        elif i - run_start >= max_pause:
+            keep[i] = False
+
+    return frames[keep].astype(np.int16).ravel()
+
+
+def waveform_peaks(samples, bars=VOICE_PEAKS):
+    """
+    `bars` bytes, the loudest sample of each slice scaled to the clip's peak.
+    """
+    if not len(samples):
+        return b""
+
+    magnitude = np.abs(samples.astype(np.int32))
+    edges = np.linspace(0, len(magnitude), bars + 1).astype(np.int64)
+    starts = edges[:-1][edges[:-1] < len(magnitude)]
+    peaks = np.maximum.reduceat(magnitude, starts)
+    top = peaks.max() or 1
+    return np.round(peaks * 255 / top).astype(np.uint8).tobytes()
+
+
+def process(comment_id, transcoder=None):
+    """
+    Processes one queued voice comment. Returns True when it is ready.
+    """
+    # The stamp tells process_pending() how long the claim has been held
+    claimed = Comment.objects.filter(pk=comment_id, audio_status=Comment.AUDIO_QUEUED).update(
+        audio_status=Comment.AUDIO_PROCESSING, audio_updated_at=timezone.now()
+    )
+    if not claimed:
+        return False
+
+    comment = Comment.objects.only("id", "audio").get(pk=comment_id)
+    transcoder = transcoder or get_transcoder()
+    rate = SAMPLE_RATE
+
+    try:
+        with comment.audio.open("rb") as source:
+            raw = source.read()
+
+        pcm = transcoder.decode(raw, rate, _setting("VOICE_MAX_SECONDS", VOICE_MAX_SECONDS))
+        decoded = np.frombuffer(pcm, dtype="<i2")
+        # A clip that is silence throughout is kept as recorded
+        samples = strip_silence(decoded, rate)
+        if not len(samples):
+            samples = decoded
+        encoded = transcoder.encode(samples.astype("<i2").tobytes(), rate)
+    except Exception:
+        logger.exception("Voice comment %s could not be processed", comment_id)
+        Comment.objects.filter(pk=comment_id).update(
+            audio_status=Comment.AUDIO_FAILED, audio_updated_at=timezone.now()
+        )
+        return False
+
+    raw_name = comment.audio.name
+    stem = raw_name.rsplit("/", 1)[-1].rsplit(".", 1)[0]
+    comment.audio.save(f"{stem}-voice.{transcoder.extension}", ContentFile(encoded), save=False)
+
+    Comment.objects.filter(pk=comment_id).update(
+        audio=comment.audio.name,
+        audio_status=Comment.AUDIO_READY,
+        audio_duration=round(len(samples) / rate, 2),
+        audio_peaks=waveform_peaks(samples),
+        audio_updated_at=timezone.now(),
+        audio_raw=raw_name,
+    )
+    delete_raw_uploads()
+    return True
+
+
+def delete_raw_uploads():
+    """
+    Deletes the raw uploads replaced more than VOICE_RAW_RETENTION seconds
+    ago. Returns how many went.
+    """
+    cutoff = timezone.now() - timedelta(seconds=_setting("VOICE_RAW_RETENTION", VOICE_RAW_RETENTION))
+    expired = Comment.objects.exclude(audio_raw="").filter(audio_updated_at__lt=cutoff)
+    storage = Comment._meta.get_field("audio").storage
+
+    deleted = 0
+    for pk, raw_name in expired.values_list("pk", "audio_raw"):
+        storage.delete(raw_name)
+        deleted += Comment.objects.filter(pk=pk, audio_raw=raw_name).update(audio_raw="")
+    return deleted
+
+
+def process_pending(limit=None, transcoder=None):
+    """
+    Processes queued comments oldest first, requeueing ones stuck in
+    "processing", then deletes expired raw uploads. Returns how many became
+    ready.
+    """
+    Comment.objects.filter(
+        audio_status=Comment.AUDIO_PROCESSING,
+        audio_updated_at__lt=timezone.now() - STALE_AFTER,
+    ).update(audio_status=Comment.AUDIO_QUEUED)
+
+    pending = (
+        Comment.objects
+        .filter(audio_status=Comment.AUDIO_QUEUED)
+        .order_by("created_at")
+        .values_list("pk", flat=True)
+    )
+    if limit:
+        pending = pending[:limit]
+
+    ready = sum(process(pk, transcoder=transcoder) for pk in list(pending))
+    delete_raw_uploads()
+    return ready
@@ -2,6 +2,8 @@
 ASGI config for news_backend project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+It defaults to the ASGI profile (settings_asgi), which serves the
+read-heavy pages with async views.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/6.0/howto/deployment/asgi/
@@ -11,6 +13,6 @@ import os
 
 from django.core.asgi import get_asgi_application
 
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'news_backend.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'news_backend.settings_asgi')
 
 application = get_asgi_application()
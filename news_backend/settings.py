@@ -52,11 +52,14 @@ SITE_ID = 1
 # Middleware
 # -----------------------
 MIDDLEWARE = [
+    'news.middleware.ConnectionTimingMiddleware',
+    'news.middleware.InstrumentationMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'news.middleware.PresenceMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -71,7 +74,8 @@ ROOT_URLCONF = 'news_backend.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, timing renders for news/instrumentation.py
+        'BACKEND': 'news.instrumentation.InstrumentedTemplates',
         'DIRS': [],  # Add your templates dir if needed
         'APP_DIRS': True,
         'OPTIONS': {
@@ -80,6 +84,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',  # Required by allauth
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                # fragment_generation for the {% cache %} tags in base.html
+                'news.context_processors.fragments',
             ],
         },
     },
@@ -87,6 +93,29 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'news_backend.wsgi.application'
 
+# -----------------------
+# Instrumentation
+# -----------------------
+# Most queries a request to each URL name may run, session, user and
+# presence lookups included (news/instrumentation.py). Going over logs a
+# warning; the test runner raises instead, so a new N+1 fails the suite.
+QUERY_BUDGETS = {
+    'index': 11,
+    'feed': 6,
+    'newsview': 15,
+    'post_comments': 8,
+    'comment_replies': 6,
+    'add_comment': 12,
+    'like_comment': 15,
+    'post_like': 14,
+    'admin-dashboard': 8,
+    'dashboard-table': 6,
+}
+QUERY_BUDGET_RAISE = False
+# /metrics/ answers superusers and requests with "Authorization: Bearer <token>"
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+TEST_RUNNER = 'news.testing.TestRunner'
+
 # -----------------------
 # Database
 # -----------------------
@@ -97,14 +126,31 @@ WSGI_APPLICATION = 'news_backend.wsgi.application'
 #     }
 # }
 
+# Connections are kept for DB_CONN_MAX_AGE seconds and pinged before reuse
+# (CONN_HEALTH_CHECKS), so a restarted database costs one failed ping, not
+# a failed request. DB_POOL=true uses psycopg's pool instead: connections
+# go back to the pool at the end of each request (CONN_MAX_AGE must be 0).
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))
+DB_POOL = os.getenv('DB_POOL', 'false').lower() == 'true'
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # Django's PostgreSQL backend, timing connection setup (news/connections.py)
+        'ENGINE': 'news.db.postgresql',
         'NAME': os.getenv('DB_NAME'),
         'USER': os.getenv('DB_USER'),
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': 5432,  # <-- FORCE IT
+        'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'pool': {
+                'min_size': int(os.getenv('DB_POOL_MIN_SIZE', '2')),
+                'max_size': int(os.getenv('DB_POOL_MAX_SIZE', '10')),
+                'timeout': 10,
+            },
+        } if DB_POOL else {},
     }
 }
 
@@ -142,6 +188,32 @@ STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads are staged here and pushed to storage in the background
+# (news/media.py). MEDIA_UPLOAD_WORKERS = 0 leaves them to
+# `manage.py process_media_uploads --loop` running as a separate worker.
+MEDIA_UPLOAD_STAGING_DIR = os.path.join(BASE_DIR, 'media_staging')
+MEDIA_UPLOAD_BACKEND = os.getenv('MEDIA_UPLOAD_BACKEND', 'news.media.CloudinaryBackend')
+MEDIA_UPLOAD_WORKERS = int(os.getenv('MEDIA_UPLOAD_WORKERS', '2'))
+
+# Voice comments are re-encoded to Opus by the same workers (news/voice.py)
+VOICE_FFMPEG = os.getenv('VOICE_FFMPEG', 'ffmpeg')
+VOICE_MAX_UPLOAD_BYTES = 5 * 1024 * 1024
+VOICE_MAX_SECONDS = 120
+# Seconds a raw upload outlives its re-encoded copy (news/voice.py)
+VOICE_RAW_RETENTION = 24 * 60 * 60
+
+# Resized AVIF / WebP / JPEG copies of post and story images (news/images.py).
+# File names change with every upload, so a CDN can cache them forever.
+IMAGE_RENDITION_ROOT = os.getenv('IMAGE_RENDITION_ROOT', os.path.join(MEDIA_ROOT, 'renditions'))
+IMAGE_RENDITION_URL = os.getenv('IMAGE_RENDITION_URL', MEDIA_URL + 'renditions/')
+
+# Media under MEDIA_URL is streamed by news/streaming.py. Behind nginx, set
+# this to an internal location aliasing MEDIA_ROOT to let nginx send files.
+MEDIA_ACCEL_REDIRECT = os.getenv('MEDIA_ACCEL_REDIRECT') or None
+
+# Serve the read-heavy views with their async versions, see settings_asgi.py
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'false').lower() == 'true'
+
 # -----------------------
 # Authentication
 # -----------------------
@@ -181,20 +253,53 @@ SOCIALACCOUNT_LOGIN_ON_GET = True
 # Email configuration
 # -----------------------
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
-EMAIL_HOST = "smtp-relay.brevo.com"
-EMAIL_PORT = 587
-EMAIL_USE_TLS = True
+EMAIL_HOST = os.getenv("EMAIL_HOST", "smtp-relay.brevo.com")
+EMAIL_PORT = int(os.getenv("EMAIL_PORT", "587"))
+EMAIL_USE_TLS = os.getenv("EMAIL_USE_TLS", "true").lower() == "true"
 EMAIL_HOST_USER = os.getenv("EMAIL_HOST_USER", "")
 EMAIL_HOST_PASSWORD = os.getenv("EMAIL_HOST_PASSWORD", "")
+EMAIL_TIMEOUT = 15
 DEFAULT_FROM_EMAIL = "News App <no-reply@smtp-brevo.com>"
 
+# Views queue mail in the outbox table (news/outbox.py). It is drained by a
+# sender thread in each web process, or with OUTBOX_SEND_IN_PROCESS=false
+# only by `manage.py send_outbox --loop`. For local runs point EMAIL_HOST /
+# EMAIL_PORT at `manage.py runsmtpserver` with EMAIL_USE_TLS=false.
+OUTBOX_SEND_IN_PROCESS = os.getenv("OUTBOX_SEND_IN_PROCESS", "true").lower() == "true"
+
 # -----------------------
 # Caching
 # -----------------------
-CACHES = {
-    'default': {
+# CACHE_URL points every worker at one shared cache:
+#   redis://host:6379/0
+#   memcached://host:11211   (pip install pymemcache)
+# Without it each process keeps its own LocMemCache, which is only
+# suitable for a single-process dev server. For local multi-worker runs
+# `python manage.py runcacheserver` starts an in-memory stand-in.
+CACHE_URL = os.getenv("CACHE_URL", "")
+
+if CACHE_URL.startswith(("redis://", "rediss://")):
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    }
+elif CACHE_URL.startswith("memcached://"):
+    DEFAULT_CACHE = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': CACHE_URL.removeprefix("memcached://"),
+    }
+else:
+    DEFAULT_CACHE = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
+
+CACHES = {
+    'default': {**DEFAULT_CACHE, 'KEY_PREFIX': 'news'},
+    # Rendered fragments: a small per-worker LRU in front of the shared cache
+    'template_fragments': {
+        'BACKEND': 'news.cache.TieredCache',
+        'OPTIONS': {'L2': 'default', 'L1_TIMEOUT': 30, 'MAX_ENTRIES': 500},
+    },
 }
 
 # -----------------------
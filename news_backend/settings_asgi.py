@@ -0,0 +1,22 @@
+"""
+ASGI deployment profile.
+
+    DJANGO_SETTINGS_MODULE=news_backend.settings_asgi
+    gunicorn news_backend.asgi:application -k uvicorn.workers.UvicornWorker -w 4
+
+(or `uvicorn news_backend.asgi:application --workers 4`). Each worker is
+one event loop: the home feed, article pages and the like / comment JSON
+endpoints run as async views (news/async_views.py) and hold no thread
+while they wait, so a worker serves many more concurrent readers than a
+threaded WSGI worker. Everything else still runs as sync views in
+Django's thread pool.
+"""
+from .settings import *  # noqa: F401,F403
+
+ASYNC_VIEWS = True
+
+# Every ASGI request runs its sync work in a fresh thread, so persistent
+# connections would pile up one per thread. Close them after each request;
+# reuse connections through DB_POOL or a pooler (pgbouncer) instead.
+for database in DATABASES.values():
+    database["CONN_MAX_AGE"] = 0
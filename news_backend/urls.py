@@ -1,7 +1,11 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
+
+from news.instrumentation import serve_metrics
+from news.streaming import serve_media
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -9,6 +13,12 @@ urlpatterns = [
     path('accounts/', include('allauth.urls')),  # allauth URLs for users
 ]
 
-# Serve media in development
-if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+# Uploaded media, streamed with Range support (news/streaming.py)
+urlpatterns += [
+    re_path(rf"^{re.escape(settings.MEDIA_URL.lstrip('/'))}(?P<path>.*)$", serve_media, name="media"),
+]
+
+# Per-view request metrics of this worker, superusers or METRICS_TOKEN only (news/instrumentation.py)
+urlpatterns += [
+    path('metrics/', serve_metrics, name='metrics'),
+]